@@ -1,4 +1,3 @@
-# config.py
 import os
 import json
 
@@ -6,14 +5,36 @@ CONFIG_PATH = os.path.expanduser("~/.annotator_config.json")
 
 DEFAULTS = {
     "annotator_id": "",
-    "base_url": "http://127.0.0.1:8000"
+    "base_url": "http://127.0.0.1:8000",
+    # client-side segment cache (see segment_cache.py)
+    "segment_cache_bytes": 64 * 1024 * 1024,
+    "prefetch_ahead": 8,
+    "prefetch_behind": 2,
+    # /signal_range encoding for segments: "raw" (float64), "f32" or "delta16"
+    "signal_encoding": "f32",
+    # signals kept on disk as memory-mapped .npy files (see local_cache.py)
+    "local_cache_dir": "~/.annotator_cache",
+    "local_cache_bytes": 2 * 1024 * 1024 * 1024,
+    # background label uploads (see uploader.py)
+    "upload_batch_size": 50,
+    "upload_batch_interval": 1.0,
+    "upload_spool_path": "~/.annotator_spool.jsonl",
+    "upload_dead_letter_path": "~/.annotator_rejected.jsonl",
+    # "fast" reuses plot artists and blits the label overlay; "classic" redraws everything
+    "plot_mode": "fast",
+    "show_overview": True,
+    # segments fetched per /next_segments request in uncertainty-queue mode
+    "queue_batch_size": 50,
+    # overlay other annotators' labels, streamed from the backend's /live endpoint (see live.py)
+    "show_other_labels": False
 }
 
 def load_config():
     if not os.path.exists(CONFIG_PATH):
-        return DEFAULTS
+        return dict(DEFAULTS)
     with open(CONFIG_PATH, "r") as f:
-        return json.load(f)
+        # older config files only carry some of the keys
+        return {**DEFAULTS, **json.load(f)}
 
 def save_config(config):
     with open(CONFIG_PATH, "w") as f:
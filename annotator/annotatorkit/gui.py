@@ -1,18 +1,20 @@
 import sys
 import os
+import threading
 import numpy as np
-import pandas as pd
-import requests
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout,
                              QWidget, QFileDialog, QLabel, QHBoxLayout, QSlider, 
                              QInputDialog, QComboBox, QMessageBox, 
-                             QDialog, QLineEdit, QFormLayout, QDialogButtonBox)
-from PyQt5.QtCore import Qt, QTimer
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+                             QDialog, QLineEdit, QFormLayout, QDialogButtonBox, QCheckBox, QProgressBar)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtCore import QEvent
 
 from annotatorkit import config
+from annotatorkit.segment_cache import RemoteSignal, SegmentCache, SegmentPrefetcher
+from annotatorkit.local_cache import LocalSignalCache
+from annotatorkit.uploader import LabelUploader
+from annotatorkit.labels import LabelStore
+from annotatorkit.live import LiveLabels
 
 """
 This is our GUI for manual annotation. The annotator has many functions. You can load
@@ -29,6 +31,29 @@ SEGMENT_LENGTH = WINDOW_WIDTH * SAMPLE_RATE
 
 BASE_URL = "http://127.0.0.1:8000"
 
+# pandas, matplotlib and requests take most of a cold start, and the window
+# does not need them to appear: run_app imports them on a background thread
+# while the login dialog is open, and the plot is built once the window is up.
+DEFERRED_MODULES = ("matplotlib.backends.backend_qt5agg", "matplotlib.figure", "matplotlib.patches",
+                    "requests", "pandas")
+
+
+def preload_modules():
+    import importlib
+    for name in DEFERRED_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Could not preload {name}: {e}")
+
+def decimate_minmax(y, buckets):
+    """Min/max envelope of `y` over `buckets` equal chunks, as (x, lower, upper)."""
+    if len(y) <= buckets:
+        return np.arange(len(y)), y, y
+    usable = len(y) // buckets * buckets
+    chunks = y[:usable].reshape(buckets, -1)
+    return np.arange(buckets) * chunks.shape[1], chunks.min(axis=1), chunks.max(axis=1)
+
 def get_config_from_user(defaults):
     dialog = QDialog()
     dialog.setWindowTitle("Annotator Configuration")
@@ -53,6 +78,21 @@ def get_config_from_user(defaults):
     else:
         return None
 class Annotator(QMainWindow):
+    # (outcome, payload) from the startup thread: ("ok", signals or error), ("denied", None) or ("error", exception)
+    backend_checked = pyqtSignal(object)
+    # (signal_id, changed segment indices) from the LiveLabels thread
+    live_labels_changed = pyqtSignal(object)
+    # ("ok", signal_id, (remote, content, local, first_segment)) or ("error", signal_id, exception)
+    signal_opened = pyqtSignal(object)
+    # (request, start, end, (x, lower, upper) or exception) from an overview thread
+    overview_loaded = pyqtSignal(object)
+    # (signal_id, last labeled segment) from the progress thread
+    progress_loaded = pyqtSignal(object)
+    # ("ok", signal_id, (rows, version, etag) or None) or ("error", signal_id, exception)
+    labels_loaded = pyqtSignal(object)
+    # (cache, segment_index, exception or None) from the prefetcher
+    segment_loaded = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("PPG Signal Annotator")
@@ -65,20 +105,12 @@ class Annotator(QMainWindow):
         if not user_config:
             sys.exit()
 
-        # Validate annotator ID
-        try:
-            response = requests.get(f"{user_config['base_url']}/validate_annotator/{user_config['annotator_id']}")
-            if response.status_code != 200:
-                QMessageBox.critical(self, "Access Denied", "Invalid annotator ID. The application will now close.")
-                sys.exit()
-        except Exception as e:
-            QMessageBox.critical(self, "Network Error", f"Could not contact server:\n{e}")
-            sys.exit()
-
-        # Save validated config and store values
-        config.save_config(user_config)
+        # The annotator ID is validated by check_backend once the window is up;
+        # the config is only saved after that succeeds
+        self.config = {**defaults, **user_config}
         self.annotator_id = user_config["annotator_id"]
         self.base_url = user_config["base_url"]
+        self.connected = False
 
         # Remaining attributes
         self.segment_length = SEGMENT_LENGTH
@@ -86,16 +118,56 @@ class Annotator(QMainWindow):
         self.current_index = 0
         self.signals = None
         self.timestamps = None
-        self.labels = []
+        self.num_samples = 0
+        self.segment_cache = None
+        self.showing_placeholder = False
+        self.prefetcher = None
+        self.segment_features = None  # {column: array} from /features, filled in by a worker thread
+        self.remote = None
+        self.loading_signal_id = None
+        self.overview_request = 0
+        self.signal_cache = LocalSignalCache(self.config["local_cache_dir"], self.config["local_cache_bytes"])
+        self.download_cancel = threading.Event()
+        # Uncertainty-queue mode: Next/Previous walk segments ranked by /next_segments
+        self.queue_mode = False
+        self.segment_queue = []
+        self.queue_history = []
+        self.live_labels = None  # other annotators' labels for the overlay, when enabled
+
+        # Labels are sent by a worker thread, started once the annotator is
+        # validated; unsent ones survive restarts in the spool
+        self.uploader = LabelUploader(self.base_url, self.config["upload_spool_path"],
+                                      self.config["upload_dead_letter_path"],
+                                      batch_size=self.config["upload_batch_size"],
+                                      batch_interval=self.config["upload_batch_interval"])
+
+        self.labels = self.new_label_store()
+        # signal_id -> {"version", "etag", "labels": LabelStore}; lets
+        # load_labels fetch only what changed since the last load
+        self.label_sync = {}
         self.label_df = None
         self.last_label_path = None
 
         self.initUI()
+        self.backend_checked.connect(self.on_backend_checked)
+        self.live_labels_changed.connect(self.on_live_labels_changed)
+        self.signal_opened.connect(self.on_signal_opened)
+        self.overview_loaded.connect(self.on_overview_loaded)
+        self.progress_loaded.connect(self.on_progress_loaded)
+        self.labels_loaded.connect(self.on_labels_loaded)
+        self.segment_loaded.connect(self.on_segment_loaded)
+        threading.Thread(target=self.check_backend, daemon=True).start()
 
     def initUI(self):
         self.setFocusPolicy(Qt.StrongFocus)
-        self.canvas = FigureCanvas(Figure(figsize=(10, 4)))
-        self.ax = self.canvas.figure.subplots()
+        # The matplotlib canvas replaces this placeholder in ensure_plot
+        self.canvas = None
+        self.ax = None
+        self.overview_ax = None
+        self.fast_plotting = self.config["plot_mode"] == "fast"
+        self.plot_placeholder = QLabel("Loading plot...")
+        self.plot_placeholder.setAlignment(Qt.AlignCenter)
+        self.plot_placeholder.setMinimumHeight(400)
         self.installEventFilter(self)
 
         #loads complete ppg signal
@@ -128,11 +200,22 @@ class Annotator(QMainWindow):
         prev_btn = QPushButton("Previous")
         prev_btn.clicked.connect(self.prev_segment)
 
-        self.status_label = QLabel("No file loaded")
+        self.queue_checkbox = QCheckBox("Uncertainty queue")
+        self.queue_checkbox.setFocusPolicy(Qt.NoFocus)
+        self.queue_checkbox.toggled.connect(self.set_queue_mode)
+
+        self.others_checkbox = QCheckBox("Others' labels")
+        self.others_checkbox.setFocusPolicy(Qt.NoFocus)
+        self.others_checkbox.setChecked(self.config["show_other_labels"])
+        self.others_checkbox.toggled.connect(self.set_show_others)
+
+        self.status_label = QLabel(f"Connecting to {self.base_url}...")
+        self.quality_label = QLabel("")
         self.labeled = QLabel("No label filel loaded")
 
         layout = QVBoxLayout()
-        layout.addWidget(self.canvas)
+        layout.addWidget(self.plot_placeholder)
+        self.main_layout = layout
 
         controls = QHBoxLayout()
         # controls.addWidget(load_signal_btn)
@@ -140,52 +223,231 @@ class Annotator(QMainWindow):
         controls.addWidget(load_labels_btn)
         controls.addWidget(prev_btn)
         controls.addWidget(next_btn)
+        controls.addWidget(self.queue_checkbox)
+        controls.addWidget(self.others_checkbox)
         controls.addWidget(self.slider_label)
         controls.addWidget(self.slider)
         controls.addWidget(label_btn)
 
-        layout.addLayout(controls)
+        self.controls = QWidget()
+        self.controls.setLayout(controls)
+        self.controls.setEnabled(False)  # until the backend has accepted the annotator
+        layout.addWidget(self.controls)
         layout.addWidget(self.labeled)
+        layout.addWidget(self.quality_label)
         layout.addWidget(self.status_label)
 
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
 
-        self.fetch_signals_from_backend()
+        self.upload_status = QLabel()
+        self.statusBar().addPermanentWidget(self.upload_status)
+        self.upload_status_timer = QTimer(self)
+        self.upload_status_timer.timeout.connect(self.update_upload_status)
+        self.upload_status_timer.start(500)
+        self.update_upload_status()
+
+        self.startup_progress = QProgressBar()
+        self.startup_progress.setRange(0, 0)  # busy indicator while check_backend runs
+        self.startup_progress.setMaximumWidth(120)
+        self.statusBar().addWidget(self.startup_progress)
+
+    def ensure_plot(self):
+        if self.canvas is not None:
+            return
+        # first use of matplotlib; run_app has usually imported it in the background by now
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        self.canvas = FigureCanvas(Figure(figsize=(10, 4)))
+        if self.fast_plotting and self.config["show_overview"]:
+            self.ax, self.overview_ax = self.canvas.figure.subplots(2, 1, gridspec_kw={"height_ratios": [4, 1]})
+        else:
+            self.ax = self.canvas.figure.subplots()
+            self.overview_ax = None
+        if self.fast_plotting:
+            self.init_plot_artists()
+        self.main_layout.replaceWidget(self.plot_placeholder, self.canvas)
+        self.plot_placeholder.deleteLater()
+
+    def check_backend(self):
+        # Runs off the Qt thread; the result comes back through backend_checked
+        import requests
+        try:
+            response = requests.get(f"{self.base_url}/validate_annotator/{self.annotator_id}", timeout=10)
+        except Exception as e:
+            self.backend_checked.emit(("error", e))
+            return
+        if response.status_code != 200:
+            self.backend_checked.emit(("denied", None))
+            return
+        try:
+            response = requests.get(f"{self.base_url}/signals", timeout=10)
+            self.backend_checked.emit(("ok", response.json().get("signals", [])))
+        except Exception as e:
+            self.backend_checked.emit(("ok", e))
+
+    def on_backend_checked(self, result):
+        outcome, payload = result
+        self.startup_progress.hide()
+        if outcome == "denied":
+            QMessageBox.critical(self, "Access Denied", "Invalid annotator ID. The application will now close.")
+            QApplication.instance().exit(1)
+            return
+        if outcome == "error":
+            QMessageBox.critical(self, "Network Error", f"Could not contact server:\n{payload}")
+            QApplication.instance().exit(1)
+            return
+
+        # Save validated config
+        config.save_config(self.config)
+        self.connected = True
+        self.uploader.start()
+        self.ensure_plot()
+        self.controls.setEnabled(True)
+        self.status_label.setText("No file loaded")
+        if isinstance(payload, Exception):
+            self.status_label.setText(f"Error fetching signals: {payload}")
+        else:
+            self.show_signals(payload)
   
     def handle_signal_selection(self, signal_id):
         if not signal_id:
             return
+        self.ensure_plot()
+        # The current signal stays on screen, and navigable, until the new one has opened
+        self.loading_signal_id = signal_id
+        self.download_cancel.set()
+        self.status_label.setText(f"Loading signal {signal_id}...")
+        remote = RemoteSignal(self.base_url, signal_id, self.annotator_id,
+                              format=self.config["signal_encoding"])
+        threading.Thread(target=self.open_signal, args=(remote, signal_id), daemon=True).start()
+
+    def open_signal(self, remote, signal_id):
+        # Runs off the Qt thread; the result comes back through signal_opened
+        content = None
+        local = None
+        try:
+            content = remote.fetch_hash()
+            local = self.signal_cache.open(signal_id, content["hash"])
+        except Exception as e:
+            print(f"Local signal cache unavailable for {signal_id}: {e}")
+        try:
+            # Only the first segment is fetched up front; the rest is pulled
+            # into the segment cache on demand and by the prefetcher
+            first_segment = remote.fetch_segment(0) if local is None else None
+        except Exception as e:
+            self.signal_opened.emit(("error", signal_id, e))
+            return
+        self.signal_opened.emit(("ok", signal_id, (remote, content, local, first_segment)))
+
+    def on_signal_opened(self, result):
+        outcome, signal_id, payload = result
+        if signal_id != self.loading_signal_id:
+            return  # another signal was selected while this one loaded
+        if outcome == "error":
+            self.status_label.setText(f"Failed to load signal {signal_id}: {payload}")
+            return
+        remote, content, local, first_segment = payload
         try:
-            response = requests.get(f"{BASE_URL}/load_signal/{signal_id}/{self.annotator_id}")
-            records = response.json()
-            df = pd.DataFrame(records)
+            self.stop_prefetcher()
             self.current_signal_id = signal_id
-            self.timestamps = df["TIMESTAMP"].values if "TIMESTAMP" in df else np.arange(len(df))
-            try:
-                self.signals = df[PPG_SIGNAL_COLUMN_NAME_1].values
-            except:
-                self.signals = df[PPG_SIGNAL_COLUMN_NAME_2].values  # put ppg column name into this
-
-            self.status_label.setText(f"Loaded signal {signal_id}")
+            self.remote = remote
+            self.segment_queue = []
+            self.queue_history = []
+            self.start_live_labels()
+
+            if local is not None:
+                # Seen before and unchanged on the server: plot straight from the memmap
+                self.timestamps, self.signals = local
+                self.num_samples = len(self.signals)
+            else:
+                # The whole signal is saved to the local cache for next time
+                self.signals = None
+                self.timestamps = None
+                self.num_samples = remote.total_samples
+
+                cache = self.segment_cache = SegmentCache(remote.fetch_segment, self.config["segment_cache_bytes"])
+                self.segment_cache.put(0, first_segment)
+                self.prefetcher = SegmentPrefetcher(
+                    self.segment_cache, self.max_segment_index(),
+                    ahead=self.config["prefetch_ahead"], behind=self.config["prefetch_behind"],
+                    on_fetched=lambda index, error: self.segment_loaded.emit((cache, index, error)))
+                self.prefetcher.start()
+                if content is not None:
+                    self.download_cancel = threading.Event()
+                    threading.Thread(target=self.cache_signal_locally,
+                                     args=(signal_id, content, self.download_cancel), daemon=True).start()
+            self.segment_features = None
+            threading.Thread(target=self.fetch_features, args=(remote, signal_id), daemon=True).start()
+            if self.overview_ax is not None:
+                self.overview_source = remote.fetch_overview
+                self.load_overview()
+
+            self.status_label.setText(f"Loaded signal {signal_id}" + (" from local cache" if local is not None else ""))
 
             self.current_index = 0
-            self.labels.clear()
+            self.labels = self.new_label_store()
             self.update_plot()
+            threading.Thread(target=self.fetch_progress, args=(signal_id,), daemon=True).start()
+            if self.queue_mode:
+                self.next_queued_segment()
 
         except Exception as e:
             self.status_label.setText(f"Failed to load signal {signal_id}: {e}")
-  
-    def fetch_signals_from_backend(self):
+
+    def cache_signal_locally(self, signal_id, content, cancel):
+        # Runs off the Qt thread with its own session; the signal opens from disk next time
+        remote = RemoteSignal(self.base_url, signal_id, self.annotator_id, timeout=120)
         try:
-            response = requests.get(f"{BASE_URL}/signals")
-            signal_list = response.json().get("signals", [])
-            self.signal_dropdown.clear()
-            for signal in signal_list:
-                self.signal_dropdown.addItem(signal["id"])  # assuming 'id' is the signal name
+            self.signal_cache.download(remote, signal_id, content["hash"], content["total_samples"],
+                                       should_stop=cancel.is_set)
         except Exception as e:
-            self.status_label.setText(f"Error fetching signals: {e}")
+            print(f"Could not cache {signal_id} locally: {e}")
+
+    def fetch_features(self, remote, signal_id):
+        # Runs off the Qt thread; update_plot picks the result up on the next redraw
+        try:
+            features = remote.fetch_features()
+        except Exception as e:
+            print(f"Could not load quality features for {signal_id}: {e}")
+            return
+        if getattr(self, "current_signal_id", None) == signal_id:
+            self.segment_features = features
+
+    def update_quality_label(self):
+        features = self.segment_features
+        if features is None:
+            self.quality_label.setText("")
+            return
+        position = np.searchsorted(features["segment_index"], self.current_index)
+        if position >= len(features["segment_index"]) or features["segment_index"][position] != self.current_index:
+            self.quality_label.setText("")
+            return
+        self.quality_label.setText(
+            f"ApEn {features['apen'][position]:.2f} | Amplitude {features['amplitude'][position]:.0f} | "
+            f"Flatline {features['flatline_ratio'][position]:.0%} | Clipping {features['clipping_ratio'][position]:.0%} | "
+            f"SNR {features['snr_db'][position]:.1f} dB")
+
+    def fetch_progress(self, signal_id):
+        # Runs off the Qt thread; the result comes back through progress_loaded
+        import requests
+        try:
+            response = requests.get(f"{self.base_url}/progress/{self.annotator_id}/{signal_id}", timeout=5)
+            last_segment = response.json().get("last_segment_index")
+        except Exception:
+            return
+        self.progress_loaded.emit((signal_id, last_segment))
+
+    def on_progress_loaded(self, result):
+        signal_id, last_segment = result
+        if last_segment is not None and signal_id == getattr(self, "current_signal_id", None):
+            self.labeled.setText(f"Last labeled segment: {last_segment} (Load Label File to resume)")
+  
+    def show_signals(self, signal_list):
+        self.signal_dropdown.clear()
+        for signal in signal_list:
+            self.signal_dropdown.addItem(signal["id"])  # assuming 'id' is the signal name
 
 
     def eventFilter(self, source, event):
@@ -194,6 +456,14 @@ class Annotator(QMainWindow):
             return True  # Stop event from propagating
         return super().eventFilter(source, event)
     
+    def update_upload_status(self):
+        text = f"Uploads: {self.uploader.pending} pending, {self.uploader.sent} sent"
+        if self.uploader.last_error:
+            text += " (retrying)"
+        if self.uploader.rejected:
+            text += f", {self.uploader.rejected} rejected"
+        self.upload_status.setText(text)
+
     def update_slider_label(self):
         value = self.slider.value() / 100.0
         self.slider_label.setText(f"Label: {value:.2f}")
@@ -201,46 +471,244 @@ class Annotator(QMainWindow):
     def load_signal(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Open Signal File", "", "Parquet Files (*.parquet)")
         if file_path:
+            import pandas as pd
+            self.ensure_plot()
             df = pd.read_parquet(file_path)
             self.timestamps = df["TIMESTAMP"].values if "TIMESTAMP" in df else np.arange(len(df))
             try:
                 self.signals = df[PPG_SIGNAL_COLUMN_NAME_1].values
             except:
                 self.signals = df[PPG_SIGNAL_COLUMN_NAME_2].values  # put ppg column name into this
-            self.labels.clear()
+            self.stop_prefetcher()
+            self.loading_signal_id = None  # a remote signal still loading must not replace this one
+            self.num_samples = len(self.signals)
+            self.labels = self.new_label_store()
+            if self.overview_ax is not None:
+                self.overview_source = self.local_overview
+                self.load_overview()
             self.current_index = 0
             self.update_plot()
             self.status_label.setText(f"Loaded {file_path}")
 
     def load_labels(self):
         #Load Label
-        response = requests.get(f"{BASE_URL}/get_annotations/{self.annotator_id}/{self.current_signal_id}")
-        user_labels = response.json()
-
-        if response.status_code == 200:
-            user_labels = response.json()
-        else:
-            user_labels = []  # No annotations found or error occurred
-
-        self.labels = user_labels
-
-        if user_labels:
-            last_segment = max(label["segment_index"] for label in user_labels)
+        signal_id = getattr(self, "current_signal_id", None)
+        if signal_id is None:
+            return
+        sync = self.label_sync.setdefault(signal_id,
+                                          {"version": None, "etag": None, "labels": self.new_label_store()})
+        params = {"since": sync["version"]} if sync["version"] is not None else {}
+        headers = {"If-None-Match": sync["etag"]} if sync["etag"] else {}
+        self.status_label.setText(f"Loading labels for {signal_id}...")
+        threading.Thread(target=self.fetch_labels, args=(signal_id, params, headers), daemon=True).start()
+
+    def fetch_labels(self, signal_id, params, headers):
+        # Runs off the Qt thread; the result comes back through labels_loaded
+        import requests
+        try:
+            response = requests.get(f"{self.base_url}/get_annotations/{self.annotator_id}/{signal_id}",
+                                    params=params, headers=headers, timeout=30)
+            if response.status_code == 200:
+                delta = (response.json(), int(response.headers["X-Annotation-Version"]), response.headers.get("ETag"))
+            else:
+                delta = None  # 304: nothing new; 404: no annotations yet
+        except Exception as e:
+            self.labels_loaded.emit(("error", signal_id, e))
+            return
+        self.labels_loaded.emit(("ok", signal_id, delta))
+
+    def on_labels_loaded(self, result):
+        outcome, signal_id, payload = result
+        if signal_id != getattr(self, "current_signal_id", None):
+            return  # another signal was opened while the labels loaded
+        if outcome == "error":
+            self.status_label.setText(f"Failed to load labels: {payload}")
+            return
+        sync = self.label_sync[signal_id]
+        if payload is not None:
+            # only rows written since our last load; later versions replace earlier ones
+            rows, version, etag = payload
+            sync["labels"].update_from_rows(rows)
+            sync["version"] = version
+            sync["etag"] = etag
+
+        # keep anything labeled this session that the server has not stored yet
+        sync["labels"].update(self.labels)
+        self.labels = sync["labels"]
+
+        last_segment = self.labels.last_labeled()
+        if last_segment is not None:
             self.current_index = last_segment + 1
         else:
             self.current_index = 0
 
+        self.status_label.setText(f"Loaded labels for {signal_id}")
         self.update_plot()
 
+    def new_label_store(self):
+        stride = int(self.segment_length * (1 - self.overlap))
+        num_segments = self.max_segment_index() + 1 if self.num_samples else 0
+        return LabelStore(num_segments, self.segment_length, stride)
+
+    def stop_prefetcher(self):
+        if self.prefetcher:
+            self.prefetcher.stop()
+            self.prefetcher = None
+        self.segment_cache = None
+
+    def max_segment_index(self):
+        return int((self.num_samples - self.segment_length) / (self.segment_length * (1 - self.overlap)))
+
     def get_current_segment(self):
         stride = int(self.segment_length * (1 - self.overlap))
         start = self.current_index * stride
         end = start + self.segment_length
+        if self.segment_cache is not None:
+            # a miss is fetched by the prefetcher, never on the Qt thread; None until it arrives
+            segment = self.segment_cache.peek(self.current_index)
+            t, y = segment if segment is not None else (None, None)
+            return t, y, start, end
         return self.timestamps[start:end], self.signals[start:end], start, end
 
+    def on_segment_loaded(self, result):
+        cache, segment_index, error = result
+        if cache is not self.segment_cache or segment_index != self.current_index:
+            return  # a prefetch for another position or an older signal
+        if error is not None:
+            self.status_label.setText(f"Failed to load segment {segment_index}: {error}")
+        elif self.showing_placeholder:
+            self.update_plot()
+
+    def init_plot_artists(self):
+        # Persistent artists for the fast rendering mode: navigation only swaps
+        # their data, and the label overlay is blitted over a cached background
+        self.line, = self.ax.plot([], [])
+        overlay = dict(horizontalalignment='right', verticalalignment='center',
+                       transform=self.ax.transAxes, fontsize=12, color='red', animated=True)
+        self.label_text = self.ax.text(0.95, 0.9, "", **overlay)
+        self.confidence_text = self.ax.text(0.95, 0.85, "", **overlay)
+        self.others_text = self.ax.text(0.95, 0.80, "", **{**overlay, "color": "purple"})
+        self.plot_background = None
+        self.canvas.mpl_connect("draw_event", self.on_canvas_draw)
+
+        if self.overview_ax is not None:
+            self.overview_fill = None
+            self.overview_source = None
+            self.overview_range = (0, 0)
+            self.canvas.mpl_connect("button_press_event", self.on_overview_click)
+            self.canvas.mpl_connect("scroll_event", self.on_overview_scroll)
+            from matplotlib.patches import Rectangle
+            self.window_marker = Rectangle((0, 0), 0, 1, transform=self.overview_ax.get_xaxis_transform(),
+                                           color='orange', alpha=0.4)
+            self.overview_ax.add_patch(self.window_marker)
+            self.overview_ax.set_yticks([])
+            self.overview_ax.set_xticks([])
+
+    def on_canvas_draw(self, event):
+        self.plot_background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.label_text)
+        self.ax.draw_artist(self.confidence_text)
+        self.ax.draw_artist(self.others_text)
+
+    def set_overview(self, x, lower, upper):
+        # The envelope is drawn as one filled polygon; a zig-zag line through
+        # every min/max pair costs several times more to rasterize per frame
+        if self.overview_ax is None:
+            return
+        if self.overview_fill is not None:
+            self.overview_fill.remove()
+            self.overview_fill = None
+        if len(x):
+            self.overview_fill = self.overview_ax.fill_between(x, lower, upper, linewidth=0)
+            self.overview_ax.set_ylim(np.min(lower), np.max(upper) + 1e-9)
+
+    def load_overview(self, start=0, end=None):
+        """Fetch the envelope of [start, end) at one bucket per overview pixel and show it."""
+        if self.overview_ax is None or self.overview_source is None:
+            return
+        end = self.num_samples if end is None else end
+        points = max(int(self.overview_ax.bbox.width), 100)
+        # only the newest request is drawn; older ones may still be in flight
+        self.overview_request += 1
+        threading.Thread(target=self.fetch_overview, daemon=True,
+                         args=(self.overview_request, self.overview_source, start, end, points)).start()
+
+    def fetch_overview(self, request, source, start, end, points):
+        # Runs off the Qt thread; the result comes back through overview_loaded
+        try:
+            envelope = source(start, end, points)
+        except Exception as e:
+            envelope = e
+        self.overview_loaded.emit((request, start, end, envelope))
+
+    def on_overview_loaded(self, result):
+        request, start, end, envelope = result
+        if request != self.overview_request:
+            return
+        if isinstance(envelope, Exception):
+            self.status_label.setText(f"Failed to load overview: {envelope}")
+            return
+        self.set_overview(*envelope)
+        self.overview_range = (start, end)
+        self.overview_ax.set_xlim(start, end)
+        self.canvas.draw_idle()
+
+    def local_overview(self, start, end, points):
+        x, lower, upper = decimate_minmax(self.signals[start:end], points)
+        return x + start, lower, upper
+
+    def on_overview_click(self, event):
+        # Jump straight to the segment under the cursor
+        if event.inaxes is not self.overview_ax or event.xdata is None or event.button != 1:
+            return
+        stride = int(self.segment_length * (1 - self.overlap))
+        self.current_index = min(max(int(event.xdata) // stride, 0), self.max_segment_index())
+        self.update_plot()
+
+    def on_overview_scroll(self, event):
+        # Zoom the overview around the cursor; the server picks the matching pyramid level
+        if event.inaxes is not self.overview_ax or event.xdata is None:
+            return
+        start, end = self.overview_range
+        scale = 0.5 if event.button == "up" else 2.0
+        width = int(min(max((end - start) * scale, self.segment_length), self.num_samples))
+        # keep the sample under the cursor at the same place on screen
+        fraction = (event.xdata - start) / max(end - start, 1)
+        new_start = int(min(max(event.xdata - width * fraction, 0), self.num_samples - width))
+        self.load_overview(new_start, new_start + width)
+
+    def refresh_label_overlay(self):
+        existing = self.labels.get(self.current_index)
+        if existing is not None:
+            self.label_text.set_text(f"Existing Label: {existing[0]:.2f}")
+            self.confidence_text.set_text(f"Existing Confidence: {existing[1]:.2f}")
+        else:
+            self.label_text.set_text("")
+            self.confidence_text.set_text("")
+        self.others_text.set_text(self.others_label_text())
+
+        if self.plot_background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.plot_background)
+        self.ax.draw_artist(self.label_text)
+        self.ax.draw_artist(self.confidence_text)
+        self.ax.draw_artist(self.others_text)
+        self.canvas.blit(self.ax.bbox)
+
     def update_plot(self):
+        self.ensure_plot()
+        if self.prefetcher:
+            self.prefetcher.update(self.current_index, self.segment_queue if self.queue_mode else None)
         t, y, start, end = self.get_current_segment()
-        
+        self.showing_placeholder = y is None
+        if y is None:
+            t, y = np.empty(0), np.empty(0)  # drawn empty, titled "loading", until on_segment_loaded
+        self.update_quality_label()
+        if self.fast_plotting:
+            self.update_plot_fast(t, y, start, end)
+            return
+
         self.ax.clear()
         # y_center = np.mean(y)
         # window_height = WINDOW_HEIGHT 
@@ -250,11 +718,9 @@ class Annotator(QMainWindow):
         # Check if current segment already labeled and annotate
         existing_label = None
         existing_confidence = None
-        for entry in self.labels:
-            if entry['segment_index'] == self.current_index:
-                existing_label = entry['snorkel_label']
-                existing_confidence = entry['snorkel_confidence']
-                break
+        existing = self.labels.get(self.current_index)
+        if existing is not None:
+            existing_label, existing_confidence = existing
 
         if existing_label is not None:
             self.ax.text(0.95, 0.9, f"Existing Label: {existing_label:.2f}",
@@ -264,41 +730,135 @@ class Annotator(QMainWindow):
             self.ax.text(0.95, 0.85, f"Existing Confidence: {existing_confidence:.2f}",
                          horizontalalignment='right', verticalalignment='center',
                          transform=self.ax.transAxes, fontsize=12, color='red')
+        others = self.others_label_text()
+        if others:
+            self.ax.text(0.95, 0.80, others, horizontalalignment='right', verticalalignment='center',
+                         transform=self.ax.transAxes, fontsize=12, color='purple')
             
-        self.ax.set_title(f"Segment {self.current_index} ({start} to {end})")
+        self.ax.set_title(self.segment_title(start, end))
         self.canvas.draw()
 
+    def segment_title(self, start, end):
+        title = f"Segment {self.current_index} ({start} to {end})"
+        return title + " - loading..." if self.showing_placeholder else title
+
+    def update_plot_fast(self, t, y, start, end):
+        self.line.set_data(t, y)
+        if len(y):
+            self.ax.set_xlim(t[0], t[-1] if t[-1] > t[0] else t[0] + 1)
+            low, high = np.min(y), np.max(y)
+            pad = (high - low) * 0.05 or 1.0
+            self.ax.set_ylim(low - pad, high + pad)
+        self.ax.set_title(self.segment_title(start, end))
+        if self.overview_ax is not None:
+            self.window_marker.set_x(start)
+            self.window_marker.set_width(end - start)
+
+        existing = self.labels.get(self.current_index)
+        self.label_text.set_text(f"Existing Label: {existing[0]:.2f}" if existing else "")
+        self.confidence_text.set_text(f"Existing Confidence: {existing[1]:.2f}" if existing else "")
+        self.others_text.set_text(self.others_label_text())
+        # Axes limits changed, so the background must be redrawn; draw_idle
+        # coalesces bursts of key presses into one frame
+        self.plot_background = None
+        self.canvas.draw_idle()
+
     def label_segment(self):
-        _, _, start, end = self.get_current_segment()
         label = self.slider.value() / 100.0
-        # Remove any existing label for this segment
-        self.labels = [entry for entry in self.labels if entry['segment_index'] != self.current_index]
-
-        new_label = {
-            "segment_index": self.current_index,
-            "start": start,
-            "end": end,
-            "snorkel_label": label,
-            "snorkel_confidence": 1.0, 
-            "annotator_id": self.annotator_id
-        }
+        # Replaces any existing label for this segment
+        self.labels.set(self.current_index, label, 1.0)
+        new_label = self.labels.row(self.current_index, self.annotator_id)
 
-        self.labels.append(new_label)
-
-        payload = {
-            "annotator_id": self.annotator_id, 
-            "signal_id": self.current_signal_id, 
-            "annotations": [new_label]
-        }
-        response = requests.post(f"{BASE_URL}/upload_annotations", json=payload)
-        print("Sending annotation:", payload)
+        self.uploader.enqueue(self.current_signal_id, new_label)
         self.labeled.setText(f"Segment {self.current_index} labeled as {label:.2f}")
         self.labeled.setStyleSheet("color: green; font-weight: bold; font-size: 40px")
         QTimer.singleShot(2000, lambda: self.labeled.setStyleSheet(""))
+        self.redraw_label_overlay()
+
+    def others_label_text(self):
+        if self.live_labels is None:
+            return ""
+        others = self.live_labels.others(self.current_index)
+        if not others:
+            return ""
+        # * marks labels the backend has buffered but not written yet
+        return "Others: " + ", ".join(f"{annotator_id} {label:.2f}{'*' if pending else ''}"
+                                      for annotator_id, label, pending in others)
+
+    def start_live_labels(self):
+        self.stop_live_labels()
+        signal_id = getattr(self, "current_signal_id", None)
+        if not self.others_checkbox.isChecked() or signal_id is None:
+            return
+        self.live_labels = LiveLabels(self.base_url, signal_id, self.annotator_id,
+                                      on_change=lambda segments: self.live_labels_changed.emit((signal_id, segments)))
+        self.live_labels.start()
+
+    def stop_live_labels(self):
+        if self.live_labels is not None:
+            self.live_labels.stop()
+            self.live_labels = None
+
+    def set_show_others(self, enabled):
+        self.config["show_other_labels"] = enabled
+        if enabled:
+            self.start_live_labels()
+        else:
+            self.stop_live_labels()
+        if self.canvas is not None and self.num_samples:
+            self.redraw_label_overlay()
+
+    def on_live_labels_changed(self, change):
+        signal_id, segments = change
+        if signal_id == getattr(self, "current_signal_id", None) and self.current_index in segments:
+            self.redraw_label_overlay()
+
+    def redraw_label_overlay(self):
+        if self.fast_plotting:
+            self.refresh_label_overlay()
+        else:
+            self.update_plot()
+
+    def set_queue_mode(self, enabled):
+        self.queue_mode = enabled
+        self.segment_queue = []
+        self.queue_history = []
+        if enabled and self.remote is not None:
+            self.next_queued_segment()
+
+    def refill_queue(self):
+        try:
+            ranked = self.remote.fetch_next_segments(self.config["queue_batch_size"])
+        except Exception as e:
+            self.status_label.setText(f"Could not fetch segment queue: {e}")
+            return
+        # The server cannot see labels still waiting in the uploader, nor
+        # segments skipped earlier in this session
+        seen = set(self.queue_history)
+        seen.add(self.current_index)
+        self.segment_queue = [index for index in ranked
+                              if index not in seen and self.labels.get(index) is None]
+
+    def next_queued_segment(self):
+        if not self.segment_queue:
+            self.refill_queue()
+        # labels made since the last refill may cover queued segments
+        while self.segment_queue and self.labels.get(self.segment_queue[0]) is not None:
+            self.segment_queue.pop(0)
+        if not self.segment_queue:
+            self.status_label.setText("Uncertainty queue is empty")
+            return
+        self.queue_history.append(self.current_index)
+        self.current_index = self.segment_queue.pop(0)
         self.update_plot()
+        self.status_label.setText(f"Queue: segment {self.current_index} ({len(self.segment_queue)} more queued)")
+        self.status_label.setStyleSheet("color: blue; font-weight: bold")
 
     def next_segment(self):
-        max_index = int((len(self.signals) - self.segment_length) / (self.segment_length * (1 - self.overlap)))
+        if self.queue_mode:
+            self.next_queued_segment()
+            return
+        max_index = self.max_segment_index()
         if self.current_index < max_index:
             self.current_index += 1
             self.update_plot()
@@ -306,7 +866,21 @@ class Annotator(QMainWindow):
         self.status_label.setText(f"Segment {self.current_index}/{max_index}")
         self.status_label.setStyleSheet("color: blue; font-weight: bold")
 
+    def next_unlabeled_segment(self):
+        index = self.labels.next_unlabeled(self.current_index + 1)
+        if index is None or index > self.max_segment_index():
+            self.status_label.setText("No unlabeled segments after this one")
+            return
+        self.current_index = index
+        self.update_plot()
+
     def prev_segment(self):
+        if self.queue_mode:
+            if self.queue_history:
+                self.segment_queue.insert(0, self.current_index)
+                self.current_index = self.queue_history.pop()
+                self.update_plot()
+            return
         if self.current_index > 0:
             self.current_index -= 1
             self.update_plot()
@@ -319,6 +893,10 @@ class Annotator(QMainWindow):
             self.prev_segment()
         elif event.key() == Qt.Key_D:
             self.next_segment()
+        elif event.key() == Qt.Key_N:
+            self.next_unlabeled_segment()
+        elif event.key() == Qt.Key_Q:
+            self.queue_checkbox.toggle()
         elif event.key() == Qt.Key_Left:
             value = max(0, self.slider.value() - 16)
             self.slider.setValue(value)
@@ -368,6 +946,13 @@ class Annotator(QMainWindow):
             self.next_segment()
  
     def flush_annotations_on_exit(self):
+        if not self.connected:
+            return  # never validated: nothing was uploaded or buffered on the server
+        import requests
+        if not self.uploader.flush(timeout=5):
+            print(f"{self.uploader.pending} labels not yet uploaded; they will be resent on next launch")
+        self.uploader.stop()
+        self.stop_live_labels()
         try:
             payload = {
                 "annotator_id": self.annotator_id,
@@ -390,7 +975,10 @@ class Annotator(QMainWindow):
 
 def run_app():
     app = QApplication(sys.argv)
+    threading.Thread(target=preload_modules, daemon=True).start()
     window = Annotator()
     window.show()
+    app.processEvents()  # paint the window before the plot is built
+    QTimer.singleShot(0, window.ensure_plot)
     app.aboutToQuit.connect(window.flush_annotations_on_exit)
     sys.exit(app.exec_())
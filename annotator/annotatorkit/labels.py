@@ -0,0 +1,87 @@
+import numpy as np
+
+"""
+Segment-indexed label storage for the annotator. Labels and confidences live
+in NumPy arrays addressed by segment_index with a mask of which segments are
+labeled, so lookups and updates are O(1) and searches are vectorized.
+"""
+
+
+class LabelStore:
+    def __init__(self, num_segments, segment_length, stride):
+        self.segment_length = segment_length
+        self.stride = stride
+        self.label = np.zeros(num_segments, dtype=np.float64)
+        self.confidence = np.zeros(num_segments, dtype=np.float64)
+        self.labeled = np.zeros(num_segments, dtype=bool)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.labeled))
+
+    def _ensure_size(self, segment_index):
+        size = len(self.labeled)
+        if segment_index < size:
+            return
+        grow = max(segment_index + 1, size * 2) - size
+        self.label = np.concatenate([self.label, np.zeros(grow, dtype=np.float64)])
+        self.confidence = np.concatenate([self.confidence, np.zeros(grow, dtype=np.float64)])
+        self.labeled = np.concatenate([self.labeled, np.zeros(grow, dtype=bool)])
+
+    def get(self, segment_index):
+        """(label, confidence) for a segment, or None if it is unlabeled."""
+        if segment_index >= len(self.labeled) or not self.labeled[segment_index]:
+            return None
+        return float(self.label[segment_index]), float(self.confidence[segment_index])
+
+    def set(self, segment_index, label, confidence=1.0):
+        self._ensure_size(segment_index)
+        self.label[segment_index] = label
+        self.confidence[segment_index] = confidence
+        self.labeled[segment_index] = True
+
+    def update_from_rows(self, rows):
+        """Apply annotation rows as returned by /get_annotations."""
+        if not rows:
+            return
+        indices = np.fromiter((row["segment_index"] for row in rows), dtype=np.int64, count=len(rows))
+        self._ensure_size(int(indices.max()))
+        self.label[indices] = [row["snorkel_label"] for row in rows]
+        self.confidence[indices] = [np.nan if row.get("snorkel_confidence") is None else row["snorkel_confidence"]
+                                    for row in rows]
+        self.labeled[indices] = True
+
+    def update(self, other):
+        """Copy every labeled segment of another store over this one."""
+        indices = np.flatnonzero(other.labeled)
+        if len(indices) == 0:
+            return
+        self._ensure_size(int(indices[-1]))
+        self.label[indices] = other.label[indices]
+        self.confidence[indices] = other.confidence[indices]
+        self.labeled[indices] = True
+
+    def last_labeled(self):
+        indices = np.flatnonzero(self.labeled)
+        return int(indices[-1]) if len(indices) else None
+
+    def next_unlabeled(self, start=0):
+        """First unlabeled segment at or after `start`, or None if all are labeled."""
+        unlabeled = np.flatnonzero(~self.labeled[start:])
+        return int(start + unlabeled[0]) if len(unlabeled) else None
+
+    def row(self, segment_index, annotator_id):
+        start = segment_index * self.stride
+        return {
+            "segment_index": segment_index,
+            "start": start,
+            "end": start + self.segment_length,
+            "snorkel_label": float(self.label[segment_index]),
+            "snorkel_confidence": float(self.confidence[segment_index]),
+            "annotator_id": annotator_id
+        }
+
+    def to_rows(self, annotator_id, indices=None):
+        """Upload payload rows for the given (default: all labeled) segments."""
+        if indices is None:
+            indices = np.flatnonzero(self.labeled)
+        return [self.row(int(index), annotator_id) for index in indices]
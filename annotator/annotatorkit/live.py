@@ -0,0 +1,101 @@
+import json
+import threading
+
+"""
+Other annotators' labels for the annotator's overlay, kept current from the
+backend's /live Server-Sent Events stream by a worker thread. The stream starts
+with a snapshot of every label on the signal; after that only changed rows
+arrive. On a dropped connection the thread reconnects with Last-Event-ID, so
+the backend only resends rows written since the last event it saw.
+"""
+
+
+class LiveLabels(threading.Thread):
+    def __init__(self, base_url, signal_id, annotator_id, on_change=None, max_backoff=30.0):
+        super().__init__(daemon=True)
+        self.url = f"{base_url}/live/{signal_id}/{annotator_id}"
+        self.signal_id = signal_id
+        self.annotator_id = annotator_id
+        self.on_change = on_change  # called from this thread with the set of changed segment indices
+        self.max_backoff = max_backoff
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        # segment_index -> {annotator_id: (label, pending)}; pending until the backend has written it
+        self._labels = {}
+        self._last_event_id = None
+        self._response = None
+        self._stopped = threading.Event()
+
+    def others(self, segment_index):
+        """[(annotator_id, label, pending)] of everyone but this annotator, by annotator id."""
+        with self._lock:
+            labels = self._labels.get(segment_index, {})
+            return sorted((annotator_id, label, pending) for annotator_id, (label, pending) in labels.items()
+                          if annotator_id != self.annotator_id)
+
+    def stop(self):
+        self._stopped.set()
+        response = self._response
+        if response is not None:
+            response.close()  # unblocks the read in run()
+
+    def _apply(self, event, data):
+        rows = data["rows"]
+        pending = event == "buffered"
+        changed = set()
+        with self._lock:
+            if event == "snapshot":
+                changed.update(self._labels)
+                self._labels = {}
+            for segment_index, annotator_id, label in zip(rows["segment_index"], rows["annotator_id"],
+                                                          rows["snorkel_label"]):
+                if segment_index is None or annotator_id is None or label is None:
+                    continue
+                self._labels.setdefault(int(segment_index), {})[str(annotator_id)] = (float(label), pending)
+                changed.add(int(segment_index))
+        if changed and self.on_change is not None:
+            self.on_change(changed)
+
+    def _read_stream(self, session):
+        headers = {"Last-Event-ID": self._last_event_id} if self._last_event_id else {}
+        # the backend sends a keep-alive comment every 15 s, so a silent minute means a dead connection
+        response = session.get(self.url, headers=headers, stream=True, timeout=(10, 60))
+        self._response = response
+        try:
+            response.raise_for_status()
+            event = {}
+            for line in response.iter_lines(decode_unicode=True):
+                if self._stopped.is_set():
+                    return
+                if line:
+                    if not line.startswith(":"):
+                        field, _, value = line.partition(":")
+                        event[field] = value[1:] if value.startswith(" ") else value
+                    continue
+                if "id" in event:
+                    self._last_event_id = event["id"]
+                if event.get("event") in ("snapshot", "buffered", "flushed") and "data" in event:
+                    self._apply(event["event"], json.loads(event["data"]))
+                self.last_error = None
+                event = {}
+        finally:
+            self._response = None
+            response.close()
+
+    def run(self):
+        import requests
+        session = requests.Session()
+        attempt = 0
+        while not self._stopped.is_set():
+            try:
+                self._read_stream(session)
+                attempt = 0  # the server ended the stream (or dropped us as too slow); resume at once
+            except Exception as e:
+                if self._stopped.is_set():
+                    return
+                self.last_error = str(e)
+                delay = min(self.max_backoff, 0.5 * 2 ** attempt)
+                attempt += 1
+                print(f"Live labels for {self.signal_id} unavailable ({e}); retrying in {delay:.1f}s")
+                self._stopped.wait(delay)
@@ -0,0 +1,130 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from annotatorkit.segment_cache import split_columns
+
+"""
+Persistent on-disk signal cache for the annotator. A signal is downloaded once
+through /signal_range in large chunks (always in the exact float64 "raw"
+format, whatever compact encoding segments use) and written straight into a
+raw .npy file (columns x samples, float64), keyed by signal id and the
+server's content hash. Reopening it maps the file with np.load(mmap_mode="r"), so it is
+available immediately and only the pages actually plotted are read into
+memory. The least recently opened signals are evicted once the directory
+exceeds its byte budget.
+"""
+
+DOWNLOAD_CHUNK_SAMPLES = 1 << 20
+
+
+class LocalSignalCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _stem(self, signal_id, content_hash):
+        safe_id = re.sub(r"[^A-Za-z0-9._-]", "_", signal_id)
+        return os.path.join(self.directory, f"{safe_id}-{content_hash[:16]}")
+
+    def open(self, signal_id, content_hash):
+        """(timestamps, values) as read-only memmap views, or None if this version is not cached."""
+        stem = self._stem(signal_id, content_hash)
+        try:
+            with open(stem + ".json") as f:
+                meta = json.load(f)
+            data = np.load(stem + ".npy", mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if meta["hash"] != content_hash:
+            return None
+        os.utime(stem + ".npy")  # recency for eviction
+        return split_columns(meta["columns"], data)
+
+    def download(self, remote, signal_id, content_hash, total_samples, should_stop=None):
+        """
+        Stream the whole signal into the cache. Returns the opened (timestamps, values),
+        or None if `should_stop()` turned true before it finished.
+        """
+        stem = self._stem(signal_id, content_hash)
+        tmp_path = f"{stem}.{os.getpid()}.{threading.get_ident()}.partial.npy"
+        data = None
+        columns = None
+        try:
+            for start in range(0, total_samples, DOWNLOAD_CHUNK_SAMPLES):
+                if should_stop is not None and should_stop():
+                    return None
+                _, chunk_columns, chunk = remote.fetch_range(
+                    start, min(DOWNLOAD_CHUNK_SAMPLES, total_samples - start), format="raw")
+                if data is None:
+                    columns = chunk_columns
+                    data = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float64,
+                                                     shape=(len(columns), total_samples))
+                data[:, start:start + chunk.shape[1]] = chunk
+            if data is None:
+                return None
+            data.flush()
+            del data
+            os.replace(tmp_path, stem + ".npy")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with open(stem + ".json.tmp", "w") as f:
+            json.dump({"signal_id": signal_id, "hash": content_hash, "columns": columns,
+                       "total_samples": total_samples}, f)
+        os.replace(stem + ".json.tmp", stem + ".json")
+        self._remove_stale(signal_id, stem)
+        self.evict(keep=stem)
+        return self.open(signal_id, content_hash)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy") and not name.endswith(".partial.npy"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path[:-len(".npy")]))
+        return entries
+
+    def _remove(self, stem):
+        for suffix in (".npy", ".json"):
+            try:
+                os.remove(stem + suffix)
+            except OSError:
+                pass
+
+    def _remove_stale(self, signal_id, current_stem):
+        """Older versions of a signal can never be opened again once its hash has changed."""
+        with self._lock:
+            for _, _, stem in self._entries():
+                if stem == current_stem or not os.path.exists(stem + ".json"):
+                    continue
+                try:
+                    with open(stem + ".json") as f:
+                        if json.load(f)["signal_id"] == signal_id:
+                            self._remove(stem)
+                except (OSError, ValueError):
+                    continue
+
+    def evict(self, keep=None):
+        """Remove least recently opened signals until the cache fits in max_bytes."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, stem in entries:
+                if total <= self.max_bytes:
+                    break
+                if stem == keep:
+                    continue
+                # an open memmap keeps its pages valid after unlink on POSIX
+                self._remove(stem)
+                total -= size
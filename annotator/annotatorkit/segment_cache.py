@@ -0,0 +1,238 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+"""
+Client-side segment cache for the annotator. Segments are pulled from the
+backend's /signal_range endpoint one at a time, kept in an LRU bounded by a
+byte budget, and a background prefetcher keeps the windows around the current
+segment warm so navigation does not wait on the network. The GUI never fetches
+itself: on a miss it shows a placeholder, and the prefetcher, which always
+fetches the current segment first, reports back through `on_fetched`.
+"""
+
+PPG_SIGNAL_COLUMN_NAME_1 = '8032_PPG_00'
+PPG_SIGNAL_COLUMN_NAME_2 = 'TAG_8032_PPG_00'
+
+
+def split_columns(columns, data, start=0):
+    """(timestamps, ppg values) from a (columns, count) array laid out like /signal_range raw output."""
+    if PPG_SIGNAL_COLUMN_NAME_1 in columns:
+        values = data[columns.index(PPG_SIGNAL_COLUMN_NAME_1)]
+    else:
+        values = data[columns.index(PPG_SIGNAL_COLUMN_NAME_2)]
+    if "TIMESTAMP" in columns:
+        timestamps = data[columns.index("TIMESTAMP")]
+    else:
+        timestamps = np.arange(start, start + data.shape[1])
+    return timestamps, values
+
+
+def decode_compact(headers, content, start, count):
+    """(columns, (columns, count) float64 array) from an f32/delta16 /signal_range body."""
+    columns = headers["X-Columns"].split(",")
+    rows, offset = [], 0
+    for dtype in map(np.dtype, headers["X-Dtype"].split(",")):
+        rows.append(np.frombuffer(content, dtype=dtype, count=count, offset=offset))
+        offset += dtype.itemsize * count
+    if headers["X-Encoding"] == "delta16":
+        rows[0] = (int(headers["X-Base"]) + np.cumsum(rows[0], dtype=np.int64)) * float(headers["X-Scale"])
+    if "X-Timestamp-Start" in headers:
+        columns.append("TIMESTAMP")
+        rows.append(float(headers["X-Timestamp-Start"]) + np.arange(count) * float(headers["X-Timestamp-Step"]))
+    return columns, np.vstack([np.asarray(row, dtype=np.float64) for row in rows])
+
+
+class RemoteSignal:
+    """
+    One signal on the backend. `format` picks the /signal_range encoding for
+    segments: "raw" (float64), or the compact "f32" / "delta16"; responses are
+    also compressed whenever requests can decode the server's choice.
+    """
+
+    def __init__(self, base_url, signal_id, annotator_id, session=None, timeout=10, format="raw"):
+        self.url = f"{base_url}/signal_range/{signal_id}/{annotator_id}"
+        self.queue_url = f"{base_url}/next_segments/{annotator_id}/{signal_id}"
+        if session is None:
+            import requests  # deferred so the GUI window comes up before requests is loaded
+            session = requests.Session()
+        self.session = session
+        self.timeout = timeout
+        self.format = format
+        self.total_samples = None
+
+    def _get_raw(self, params, format=None):
+        response = self.session.get(self.url, params={**params, "format": format or self.format},
+                                    timeout=self.timeout)
+        response.raise_for_status()
+        start = int(response.headers["X-Start"])
+        count = int(response.headers["X-Count"])
+        self.total_samples = int(response.headers["X-Total-Samples"])
+        if "X-Encoding" in response.headers:
+            columns, data = decode_compact(response.headers, response.content, start, count)
+        else:
+            columns = response.headers["X-Columns"].split(",")
+            data = np.frombuffer(response.content, dtype=response.headers["X-Dtype"]).reshape(len(columns), count)
+        return start, columns, data
+
+    def fetch_range(self, start, count, format=None):
+        """Samples [start, start + count) as (start, column names, (columns, count) float64 array)."""
+        return self._get_raw({"start": start, "count": count}, format)
+
+    def fetch_segment(self, segment_index):
+        start, columns, data = self._get_raw({"segment": segment_index})
+        return split_columns(columns, data, start)
+
+    def fetch_hash(self):
+        """{"hash", "total_samples"} for validating a locally cached copy of the signal."""
+        url = self.url.replace("/signal_range/", "/signal_hash/", 1)
+        response = self.session.get(url, timeout=60)  # first request hashes the file
+        response.raise_for_status()
+        return response.json()
+
+    def fetch_overview(self, start, end, points):
+        """Min/max envelope of samples [start, end) as (x, lower, upper), from the server's LOD pyramid."""
+        url = self.url.replace("/signal_range/", "/overview/", 1)
+        response = self.session.get(url, params={"start": start, "end": end, "points": points}, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        x = data["start"] + np.arange(len(data["min"])) * data["bucket_size"]
+        return x, np.asarray(data["min"]), np.asarray(data["max"])
+
+
+    def fetch_features(self):
+        """Per-segment quality features as {column: array}, indexed by position in "segment_index"."""
+        url = self.url.replace("/signal_range/", "/features/", 1)
+        response = self.session.get(url, timeout=120)  # the server may compute them on first request
+        response.raise_for_status()
+        return {column: np.asarray(values) for column, values in response.json().items()}
+
+    def fetch_next_segments(self, count):
+        """Unlabeled segment indices ranked by the server's uncertainty score, best first."""
+        response = self.session.get(self.queue_url, params={"count": count}, timeout=60)
+        response.raise_for_status()
+        return response.json()["segments"]
+
+
+class SegmentCache:
+    """LRU of segment_index -> (timestamps, values), bounded by total array bytes."""
+
+    def __init__(self, fetch, max_bytes):
+        self.fetch = fetch
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._segments = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, segment_index):
+        with self._lock:
+            return segment_index in self._segments
+
+    def peek(self, segment_index):
+        """The cached segment, or None; never fetches."""
+        with self._lock:
+            if segment_index in self._segments:
+                self._segments.move_to_end(segment_index)
+                return self._segments[segment_index]
+            return None
+
+    def get(self, segment_index):
+        """Return a segment, fetching it (or waiting on the prefetcher's fetch) on a miss."""
+        while True:
+            with self._lock:
+                if segment_index in self._segments:
+                    self._segments.move_to_end(segment_index)
+                    return self._segments[segment_index]
+                pending = self._inflight.get(segment_index)
+                if pending is None:
+                    pending = self._inflight[segment_index] = threading.Event()
+                    break
+            pending.wait()
+            # loop again: the fetch may have failed or already been evicted
+
+        try:
+            segment = self.fetch(segment_index)
+            self.put(segment_index, segment)
+            return segment
+        finally:
+            with self._lock:
+                self._inflight.pop(segment_index, None)
+            pending.set()
+
+    def put(self, segment_index, segment):
+        size = sum(array.nbytes for array in segment)
+        with self._lock:
+            if segment_index in self._segments:
+                self.current_bytes -= sum(array.nbytes for array in self._segments.pop(segment_index))
+            self._segments[segment_index] = segment
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and len(self._segments) > 1:
+                _, evicted = self._segments.popitem(last=False)
+                self.current_bytes -= sum(array.nbytes for array in evicted)
+
+    def clear(self):
+        with self._lock:
+            self._segments.clear()
+            self.current_bytes = 0
+
+
+class SegmentPrefetcher(threading.Thread):
+    """
+    Keeps the next `ahead` and previous `behind` segments around the current one
+    cached, or, when given an explicit `upcoming` list (queue mode), the first
+    `ahead` segments of that list. The current segment itself comes first.
+    """
+
+    def __init__(self, cache, max_index, ahead=8, behind=2, on_fetched=None):
+        super().__init__(daemon=True)
+        self.cache = cache
+        self.max_index = max_index
+        self.ahead = ahead
+        self.behind = behind
+        self.on_fetched = on_fetched  # called from this thread with (segment_index, exception or None)
+        self._center = 0
+        self._upcoming = None
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def update(self, current_index, upcoming=None):
+        self._center = current_index
+        self._upcoming = list(upcoming) if upcoming is not None else None
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def _wanted(self, center, upcoming=None):
+        if upcoming is not None:
+            return [index for index in [center] + upcoming[:self.ahead] if 0 <= index <= self.max_index]
+        # nearest first, favouring the direction annotators usually move in
+        forward = [center + i for i in range(1, self.ahead + 1)]
+        backward = [center - i for i in range(1, self.behind + 1)]
+        ordered = [center]
+        for i in range(max(len(forward), len(backward))):
+            ordered.extend(forward[i:i + 1])
+            ordered.extend(backward[i:i + 1])
+        return [index for index in ordered if 0 <= index <= self.max_index]
+
+    def run(self):
+        while not self._stopped:
+            self._wake.wait()
+            self._wake.clear()
+            center, upcoming = self._center, self._upcoming
+            for index in self._wanted(center, upcoming):
+                if self._stopped or self._wake.is_set():
+                    break  # user moved on; re-plan around the new position
+                if index in self.cache:
+                    continue
+                try:
+                    self.cache.get(index)
+                    error = None
+                except Exception as e:
+                    print(f"Prefetch of segment {index} failed: {e}")
+                    error = e
+                if self.on_fetched is not None:
+                    self.on_fetched(index, error)
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+
+"""
+Background label uploader for the annotator. Labels are queued from the Qt
+thread and sent by a worker thread in batches over a keep-alive session, with
+exponential backoff on connection errors, timeouts and 5xx responses. The
+queue is mirrored to an on-disk spool so labels that were never acknowledged
+are resent on the next launch. Labels the backend rejects with a 4xx would be
+rejected again, so they are moved to a dead-letter file instead of retried.
+"""
+
+
+class LabelUploader(threading.Thread):
+    def __init__(self, base_url, spool_path, dead_letter_path, batch_size=50, batch_interval=1.0, max_backoff=30.0):
+        super().__init__(daemon=True)
+        self.url = f"{base_url}/upload_annotations"
+        self.spool_path = os.path.expanduser(spool_path)
+        self.dead_letter_path = os.path.expanduser(dead_letter_path)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_backoff = max_backoff
+        self.session = None  # created on the worker thread, so importing requests stays off GUI startup
+        self.sent = 0
+        self.rejected = 0
+        self.last_error = None
+
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._flush_requested = False
+        # (queued_at, {"signal_id": ..., "annotation": {...}}), oldest first
+        self._pending = [(0.0, item) for item in self._load_spool()]
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def _load_spool(self):
+        if not os.path.exists(self.spool_path):
+            return []
+        items = []
+        with open(self.spool_path, "r") as f:
+            for line in f:
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # torn last line from a crash
+        return items
+
+    def _rewrite_spool(self):
+        tmp_path = f"{self.spool_path}.tmp"
+        with open(tmp_path, "w") as f:
+            for _, item in self._pending:
+                f.write(json.dumps(item) + "\n")
+        os.replace(tmp_path, self.spool_path)
+
+    def enqueue(self, signal_id, annotation):
+        item = {"signal_id": signal_id, "annotation": annotation}
+        with self._cond:
+            with open(self.spool_path, "a") as f:
+                f.write(json.dumps(item) + "\n")
+            self._pending.append((time.monotonic(), item))
+            self._cond.notify()
+
+    def flush(self, timeout=5.0):
+        """Send everything queued now instead of waiting for a full batch. Returns True if drained."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify()
+            while self._pending and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            self._flush_requested = False
+            return not self._pending
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._stopped.is_set():
+                if self._pending:
+                    age = time.monotonic() - self._pending[0][0]
+                    if self._flush_requested or len(self._pending) >= self.batch_size or age >= self.batch_interval:
+                        return [item for _, item in self._pending[:self.batch_size]]
+                    self._cond.wait(self.batch_interval - age)
+                else:
+                    self._cond.wait()
+        return None
+
+    def _send(self, batch):
+        """Upload the batch; returns [(items, reason)] the backend rejected. Raises on errors worth retrying."""
+        # One request per (annotator, signal); a re-labeled segment only ships its latest label
+        groups = {}
+        for item in batch:
+            groups.setdefault((item["annotation"]["annotator_id"], item["signal_id"]), []).append(item)
+        rejected = []
+        for (annotator_id, signal_id), items in groups.items():
+            by_segment = {item["annotation"]["segment_index"]: item["annotation"] for item in items}
+            response = self.session.post(self.url, json={
+                "annotator_id": annotator_id,
+                "signal_id": signal_id,
+                "annotations": list(by_segment.values()),
+            }, timeout=10)
+            if 400 <= response.status_code < 500:
+                rejected.append((items, f"HTTP {response.status_code}: {response.text[:200]}"))
+                continue
+            response.raise_for_status()
+        return rejected
+
+    def _dead_letter(self, items, reason):
+        print(f"⚠️ Backend rejected {len(items)} labels ({reason}); moved to {self.dead_letter_path}")
+        with open(self.dead_letter_path, "a") as f:
+            for item in items:
+                f.write(json.dumps({**item, "reason": reason}) + "\n")
+        self.rejected += len(items)
+
+    def run(self):
+        import requests
+        self.session = requests.Session()
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if batch is None:
+                return
+            attempt = 0
+            while not self._stopped.is_set():
+                try:
+                    rejected = self._send(batch)
+                    self.last_error = None
+                    break
+                except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                    # raise_for_status only gets here for 5xx; 4xx come back as rejected
+                    self.last_error = str(e)
+                    delay = min(self.max_backoff, 0.5 * 2 ** attempt)
+                    attempt += 1
+                    print(f"Label upload failed ({e}); retrying in {delay:.1f}s")
+                    self._stopped.wait(delay)
+            else:
+                return  # stopped mid-retry; the spool keeps the batch for next launch
+
+            for items, reason in rejected:
+                self._dead_letter(items, reason)
+            with self._cond:
+                # Only this thread removes items, so the batch is still at the front
+                del self._pending[:len(batch)]
+                self.sent += len(batch) - sum(len(items) for items, _ in rejected)
+                self._rewrite_spool()
+                self._cond.notify_all()
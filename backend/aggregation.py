@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from constants import TRUE, FALSE, ABSTAIN, LABEL_THRESHOLD
+
+"""
+Cross-annotator aggregation over the compiled annotations.
+
+Each signal is held as a segments x annotators matrix of labels (and
+confidences). Alongside it we keep per-segment sufficient statistics (label
+count, sum, sum of squares, confidence-weighted sums, per-category counts) and
+their running totals, which is all consensus labels, Krippendorff's alpha and
+Fleiss' kappa need. New flushes are applied as version deltas from the store:
+only the touched segments' statistics are recomputed and the totals adjusted by
+the difference, so agreement stays current without re-reading or re-pivoting
+the whole signal.
+"""
+
+CONSENSUS_METHODS = ("mean", "median", "weighted")
+CATEGORIES = (FALSE, TRUE, ABSTAIN)  # column order of the per-segment category counts
+
+
+def categorize(labels):
+    """Map labels in [0, 1] to FALSE (<= LABEL_THRESHOLD), TRUE (>= 1 - LABEL_THRESHOLD) or ABSTAIN."""
+    labels = np.asarray(labels, dtype=np.float64)
+    result = np.full(labels.shape, ABSTAIN, dtype=np.int8)
+    result[labels <= LABEL_THRESHOLD] = FALSE
+    result[labels >= 1 - LABEL_THRESHOLD] = TRUE
+    return result
+
+
+def _unit_totals(count, s1, s2, categories):
+    """Alpha/kappa contributions of a set of segments; only segments with 2+ labels are pairable."""
+    pairable = count >= 2
+    m, s1, s2, categories = count[pairable], s1[pairable], s2[pairable], categories[pairable]
+    disagreement = 2 * (m * s2 - s1 ** 2) / (m - 1)
+    pair_agreement = ((categories ** 2).sum(axis=1) - m) / (m * (m - 1))
+    return np.array([disagreement.sum(), m.sum(), s1.sum(), s2.sum(), pair_agreement.sum(), len(m),
+                     *categories.sum(axis=0)])
+
+
+class SignalAggregate:
+    def __init__(self):
+        self.version = 0
+        self.annotators = []
+        self._column = {}
+        self.labels = np.full((0, 0), np.nan)
+        self.confidences = np.full((0, 0), np.nan)
+        self.versions = np.zeros((0, 0), dtype=np.int64)  # store version that last wrote each cell
+        self.count = np.zeros(0)
+        self.s1 = np.zeros(0)
+        self.s2 = np.zeros(0)
+        self.weight_sum = np.zeros(0)
+        self.weighted_sum = np.zeros(0)
+        self.categories = np.zeros((0, len(CATEGORIES)))
+        # disagreement, n, S1, S2, sum P_u, pairable units, then one count per category
+        self.totals = np.zeros(6 + len(CATEGORIES))
+
+    def _grow(self, segments, annotators):
+        rows, columns = self.labels.shape
+        if segments <= rows and annotators <= columns:
+            return
+        segments, annotators = max(segments, rows), max(annotators, columns)
+        for name in ("labels", "confidences"):
+            grown = np.full((segments, annotators), np.nan)
+            grown[:rows, :columns] = getattr(self, name)
+            setattr(self, name, grown)
+        versions = np.zeros((segments, annotators), dtype=np.int64)
+        versions[:rows, :columns] = self.versions
+        self.versions = versions
+        for name in ("count", "s1", "s2", "weight_sum", "weighted_sum"):
+            setattr(self, name, np.concatenate([getattr(self, name), np.zeros(segments - rows)]))
+        self.categories = np.vstack([self.categories, np.zeros((segments - rows, len(CATEGORIES)))])
+
+    def apply(self, rows: pd.DataFrame):
+        """Fold last-write-wins rows (as returned by AnnotationStore.read) into the matrix."""
+        if rows.empty:
+            return
+        for annotator_id in rows["annotator_id"].unique():
+            if annotator_id not in self._column:
+                self._column[annotator_id] = len(self.annotators)
+                self.annotators.append(annotator_id)
+        segment_index = rows["segment_index"].to_numpy(dtype=np.int64)
+        column = rows["annotator_id"].map(self._column).to_numpy(dtype=np.int64)
+        self._grow(segment_index.max() + 1, len(self.annotators))
+
+        touched = np.unique(segment_index)
+        self.totals -= _unit_totals(self.count[touched], self.s1[touched], self.s2[touched],
+                                    self.categories[touched])
+        self.labels[segment_index, column] = rows["snorkel_label"].to_numpy(dtype=np.float64)
+        self.confidences[segment_index, column] = rows["snorkel_confidence"].fillna(1.0).to_numpy(dtype=np.float64)
+        self.versions[segment_index, column] = rows["version"].to_numpy(dtype=np.int64)
+
+        labels = self.labels[touched]
+        present = ~np.isnan(labels)
+        filled = np.where(present, labels, 0.0)
+        weights = np.where(present, self.confidences[touched], 0.0)
+        self.count[touched] = present.sum(axis=1)
+        self.s1[touched] = filled.sum(axis=1)
+        self.s2[touched] = (filled ** 2).sum(axis=1)
+        self.weight_sum[touched] = weights.sum(axis=1)
+        self.weighted_sum[touched] = (weights * filled).sum(axis=1)
+        categories = categorize(filled)
+        self.categories[touched] = np.stack([(present & (categories == category)).sum(axis=1)
+                                             for category in CATEGORIES], axis=1)
+        self.totals += _unit_totals(self.count[touched], self.s1[touched], self.s2[touched],
+                                    self.categories[touched])
+        self.version = max(self.version, int(rows["version"].max()))
+
+    def krippendorff_alpha(self):
+        """Interval-metric alpha over the continuous labels; None until some segment has 2+ labels."""
+        disagreement, n, s1, s2 = self.totals[:4]
+        if n < 2:
+            return None
+        observed = disagreement / n
+        expected = 2 * (n * s2 - s1 ** 2) / (n * (n - 1))
+        if expected <= 1e-12:
+            return 1.0 if observed <= 1e-12 else None
+        return float(1 - observed / expected)
+
+    def fleiss_kappa(self):
+        """Kappa over the thresholded categories, allowing a varying number of raters per segment."""
+        pair_agreement, units = self.totals[4:6]
+        category_counts = self.totals[6:]
+        if units < 1:
+            return None
+        observed = pair_agreement / units
+        proportions = category_counts / category_counts.sum()
+        expected = float((proportions ** 2).sum())
+        if expected >= 1 - 1e-12:
+            return 1.0 if observed >= 1 - 1e-12 else None
+        return float((observed - expected) / (1 - expected))
+
+    def consensus(self, method="mean") -> pd.DataFrame:
+        """Consensus label per labeled segment and its thresholded TRUE/FALSE/ABSTAIN value."""
+        labeled = np.flatnonzero(self.count > 0)
+        count = self.count[labeled]
+        if method == "mean":
+            values = self.s1[labeled] / count
+        elif method == "median":
+            values = np.nanmedian(self.labels[labeled], axis=1) if len(labeled) else np.zeros(0)
+        elif method == "weighted":
+            weight_sum = self.weight_sum[labeled]
+            values = np.where(weight_sum > 0, self.weighted_sum[labeled] / np.where(weight_sum > 0, weight_sum, 1),
+                              self.s1[labeled] / count)
+        else:
+            raise ValueError(f"Unknown consensus method '{method}' (expected one of {CONSENSUS_METHODS})")
+        return pd.DataFrame({
+            "segment_index": labeled,
+            "n_labels": count.astype(np.int64),
+            "consensus": values,
+            "label": categorize(values).astype(np.int64),
+        })
+
+    def rows(self, since=None):
+        """Every current label as columns, or only those written after version `since`."""
+        present = ~np.isnan(self.labels)
+        if since is not None:
+            present &= self.versions > since
+        segment_index, column = np.nonzero(present)
+        return {
+            "segment_index": segment_index.tolist(),
+            "annotator_id": [self.annotators[i] for i in column],
+            "snorkel_label": self.labels[segment_index, column].tolist(),
+            "snorkel_confidence": self.confidences[segment_index, column].tolist(),
+            "version": self.versions[segment_index, column].tolist(),
+        }
+
+    def summary(self):
+        return {
+            "version": self.version,
+            "annotators": list(self.annotators),
+            "segments_labeled": int((self.count > 0).sum()),
+            "segments_multiply_labeled": int(self.totals[5]),
+            "krippendorff_alpha": self.krippendorff_alpha(),
+            "fleiss_kappa": self.fleiss_kappa(),
+        }
+
+
+class Aggregator:
+    """Per-signal aggregates kept in step with an AnnotationStore through version deltas."""
+
+    def __init__(self, store):
+        self.store = store
+        self.listeners = []  # called as listener(signal_id, rows) with each delta applied
+        self._signals = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, signal_id):
+        with self._locks_guard:
+            return self._locks.setdefault(signal_id, threading.Lock())
+
+    def get(self, signal_id) -> SignalAggregate:
+        """Aggregate for a signal, built on first use and then brought up to date with new writes."""
+        with self._lock(signal_id):
+            aggregate = self._signals.get(signal_id)
+            if aggregate is None:
+                aggregate = SignalAggregate()
+                aggregate.apply(self.store.read(signal_id))
+                self._signals[signal_id] = aggregate
+            else:
+                delta = self.store.read(signal_id, since=aggregate.version)
+                aggregate.apply(delta)
+                if not delta.empty:
+                    for listener in self.listeners:
+                        listener(signal_id, delta)
+            return aggregate
+
+    def refresh(self, signal_id):
+        """Apply new writes to a signal that is already aggregated; others are built lazily by get()."""
+        aggregate = self._signals.get(signal_id)
+        if aggregate is not None and self.store.version(signal_id) > aggregate.version:
+            self.get(signal_id)
+
+    def rows(self, signal_id, since=None):
+        """(version, SignalAggregate.rows) read under the signal's lock, so no delta lands halfway."""
+        aggregate = self.get(signal_id)
+        with self._lock(signal_id):
+            return aggregate.version, aggregate.rows(since)
+
+
+if __name__ == "__main__":
+    from storage import open_store
+
+    parser = argparse.ArgumentParser(description="Consensus labels and inter-annotator agreement")
+    parser.add_argument("signal_ids", nargs="*", help="defaults to every signal in the registry")
+    parser.add_argument("--method", choices=CONSENSUS_METHODS, default="mean")
+    parser.add_argument("--store", choices=("csv", "sqlite"), default=os.environ.get("ANNOTATION_STORE", "csv"))
+    parser.add_argument("--db", default=os.environ.get("ANNOTATION_DB", "annotations.db"))
+    parser.add_argument("--annotation-dir", default="annotations")
+    parser.add_argument("--compiled-dir", default="compiled")
+    parser.add_argument("--log-dir", default="annotation_log")
+    parser.add_argument("--registry", default="signal_registry.json")
+    args = parser.parse_args()
+
+    signal_ids = args.signal_ids
+    if not signal_ids:
+        with open(args.registry) as f:
+            signal_ids = [signal["id"] for signal in json.load(f)["signals"]]
+
+    aggregator = Aggregator(open_store(args.store, args.log_dir, args.annotation_dir, args.compiled_dir, args.db))
+    for signal_id in signal_ids:
+        aggregate = aggregator.get(signal_id)
+        summary = aggregate.summary()
+        if not summary["segments_labeled"]:
+            print(f"{signal_id}: no annotations")
+            continue
+        out_path = os.path.join(args.compiled_dir, f"{signal_id}_consensus.csv")
+        aggregate.consensus(args.method).to_csv(out_path, index=False)
+        alpha, kappa = summary["krippendorff_alpha"], summary["fleiss_kappa"]
+        print(f"{signal_id}: {summary['segments_labeled']} segments, {len(summary['annotators'])} annotators, "
+              f"alpha={'n/a' if alpha is None else f'{alpha:.3f}'}, "
+              f"kappa={'n/a' if kappa is None else f'{kappa:.3f}'} -> {out_path}")
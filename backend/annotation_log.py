@@ -0,0 +1,295 @@
+import json
+import numbers
+import os
+import threading
+from collections import defaultdict
+
+import pandas as pd
+
+from metrics import COMPACTION_PHASE_SECONDS
+from utils import file_lock
+
+"""
+Append-only annotation store.
+
+Each flush appends its rows to a per-signal JSONL log, so a flush costs
+O(rows flushed) no matter how many annotations already exist. Reads resolve
+duplicates last-write-wins on (segment_index, annotator_id). A background
+compaction folds the log into the compiled `{signal_id}_merged.csv` and the
+per-annotator `{annotator_id}_{signal_id}.csv` files, which remain the
+on-disk format other tools consume.
+
+Every append is stamped with a per-signal `version` that only ever grows, so
+clients can ask for just the rows written after the version they last saw.
+
+Per signal, rows live in up to three places, oldest to newest:
+    compiled/{signal_id}_merged.csv        last compacted view
+    log/{signal_id}.jsonl.compacting       log being folded in right now
+    log/{signal_id}.jsonl                  live log
+
+Several server processes may share the directories (uvicorn --workers N):
+appends, the compaction swap and publish steps hold log/{signal_id}.lock
+exclusively and reads hold it shared, and each process notices writes made by
+the others from the live log's inode and size before handing out a version.
+"""
+
+KEY_COLUMNS = ["segment_index", "annotator_id"]
+LOG_HEAD_BYTES = 128  # enough of the first row to tell two generations of a live log apart
+
+
+def since_version(df, since):
+    if since is None or df.empty:
+        return df
+    return df[df["version"] > since].reset_index(drop=True)
+
+
+def _key_error(row):
+    """Why a row has no usable (segment_index, annotator_id), or None."""
+    if not isinstance(row, dict):
+        return "not an object"
+    if isinstance(row.get("segment_index"), bool) or not isinstance(row.get("segment_index"), numbers.Integral):
+        return "segment_index must be an integer"
+    if isinstance(row.get("annotator_id"), bool) or not isinstance(row.get("annotator_id"), (str, numbers.Integral)):
+        return "annotator_id must be a string"
+    return None
+
+
+def row_error(row):
+    """Why a row cannot be appended, or None."""
+    error = _key_error(row)
+    if error is None and (isinstance(row.get("snorkel_label"), bool)
+                          or not isinstance(row.get("snorkel_label"), numbers.Real)):
+        error = "snorkel_label must be a number"
+    return error
+
+
+def resolve_last_write(frames):
+    frames = [df for df in frames if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame()
+    combined = pd.concat(frames).drop_duplicates(subset=KEY_COLUMNS, keep="last")
+    # rows written before versioning existed count as version 0
+    combined["version"] = combined["version"].fillna(0).astype(int) if "version" in combined else 0
+    return combined.sort_values(by="segment_index", kind="stable").reset_index(drop=True)
+
+
+def _read_jsonl(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        lines = f.read().split("\n")
+    # the last element is whatever follows the final newline: empty, or a
+    # record torn by a crash mid-append, which never became durable
+    rows = [json.loads(line) for line in lines[:-1] if line.strip()]
+    if lines[-1].strip():
+        print(f"⚠️ Skipping partial trailing line in {path}")
+    # rows without a usable key predate append() checking them; they cannot be resolved
+    bad = sum(_key_error(row) is not None for row in rows)
+    if bad:
+        print(f"⚠️ Skipping {bad} rows without segment_index/annotator_id in {path}")
+        rows = [row for row in rows if _key_error(row) is None]
+    if not rows:
+        return None
+    df = pd.DataFrame(rows)
+    df["annotator_id"] = df["annotator_id"].astype(str)
+    return df
+
+
+def _read_csv(path):
+    if not os.path.exists(path):
+        return None
+    # annotator IDs such as "12345" must stay strings to match uploaded rows
+    return pd.read_csv(path, dtype={"annotator_id": str})
+
+
+def _write_csv_atomic(df, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+class AnnotationLog:
+    def __init__(self, log_dir, annotation_dir, compiled_dir):
+        self.log_dir = log_dir
+        self.annotation_dir = annotation_dir
+        self.compiled_dir = compiled_dir
+        os.makedirs(log_dir, exist_ok=True)
+        # Held briefly by appends, the log swap at the start of a compaction,
+        # reads, and the publish step at the end of a compaction
+        self._locks = defaultdict(threading.Lock)
+        # Only one compaction per signal at a time
+        self._compaction_locks = defaultdict(threading.Lock)
+        # signal_id -> {"version": latest, "annotators": {annotator_id: (version, last segment_index)},
+        # "stamp": (inode, size) of the live log as of this state, "head": its first bytes},
+        # built from disk the first time a signal is touched
+        self._state = {}
+
+    def log_path(self, signal_id):
+        return os.path.join(self.log_dir, f"{signal_id}.jsonl")
+
+    def compiled_path(self, signal_id):
+        return os.path.join(self.compiled_dir, f"{signal_id}_merged.csv")
+
+    def annotator_path(self, annotator_id, signal_id):
+        return os.path.join(self.annotation_dir, f"{annotator_id}_{signal_id}.csv")
+
+    def lock_path(self, signal_id):
+        return os.path.join(self.log_dir, f"{signal_id}.lock")
+
+    def _log_stamp(self, signal_id):
+        try:
+            stat = os.stat(self.log_path(signal_id))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def _load_frames(self, signal_id):
+        # caller holds self._locks[signal_id]
+        log_path = self.log_path(signal_id)
+        return [_read_csv(self.compiled_path(signal_id)), _read_jsonl(f"{log_path}.compacting"), _read_jsonl(log_path)]
+
+    def _signal_state(self, signal_id):
+        # caller holds self._locks[signal_id] and the signal's file lock
+        state = self._state.get(signal_id)
+        stamp = self._log_stamp(signal_id)
+        if state is not None and state["stamp"] != stamp and not self._apply_log_tail(signal_id, state, stamp):
+            state = None  # another process compacted this signal
+        if state is None:
+            df = resolve_last_write(self._load_frames(signal_id))
+            state = {"version": 0, "annotators": {}, "stamp": stamp, "head": b""}
+            if stamp is not None:
+                with open(self.log_path(signal_id), "rb") as f:
+                    state["head"] = f.read(LOG_HEAD_BYTES)
+            if not df.empty:
+                state["version"] = int(df["version"].max())
+                for annotator_id, group in df.groupby("annotator_id"):
+                    state["annotators"][annotator_id] = (int(group["version"].max()), int(group["segment_index"].max()))
+            self._state[signal_id] = state
+        return state
+
+    def _apply_log_tail(self, signal_id, state, stamp):
+        """Catch up with rows another process appended to the same live log; False if it is a different log."""
+        old = state["stamp"]
+        if old is None or stamp is None or stamp[0] != old[0] or stamp[1] < old[1]:
+            return False
+        with open(self.log_path(signal_id), "rb") as f:
+            if f.read(len(state["head"])) != state["head"]:
+                return False  # a new log that happens to reuse the old inode
+            f.seek(old[1])
+            tail = f.read()
+        tail = tail[:tail.rfind(b"\n") + 1]
+        for line in tail.splitlines():
+            if line.strip():
+                row = json.loads(line)
+                if _key_error(row) is None:
+                    self._advance(state, row)
+                elif isinstance(row, dict) and isinstance(row.get("version"), int):
+                    state["version"] = max(state["version"], row["version"])  # unreadable, but its version is taken
+        state["stamp"] = (old[0], old[1] + len(tail))
+        return True
+
+    @staticmethod
+    def _advance(state, row):
+        version = int(row["version"])
+        state["version"] = max(state["version"], version)
+        _, last_segment = state["annotators"].get(row["annotator_id"], (0, -1))
+        state["annotators"][row["annotator_id"]] = (version, max(last_segment, int(row["segment_index"])))
+
+    def append(self, signal_id, rows):
+        if not rows:
+            return 0
+        # checked before anything is written: a row the log cannot resolve would break every later read
+        for row in rows:
+            error = row_error(row)
+            if error is not None:
+                raise ValueError(f"Refusing to append to {signal_id}: {error} in {row!r}")
+        with self._locks[signal_id], file_lock(self.lock_path(signal_id)):
+            state = self._signal_state(signal_id)
+            version = state["version"] + 1
+            rows = [{**row, "annotator_id": str(row["annotator_id"]), "version": version} for row in rows]
+            payload = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+            with open(self.log_path(signal_id), "a") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+                stat = os.fstat(f.fileno())
+            for row in rows:
+                self._advance(state, row)
+            if state["stamp"] is None:
+                state["head"] = payload[:LOG_HEAD_BYTES].encode()
+            state["stamp"] = (stat.st_ino, stat.st_size)
+        return len(rows)
+
+    def read(self, signal_id, annotator_id=None, since=None) -> pd.DataFrame:
+        with self._locks[signal_id], file_lock(self.lock_path(signal_id), shared=True):
+            frames = self._load_frames(signal_id)
+        df = resolve_last_write(frames)
+        if annotator_id is not None and not df.empty:
+            df = df[df["annotator_id"] == annotator_id].reset_index(drop=True)
+        return since_version(df, since)
+
+    def version(self, signal_id, annotator_id=None):
+        """Latest version written for the signal (or one annotator's rows on it); 0 if none."""
+        with self._locks[signal_id], file_lock(self.lock_path(signal_id), shared=True):
+            state = self._signal_state(signal_id)
+            if annotator_id is None:
+                return state["version"]
+            return state["annotators"].get(annotator_id, (0, None))[0]
+
+    def progress(self, signal_id, annotator_id):
+        """Highest segment_index the annotator has labeled on the signal, or None."""
+        with self._locks[signal_id], file_lock(self.lock_path(signal_id), shared=True):
+            return self._signal_state(signal_id)["annotators"].get(annotator_id, (0, None))[1]
+
+    def pending_signals(self):
+        pending = set()
+        for name in os.listdir(self.log_dir):
+            for suffix in (".jsonl", ".jsonl.compacting"):
+                if name.endswith(suffix):
+                    pending.add(name[:-len(suffix)])
+        return pending
+
+    def compact(self, signal_id):
+        """Fold the live log into the compiled and per-annotator CSVs."""
+        with self._compaction_locks[signal_id], file_lock(os.path.join(self.log_dir, f"{signal_id}.compact.lock")):
+            log_path = self.log_path(signal_id)
+            compacting_path = f"{log_path}.compacting"
+            with self._locks[signal_id], file_lock(self.lock_path(signal_id)):
+                # A leftover .compacting file means an earlier compaction died
+                # part way; it is folded in again (last-write-wins makes that safe)
+                if not os.path.exists(compacting_path):
+                    if not os.path.exists(log_path):
+                        return 0
+                    self._signal_state(signal_id)  # catch up before the log moves away
+                    os.replace(log_path, compacting_path)
+                    if signal_id in self._state:
+                        self._state[signal_id].update(stamp=None, head=b"")
+            with COMPACTION_PHASE_SECONDS.time(("read",)):
+                new_df = _read_jsonl(compacting_path)
+                if new_df is None:
+                    with self._locks[signal_id], file_lock(self.lock_path(signal_id)):
+                        os.remove(compacting_path)
+                    return 0
+                compiled_file = self.compiled_path(signal_id)
+                compiled = _read_csv(compiled_file)
+
+            with COMPACTION_PHASE_SECONDS.time(("resolve",)):
+                merged = resolve_last_write([compiled, new_df])
+                annotators = new_df["annotator_id"].unique()
+
+            with self._locks[signal_id], file_lock(self.lock_path(signal_id)), \
+                    COMPACTION_PHASE_SECONDS.time(("write",)):
+                _write_csv_atomic(merged, compiled_file)
+                for annotator_id in annotators:
+                    _write_csv_atomic(merged[merged["annotator_id"] == annotator_id],
+                                      self.annotator_path(annotator_id, signal_id))
+                os.remove(compacting_path)
+            return len(new_df)
+
+    def compact_all(self):
+        compacted = {}
+        for signal_id in self.pending_signals():
+            count = self.compact(signal_id)
+            if count:
+                compacted[signal_id] = count
+        return compacted
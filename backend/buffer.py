@@ -0,0 +1,183 @@
+import glob
+import json
+import os
+import threading
+import time
+
+"""
+In-memory annotation buffer with a durable write-ahead log.
+
+Uploads are appended (fsync'd) to the WAL and then to their
+(annotator_id, signal_id) shard. A save cycle first rotates the WAL, then
+detaches and writes each shard's rows in turn, with no buffer-wide lock held
+while writing. Once a cycle has been
+persisted, the WAL files sealed up to that rotation are deleted; anything not
+yet persisted when the process dies is replayed from the WAL on startup.
+
+Whoever takes rows out of a shard (save cycle, manual flush) holds the key's
+write lock until they are in the store, so rows of one key reach the store in
+the order they were uploaded. Rows whose write failed are logged again to the
+current WAL as a retry record, so a key that keeps failing never holds back
+deleting the sealed files of every other key. Replay puts a file's retry
+records ahead of its uploads, since they are older.
+"""
+
+
+class _Shard:
+    __slots__ = ("lock", "write_lock", "rows")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # held from detach until the rows are stored
+        self.rows = []
+
+
+class AnnotationBuffer:
+    def __init__(self, wal_dir):
+        self.wal_dir = wal_dir
+        os.makedirs(wal_dir, exist_ok=True)
+        self._shards = {}
+        self._shards_lock = threading.Lock()
+        # Serializes WAL writes with rotation, so a detached batch always
+        # matches exactly the WAL files sealed with it
+        self._wal_lock = threading.Lock()
+        self._wal = None
+        self._oldest = None  # monotonic time of the first add since the last seal
+        self._sequence = max([self._sequence_of(path) for path in self._sealed_files()], default=0)
+        self._replayed = None  # seal taken by the last replay()
+
+    @property
+    def wal_path(self):
+        return os.path.join(self.wal_dir, "buffer.wal")
+
+    def _sealed_files(self):
+        return sorted(glob.glob(os.path.join(self.wal_dir, "buffer.wal.*")), key=self._sequence_of)
+
+    @staticmethod
+    def _sequence_of(path):
+        return int(path.rsplit(".", 1)[1])
+
+    def _shard(self, key):
+        shard = self._shards.get(key)
+        if shard is None:
+            with self._shards_lock:
+                shard = self._shards.setdefault(key, _Shard())
+        return shard
+
+    def _write_wal(self, record):
+        if self._wal is None:
+            self._wal = open(self.wal_path, "a")
+        self._wal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+
+    def add(self, key, rows):
+        annotator_id, signal_id = key
+        shard = self._shard(key)
+        with self._wal_lock:
+            self._write_wal({"annotator_id": annotator_id, "signal_id": signal_id, "annotations": rows})
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            with shard.lock:
+                shard.rows.extend(rows)
+                return len(shard.rows)
+
+    def __len__(self):
+        return sum(len(shard.rows) for shard in list(self._shards.values()))
+
+    def oldest_age(self):
+        """Seconds since the oldest row still waiting for a save cycle was added, or None."""
+        oldest = self._oldest
+        return None if oldest is None else time.monotonic() - oldest
+
+    def sizes(self):
+        return {key: len(shard.rows) for key, shard in list(self._shards.items()) if shard.rows}
+
+    def key_lock(self, key):
+        """Hold around detach() and the store write, so one key's writes never overtake each other."""
+        return self._shard(key).write_lock
+
+    def detach(self, key):
+        """Swap out one key's rows. They stay in the WAL until the next completed cycle."""
+        shard = self._shards.get(key)
+        if shard is None:
+            return []
+        with shard.lock:
+            rows, shard.rows = shard.rows, []
+        return rows
+
+    def seal(self):
+        """
+        Rotate the WAL; every row added so far is in a sealed file. Returns the
+        seal to pass to `release` once those rows have been detached and stored.
+        """
+        with self._wal_lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            self._oldest = None
+            if os.path.exists(self.wal_path):
+                self._sequence += 1
+                os.replace(self.wal_path, os.path.join(self.wal_dir, f"buffer.wal.{self._sequence}"))
+            return self._sequence
+
+    def restore(self, key, rows):
+        """Put back rows whose write failed, ahead of anything buffered since."""
+        annotator_id, signal_id = key
+        shard = self._shard(key)
+        with self._wal_lock:
+            # the sealed files holding these rows may be deleted once the cycle ends
+            self._write_wal({"annotator_id": annotator_id, "signal_id": signal_id, "annotations": rows,
+                             "retry": True})
+            if self._oldest is None:
+                self._oldest = time.monotonic()  # approximate: the rows are older than this
+            with shard.lock:
+                shard.rows[:0] = rows
+
+    def release(self, seal):
+        # a manual flush may still be writing rows from these WAL files
+        for shard in list(self._shards.values()):
+            with shard.write_lock:
+                pass
+        for path in self._sealed_files():
+            if self._sequence_of(path) <= seal:
+                os.remove(path)
+
+    def replay(self, write):
+        """
+        Call write((annotator_id, signal_id), rows) for each WAL record left by
+        a previous process, oldest first, before accepting uploads. The WAL is
+        sealed first, so rows `write` restores land in a fresh file that
+        discard_wal() keeps. Returns the number of rows replayed.
+        """
+        replayed = 0
+        self._replayed = self.seal()
+        for path in self._sealed_files():
+            records = []
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # torn final write from a crash
+            for record in sorted(records, key=lambda record: not record.get("retry")):
+                try:
+                    key, rows = (record["annotator_id"], record["signal_id"]), record["annotations"]
+                except (KeyError, TypeError):
+                    print(f"⚠️ Skipping malformed WAL record in {path}: {record!r}")
+                    continue
+                write(key, rows)
+                replayed += len(rows)
+        return replayed
+
+    def discard_wal(self):
+        """Delete the WAL files the last replay() read."""
+        if self._replayed is not None:
+            self.release(self._replayed)
+        self._replayed = None
+
+    def close(self):
+        with self._wal_lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from metrics import call_profiled
+
+"""
+Bounded executors for the blocking endpoint work.
+
+Each class of endpoint (signal reads, annotation reads/writes, uploads) gets
+its own small thread pool and a cap on how many requests may wait for it, so
+a burst of large signal loads cannot occupy the threads that uploads and
+annotation reads need. Cheap handlers stay on the event loop and never wait
+behind either. Requests beyond the cap are refused with 503 + Retry-After
+rather than queued without bound.
+"""
+
+
+class EndpointPool:
+    def __init__(self, name, workers, max_queue):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._semaphore = None
+        self._loop = None
+
+    def _slots(self):
+        # asyncio primitives belong to one event loop; test clients may run several
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._semaphore
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this pool's threads once one is free."""
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail=f"Too many pending {self.name} requests",
+                                headers={"Retry-After": "1"})
+        slots = self._slots()
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            # the request's context (and with it the profiler hook) follows the work onto the thread
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(context.run, call_profiled, fn, *args, **kwargs))
+        finally:
+            self.active -= 1
+            slots.release()
+
+    def snapshot(self):
+        return {"workers": self.workers, "active": self.active, "waiting": self.waiting,
+                "max_queue": self.max_queue, "rejected": self.rejected}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def offload(pool):
+    """Turn a blocking endpoint function into an async one that runs on `pool`."""
+    def decorator(fn):
+        @functools.wraps(fn)  # keeps the signature FastAPI reads parameters from
+        async def endpoint(*args, **kwargs):
+            return await pool.run(fn, *args, **kwargs)
+        return endpoint
+    return decorator
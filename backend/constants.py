@@ -0,0 +1,23 @@
+# Shared with annotatorkit/constants.py -- keep segmenting in sync with the GUI
+SAMPLE_RATE = 125
+
+#Approximate Entropy
+TOLERANCE_R = 0.2
+EMBEDDING_DIMENSION = 2
+
+PPG_SIGNAL_COLUMN_NAME_1 = '8032_PPG_00'
+PPG_SIGNAL_COLUMN_NAME_2 = 'TAG_8032_PPG_00'
+TIMESTAMP_COLUMN_NAME = 'TIMESTAMP'
+
+OVERLAP = 0.5
+WINDOW_WIDTH = 5 #seconds
+SEGMENT_LENGTH = WINDOW_WIDTH * SAMPLE_RATE
+SEGMENT_STRIDE = int(SEGMENT_LENGTH * (1 - OVERLAP))
+
+TRUE = 1
+FALSE = 0
+ABSTAIN = -1
+LABEL_THRESHOLD = 0.25
+
+RATIO_SAMPLES_LENGTH = 0.1
+TRAINING_SEG_LENGTH = 120
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+from constants import SAMPLE_RATE, SEGMENT_LENGTH, SEGMENT_STRIDE, LABEL_THRESHOLD, ABSTAIN
+from lod import ppg_column
+from signal_io import read_signal_range
+
+"""
+Training-dataset export.
+
+Joins every signal with its consensus labels (see aggregation.py) and writes
+the labeled segments as fixed-width float32 windows in sharded .npy files
+that training loaders can np.load(..., mmap_mode="r"):
+
+    {out}/{signal_id}/{split}-00000.x.npy          (count, width) float32
+    {out}/{signal_id}/{split}-00000.label.npy      (count,) int8, TRUE/FALSE/ABSTAIN
+    {out}/{signal_id}/{split}-00000.consensus.npy  (count,) float32
+    {out}/{signal_id}/{split}-00000.segment.npy    (count,) int64 segment_index
+    {out}/manifest.json
+
+Signals are read a chunk of segments at a time through the row-group range
+reader, so memory stays at one chunk plus one shard per split. Windows are
+exported at the native SAMPLE_RATE (SEGMENT_LENGTH samples) unless
+--resample-to asks for another width, in which case they go through a
+low-pass polyphase resampler so decimation does not alias the PPG. A
+--validation-fraction of windows goes to the "val" split, assigned by blocks
+of consecutive segments so overlapping neighbours never straddle train and val.
+
+    python export.py --out exports/dataset --workers 4
+    python export.py --out exports/dataset_120 --resample-to 120
+"""
+
+CHUNK_SEGMENTS = 2048  # segments read from the parquet per pass
+SHARD_SIZE = 8192  # windows per shard file
+VALIDATION_BLOCK = 64  # consecutive segments that always share a split
+VALIDATION_FRACTION = 0.1
+KAISER_BETA = 5.0  # anti-aliasing filter window, as in scipy.signal.resample_poly
+
+
+def split_of(signal_id, segment_index, validation_fraction=VALIDATION_FRACTION):
+    """"train" or "val" for each segment, stable across runs and machines."""
+    blocks = np.asarray(segment_index) // VALIDATION_BLOCK
+    seed = zlib.crc32(signal_id.encode())
+    hashed = (blocks.astype(np.uint64) * np.uint64(2654435761) + np.uint64(seed)) % np.uint64(1 << 32)
+    return np.where(hashed / float(1 << 32) < validation_fraction, "val", "train")
+
+
+@lru_cache(maxsize=8)
+def _resampling_matrix(length, width):
+    """
+    (length, width) matrix applying scipy.signal.resample_poly's default filter:
+    upsample by `up`, Kaiser-windowed sinc low-pass at the lower Nyquist rate,
+    downsample by `down`, with the same zero-padded edges and alignment.
+    """
+    divisor = gcd(length, width)
+    up, down = width // divisor, length // divisor
+    rate = max(up, down)
+    half_length = 10 * rate
+    taps = np.arange(2 * half_length + 1) - half_length
+    fir = np.sinc(taps / rate) / rate * np.kaiser(len(taps), KAISER_BETA)
+    fir *= up / fir.sum()
+    # output n sees input k through tap n * down - k * up
+    tap = np.arange(width)[None, :] * down - np.arange(length)[:, None] * up
+    inside = np.abs(tap) <= half_length
+    return np.where(inside, fir[np.clip(tap + half_length, 0, len(fir) - 1)], 0.0)
+
+
+def resample(windows, width):
+    """Resample each row of `windows` to `width` samples, low-pass filtered against aliasing."""
+    if windows.shape[1] == width:
+        return windows
+    return windows @ _resampling_matrix(windows.shape[1], width)
+
+
+class ShardWriter:
+    def __init__(self, directory, split, shard_size):
+        self.directory = directory
+        self.split = split
+        self.shard_size = shard_size
+        self.parts = []
+        self.buffered = 0
+        self.shards = []
+
+    def add(self, x, label, consensus, segment_index):
+        self.parts.append((x, label, consensus, segment_index))
+        self.buffered += len(x)
+        while self.buffered >= self.shard_size:
+            self._write(self.shard_size)
+
+    def close(self):
+        if self.buffered:
+            self._write(self.buffered)
+        return self.shards
+
+    def _write(self, count):
+        columns = [np.concatenate(column) for column in zip(*self.parts)]
+        rest = [column[count:] for column in columns]
+        self.parts = [tuple(rest)] if len(rest[0]) else []
+        self.buffered = len(rest[0])
+
+        stem = f"{self.split}-{len(self.shards):05d}"
+        entry = {"split": self.split, "count": count}
+        for name, values, dtype in zip(("x", "label", "consensus", "segment"), columns,
+                                       (np.float32, np.int8, np.float32, np.int64)):
+            file_name = f"{stem}.{name}.npy"
+            np.save(os.path.join(self.directory, file_name), values[:count].astype(dtype))
+            entry[name] = file_name
+        self.shards.append(entry)
+
+
+def export_signal(signal_id, path, labels, out_dir, width=SEGMENT_LENGTH, shard_size=SHARD_SIZE,
+                  include_abstain=False, validation_fraction=VALIDATION_FRACTION):
+    """
+    Write one signal's labeled windows. `labels` is {"segment_index", "consensus",
+    "label"} as arrays (an aggregation consensus table). Returns manifest shard entries.
+    """
+    segment_index = np.asarray(labels["segment_index"], dtype=np.int64)
+    consensus = np.asarray(labels["consensus"], dtype=np.float64)
+    label = np.asarray(labels["label"], dtype=np.int64)
+    keep = np.ones(len(segment_index), dtype=bool) if include_abstain else label != ABSTAIN
+    order = np.argsort(segment_index[keep], kind="stable")
+    segment_index, consensus, label = segment_index[keep][order], consensus[keep][order], label[keep][order]
+    split = split_of(signal_id, segment_index, validation_fraction)
+
+    directory = os.path.join(out_dir, signal_id)
+    os.makedirs(directory, exist_ok=True)
+    writers = {name: ShardWriter(directory, name, shard_size) for name in ("train", "val")}
+    column = ppg_column(path)
+    offsets = np.arange(SEGMENT_LENGTH)
+
+    chunk_of = segment_index // CHUNK_SEGMENTS
+    boundaries = np.flatnonzero(np.diff(chunk_of)) + 1
+    for chunk in np.split(np.arange(len(segment_index)), boundaries):
+        if not len(chunk):
+            continue
+        first, last = segment_index[chunk[0]], segment_index[chunk[-1]]
+        start = first * SEGMENT_STRIDE
+        values = read_signal_range(path, start, last * SEGMENT_STRIDE + SEGMENT_LENGTH, columns=[column])
+        values = values.column(0).to_numpy(zero_copy_only=False).astype(np.float64)
+
+        # segments past the end of the signal (stale labels) are dropped
+        positions = (segment_index[chunk] - first) * SEGMENT_STRIDE
+        complete = positions + SEGMENT_LENGTH <= len(values)
+        chunk, positions = chunk[complete], positions[complete]
+        windows = values[positions[:, None] + offsets]
+        finite = np.isfinite(windows).all(axis=1)
+        chunk, windows = chunk[finite], resample(windows[finite], width)
+
+        for name, writer in writers.items():
+            selected = split[chunk] == name
+            if selected.any():
+                rows = chunk[selected]
+                writer.add(windows[selected], label[rows], consensus[rows], segment_index[rows])
+
+    shards = []
+    for writer in writers.values():
+        for entry in writer.close():
+            shards.append({"signal_id": signal_id, **entry,
+                           **{name: f"{signal_id}/{entry[name]}" for name in ("x", "label", "consensus", "segment")}})
+    return shards
+
+
+def _export(job):
+    return export_signal(*job[:4], **job[4])
+
+
+def export_all(jobs, out_dir, workers=None, width=SEGMENT_LENGTH, **options):
+    """
+    Export (signal_id, path, labels) jobs in parallel, one process per signal,
+    then write {out_dir}/manifest.json.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    options = {"width": width, **options}
+    shards = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for (signal_id, _, _), signal_shards in zip(jobs, executor.map(
+                _export, [(signal_id, path, labels, out_dir, options) for signal_id, path, labels in jobs])):
+            shards.extend(signal_shards)
+            print(f"✅ {signal_id}: {sum(shard['count'] for shard in signal_shards)} windows")
+
+    manifest = {
+        "width": width,
+        "sample_rate": SAMPLE_RATE * width / SEGMENT_LENGTH,
+        "segment_length": SEGMENT_LENGTH,
+        "segment_stride": SEGMENT_STRIDE,
+        "label_threshold": LABEL_THRESHOLD,
+        "validation_fraction": options.get("validation_fraction", VALIDATION_FRACTION),
+        "include_abstain": options.get("include_abstain", False),
+        "windows": {split: sum(shard["count"] for shard in shards if shard["split"] == split)
+                    for split in ("train", "val")},
+        "shards": shards,
+    }
+    tmp_path = os.path.join(out_dir, "manifest.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, "manifest.json"))
+    return manifest
+
+
+if __name__ == "__main__":
+    from aggregation import Aggregator, CONSENSUS_METHODS
+    from storage import open_store
+
+    parser = argparse.ArgumentParser(description="Export labeled windows as sharded .npy training data")
+    parser.add_argument("signal_ids", nargs="*", help="defaults to every signal in the registry")
+    parser.add_argument("--out", default=os.path.join("exports", "dataset"))
+    parser.add_argument("--method", choices=CONSENSUS_METHODS, default="mean")
+    parser.add_argument("--resample-to", type=int, default=SEGMENT_LENGTH,
+                        help=f"samples per exported window (default {SEGMENT_LENGTH}, the native rate)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--validation-fraction", type=float, default=VALIDATION_FRACTION,
+                        help="share of windows in the val split")
+    parser.add_argument("--include-abstain", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--signal-dir", default="signals")
+    parser.add_argument("--registry", default="signal_registry.json")
+    parser.add_argument("--store", choices=("csv", "sqlite"), default=os.environ.get("ANNOTATION_STORE", "csv"))
+    parser.add_argument("--db", default=os.environ.get("ANNOTATION_DB", "annotations.db"))
+    parser.add_argument("--annotation-dir", default="annotations")
+    parser.add_argument("--compiled-dir", default="compiled")
+    parser.add_argument("--log-dir", default="annotation_log")
+    args = parser.parse_args()
+
+    signal_ids = args.signal_ids
+    if not signal_ids:
+        with open(args.registry) as f:
+            signal_ids = [signal["id"] for signal in json.load(f)["signals"]]
+
+    # Consensus is cheap and needs the store, so it is computed here; the
+    # workers only read parquet and write shards
+    aggregator = Aggregator(open_store(args.store, args.log_dir, args.annotation_dir, args.compiled_dir, args.db))
+    jobs = []
+    for signal_id in signal_ids:
+        consensus = aggregator.get(signal_id).consensus(args.method)
+        if consensus.empty:
+            print(f"Skipping {signal_id}: no annotations")
+            continue
+        jobs.append((signal_id, os.path.join(args.signal_dir, f"{signal_id}.parquet"),
+                     {column: consensus[column].to_numpy() for column in ("segment_index", "consensus", "label")}))
+
+    manifest = export_all(jobs, args.out, args.workers, width=args.resample_to, shard_size=args.shard_size,
+                          include_abstain=args.include_abstain, validation_fraction=args.validation_fraction)
+    print(f"📦 {manifest['windows']['train']} train / {manifest['windows']['val']} val windows -> {args.out}")
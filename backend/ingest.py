@@ -0,0 +1,212 @@
+import argparse
+import csv
+import fcntl
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+from constants import PPG_SIGNAL_COLUMN_NAME_1, PPG_SIGNAL_COLUMN_NAME_2, TIMESTAMP_COLUMN_NAME, SEGMENT_STRIDE
+
+"""
+Signal ingestion: raw CSV or parquet recordings in, range-read friendly
+parquet plus a registry entry out.
+
+The source is streamed in record batches, so recordings larger than memory
+are fine. Only the timestamp and PPG columns are kept; the output is
+zstd-compressed with row groups of ROW_GROUP_SEGMENTS * SEGMENT_STRIDE rows,
+so every row group starts on a segment boundary and a segment read touches at
+most two row groups. The registry entry records the sample count and the
+sha256 of the written file (the same value /signal_hash serves), and the
+registry itself is rewritten atomically under a file lock, so the server and
+several ingest runs can update it concurrently.
+
+    python ingest.py raw/*.csv --workers 4
+    python ingest.py recording.parquet --id patient_07
+"""
+
+ROW_GROUP_SEGMENTS = 256  # ~80k rows per row group at the default stride
+ROW_GROUP_ROWS = ROW_GROUP_SEGMENTS * SEGMENT_STRIDE
+COMPRESSION = "zstd"
+SUPPORTED_SUFFIXES = (".csv", ".parquet")
+
+
+def detect_ppg_column(names):
+    for name in (PPG_SIGNAL_COLUMN_NAME_1, PPG_SIGNAL_COLUMN_NAME_2):
+        if name in names:
+            return name
+    raise ValueError(f"No PPG column ({PPG_SIGNAL_COLUMN_NAME_1} or {PPG_SIGNAL_COLUMN_NAME_2}) in {list(names)}")
+
+
+def signal_id_for(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r"[^A-Za-z0-9._-]", "_", stem)
+
+
+def _source_batches(source_path):
+    """(kept column names, iterator of record batches) for a CSV or parquet source."""
+    if source_path.endswith(".parquet"):
+        source = pq.ParquetFile(source_path)
+        names = source.schema_arrow.names
+        columns = [name for name in (TIMESTAMP_COLUMN_NAME, detect_ppg_column(names)) if name in names]
+        return columns, source.iter_batches(batch_size=ROW_GROUP_ROWS, columns=columns)
+    if source_path.endswith(".csv"):
+        with open(source_path, newline="") as f:
+            names = [name.strip() for name in next(csv.reader(f), [])]
+        ppg_column = detect_ppg_column(names)
+        columns = [name for name in (TIMESTAMP_COLUMN_NAME, ppg_column) if name in names]
+        reader = pv.open_csv(source_path,
+                             read_options=pv.ReadOptions(block_size=16 << 20),
+                             convert_options=pv.ConvertOptions(include_columns=columns,
+                                                               column_types={ppg_column: pa.float64()}))
+        return columns, reader
+    raise ValueError(f"Unsupported file type {source_path} (expected one of {SUPPORTED_SUFFIXES})")
+
+
+def ingest_file(source_path, signal_dir, signal_id=None):
+    """Convert one recording into {signal_dir}/{signal_id}.parquet; returns its registry entry."""
+    signal_id = signal_id or signal_id_for(source_path)
+    columns, batches = _source_batches(source_path)
+    out_path = os.path.join(signal_dir, f"{signal_id}.parquet")
+    tmp_path = out_path + f".{os.getpid()}.tmp"
+
+    length = 0
+    pending = []
+    pending_rows = 0
+    writer = None
+    try:
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= ROW_GROUP_ROWS:
+                table = pa.Table.from_batches(pending)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema, compression=COMPRESSION)
+                writer.write_table(table.slice(0, ROW_GROUP_ROWS), row_group_size=ROW_GROUP_ROWS)
+                rest = table.slice(ROW_GROUP_ROWS)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+                length += ROW_GROUP_ROWS
+        if pending_rows or writer is None:
+            table = pa.Table.from_batches(pending) if pending else None
+            if writer is None:
+                if table is None:
+                    raise ValueError(f"{source_path} has no samples")
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression=COMPRESSION)
+            writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+            length += pending_rows
+        writer.close()
+        writer = None
+
+        digest = hashlib.sha256()
+        with open(tmp_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        os.replace(tmp_path, out_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        "id": signal_id,
+        "filename": f"{signal_id}.parquet",
+        "length": length,
+        "sha256": digest.hexdigest(),
+        "ppg_column": columns[-1],
+    }
+
+
+def signal_exists(signal_dir, registry_path, signal_id):
+    """True if the id is registered or its parquet is already in signal_dir."""
+    if os.path.exists(os.path.join(signal_dir, f"{signal_id}.parquet")):
+        return True
+    try:
+        with open(registry_path) as f:
+            return any(signal["id"] == signal_id for signal in json.load(f)["signals"])
+    except FileNotFoundError:
+        return False
+
+
+def update_registry(registry_path, entries):
+    """Insert or replace registry entries by id, atomically and under an exclusive lock."""
+    with open(registry_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(registry_path) as f:
+                registry = json.load(f)
+        except FileNotFoundError:
+            registry = {"signals": []}
+        by_id = {entry["id"]: entry for entry in entries}
+        signals = [by_id.pop(signal["id"], signal) for signal in registry["signals"]]
+        registry["signals"] = signals + list(by_id.values())
+
+        tmp_path = registry_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(registry, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, registry_path)
+    return registry
+
+
+def _ingest(job):
+    source_path, signal_dir, signal_id = job
+    try:
+        return source_path, ingest_file(source_path, signal_dir, signal_id), None
+    except Exception as e:
+        return source_path, None, str(e)
+
+
+def ingest_all(sources, signal_dir, registry_path, workers=None, overwrite=False):
+    """
+    Ingest (source_path, signal_id or None) pairs in parallel, one process per
+    file, then register every successful one in a single registry update.
+    Ids that already exist are skipped as failures unless `overwrite`.
+    """
+    os.makedirs(signal_dir, exist_ok=True)
+    entries, failures = [], {}
+    jobs = []
+    for source_path, signal_id in sources:
+        signal_id = signal_id or signal_id_for(source_path)
+        if not overwrite and signal_exists(signal_dir, registry_path, signal_id):
+            print(f"❌ {source_path}: signal '{signal_id}' already exists (pass --overwrite to replace it)")
+            failures[source_path] = "exists"
+            continue
+        jobs.append((source_path, signal_dir, signal_id))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for source_path, entry, error in executor.map(_ingest, jobs):
+            if error:
+                print(f"❌ {source_path}: {error}")
+                failures[source_path] = error
+            else:
+                print(f"✅ {source_path} -> {entry['filename']} ({entry['length']} samples)")
+                entries.append(entry)
+    if entries:
+        update_registry(registry_path, entries)
+    return entries, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert raw recordings into signal parquet files and register them")
+    parser.add_argument("sources", nargs="+", help="CSV or parquet recordings")
+    parser.add_argument("--id", help="signal id (single source only); defaults to the file name")
+    parser.add_argument("--signal-dir", default="signals")
+    parser.add_argument("--registry", default="signal_registry.json")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--overwrite", action="store_true",
+                        help="replace signals that already exist; their annotations are kept as they are")
+    args = parser.parse_args()
+
+    if args.id and len(args.sources) > 1:
+        parser.error("--id needs exactly one source")
+    entries, failures = ingest_all([(source, args.id) for source in args.sources],
+                                   args.signal_dir, args.registry, args.workers, args.overwrite)
+    print(f"📥 Registered {len(entries)} signals, {len(failures)} failed")
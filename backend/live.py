@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+"""
+Server-push of annotation updates as Server-Sent Events, for supervisors
+following a campaign and annotators overlaying each other's labels.
+
+Each connection to a signal gets a bounded asyncio queue on the event loop.
+Upload and save threads call publish_buffered() / publish_flushed(), which
+encode an event once and hand the bytes to the loop with
+call_soon_threadsafe; the loop appends the same bytes to every subscriber's
+queue, so fan-out is one put per subscriber and never touches the store.
+Flushed rows arrive through the Aggregator's delta listener, and snapshots
+are served from the aggregate's in-memory matrix, so a new subscriber costs
+no file reads either. A subscriber that falls LIVE_QUEUE_SIZE events behind
+is sent `reset` and disconnected; it resumes from Last-Event-ID.
+
+    event: snapshot   every current label on the signal, once per connection
+    event: buffered   rows just uploaded to this worker, not yet durable
+    event: flushed    rows written to the store; the event id is their version
+
+Every data payload is {"signal_id", "version", "rows"}, with rows as columns
+(segment_index, annotator_id, snorkel_label, snorkel_confidence, version).
+"""
+
+LIVE_QUEUE_SIZE = 256
+LIVE_HEARTBEAT = 15  # seconds between keep-alive comments
+# Streams end after this long and the client reconnects with Last-Event-ID;
+# uvicorn waits for open responses on shutdown, so they must not be endless
+LIVE_MAX_SECONDS = 300
+RETRY_MS = 1000
+ROW_COLUMNS = ("segment_index", "annotator_id", "snorkel_label", "snorkel_confidence", "version")
+
+
+def encode_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+def _columns(records):
+    """Column lists from upload payload dicts; missing fields come out as None."""
+    return {column: [record.get(column) for record in records] for column in ROW_COLUMNS}
+
+
+class _Subscriber:
+    def __init__(self, size):
+        self.queue = asyncio.Queue(size)
+        self.dropped = False
+
+
+class LiveUpdates:
+    def __init__(self, queue_size=LIVE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.loop = None
+        self._subscribers = {}  # signal_id -> set of _Subscriber; changed on the loop only
+
+    def bind(self, loop):
+        self.loop = loop
+
+    def signals(self):
+        return [signal_id for signal_id, subscribers in list(self._subscribers.items()) if subscribers]
+
+    def subscriber_count(self):
+        return sum(len(subscribers) for subscribers in list(self._subscribers.values()))
+
+    def subscribe(self, signal_id):
+        subscriber = _Subscriber(self.queue_size)
+        self._subscribers.setdefault(signal_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, signal_id, subscriber):
+        subscribers = self._subscribers.get(signal_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[signal_id]
+
+    def _publish(self, signal_id, version, message):
+        # any thread; a signal nobody watches costs one dict lookup
+        if self.loop is None or not self._subscribers.get(signal_id):
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._fan_out, signal_id, version, message)
+        except RuntimeError:
+            pass  # loop already closed during shutdown
+
+    def _fan_out(self, signal_id, version, message):
+        for subscriber in list(self._subscribers.get(signal_id, ())):
+            try:
+                subscriber.queue.put_nowait((version, message))
+            except asyncio.QueueFull:
+                subscriber.dropped = True
+                self.unsubscribe(signal_id, subscriber)
+
+    def publish_buffered(self, signal_id, rows):
+        if self._subscribers.get(signal_id):
+            self._publish(signal_id, None, encode_event("buffered", {
+                "signal_id": signal_id, "version": None, "rows": _columns(rows)}))
+
+    def publish_flushed(self, signal_id, rows):
+        """Aggregator listener: `rows` is the store delta just applied."""
+        if not self._subscribers.get(signal_id):
+            return
+        version = int(rows["version"].max())
+        columns = {column: rows[column].tolist() for column in ROW_COLUMNS}
+        columns["snorkel_confidence"] = [None if value != value else value for value in columns["snorkel_confidence"]]
+        self._publish(signal_id, version, encode_event("flushed", {
+            "signal_id": signal_id, "version": version, "rows": columns}, event_id=version))
+
+    async def events(self, signal_id, subscriber, first, version, heartbeat=LIVE_HEARTBEAT,
+                     max_seconds=LIVE_MAX_SECONDS):
+        """
+        SSE body for one subscriber: `first` (the snapshot, or b""), then queued
+        events. Flushed events at or below `version` are already in `first`.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_seconds
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode() + first
+            while True:
+                if subscriber.dropped and subscriber.queue.empty():
+                    yield encode_event("reset", {"signal_id": signal_id, "reason": "subscriber too slow"})
+                    return
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    event_version, message = await asyncio.wait_for(subscriber.queue.get(),
+                                                                    min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if event_version is not None and event_version <= version:
+                    continue
+                yield message
+        finally:
+            self.unsubscribe(signal_id, subscriber)
+
+
+def snapshot_event(signal_id, version, rows, since=None):
+    """First event of a stream: the full snapshot, or on resume the rows written after `since`."""
+    if since is None:
+        return encode_event("snapshot", {"signal_id": signal_id, "version": version, "rows": rows}, event_id=version)
+    if not rows["segment_index"]:
+        return b""
+    return encode_event("flushed", {"signal_id": signal_id, "version": version, "rows": rows}, event_id=version)
@@ -0,0 +1,151 @@
+import os
+import threading
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from constants import PPG_SIGNAL_COLUMN_NAME_1, PPG_SIGNAL_COLUMN_NAME_2
+from signal_io import read_signal_range
+
+"""
+Min/max decimation pyramid for overview rendering of whole recordings.
+
+Level 0 holds the min and max of every BASE_BUCKET samples; each level above
+merges LEVEL_FACTOR buckets of the one below, up to a level of at most
+TOP_BUCKETS buckets. The pyramid is built once per signal by streaming the
+parquet and cached next to it as `{signal_id}.lod.npz`, rebuilt whenever the
+parquet is newer than the cache.
+"""
+
+BASE_BUCKET = 32
+LEVEL_FACTOR = 4
+TOP_BUCKETS = 512
+BATCH_BUCKETS = 8192
+
+# path -> (parquet mtime, levels); levels[k] = (mins, maxs) with bucket size BASE_BUCKET * LEVEL_FACTOR**k
+_pyramids = {}
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+
+def ppg_column(path):
+    names = pq.ParquetFile(path).schema_arrow.names
+    return PPG_SIGNAL_COLUMN_NAME_1 if PPG_SIGNAL_COLUMN_NAME_1 in names else PPG_SIGNAL_COLUMN_NAME_2
+
+
+def lod_path(path):
+    return path[:-len(".parquet")] + ".lod.npz"
+
+
+def bucket_size(level):
+    return BASE_BUCKET * LEVEL_FACTOR ** level
+
+
+def _reduce(values, size, func):
+    usable = len(values) // size * size
+    reduced = func(values[:usable].reshape(-1, size), axis=1)
+    if usable < len(values):
+        reduced = np.append(reduced, func(values[usable:]))
+    return reduced
+
+
+def build_pyramid(path):
+    """Stream the signal once and return the list of (mins, maxs) levels."""
+    mins, maxs = [], []
+    carry = np.empty(0, dtype=np.float32)
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=BASE_BUCKET * BATCH_BUCKETS, columns=[ppg_column(path)]):
+        values = np.concatenate([carry, batch.column(0).to_numpy(zero_copy_only=False).astype(np.float32)])
+        usable = len(values) // BASE_BUCKET * BASE_BUCKET
+        chunks = values[:usable].reshape(-1, BASE_BUCKET)
+        mins.append(chunks.min(axis=1))
+        maxs.append(chunks.max(axis=1))
+        carry = values[usable:]
+    if len(carry):
+        mins.append(carry.min(keepdims=True))
+        maxs.append(carry.max(keepdims=True))
+
+    level_min = np.concatenate(mins) if mins else np.empty(0, dtype=np.float32)
+    level_max = np.concatenate(maxs) if maxs else np.empty(0, dtype=np.float32)
+    levels = [(level_min, level_max)]
+    while len(level_min) > TOP_BUCKETS:
+        level_min = _reduce(level_min, LEVEL_FACTOR, np.min)
+        level_max = _reduce(level_max, LEVEL_FACTOR, np.max)
+        levels.append((level_min, level_max))
+    return levels
+
+
+def _save(levels, path):
+    arrays = {}
+    for level, (mins, maxs) in enumerate(levels):
+        arrays[f"min_{level}"] = mins
+        arrays[f"max_{level}"] = maxs
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_path, base_bucket=BASE_BUCKET, level_factor=LEVEL_FACTOR, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _load(path):
+    with np.load(path) as data:
+        if int(data["base_bucket"]) != BASE_BUCKET or int(data["level_factor"]) != LEVEL_FACTOR:
+            return None
+        levels = []
+        while f"min_{len(levels)}" in data:
+            levels.append((data[f"min_{len(levels)}"], data[f"max_{len(levels)}"]))
+        return levels
+
+
+def get_pyramid(path):
+    mtime = os.path.getmtime(path)
+    cached = _pyramids.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(path, threading.Lock())
+    with lock:
+        cached = _pyramids.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        cache_file = lod_path(path)
+        levels = None
+        if os.path.exists(cache_file) and os.path.getmtime(cache_file) >= mtime:
+            levels = _load(cache_file)
+        if levels is None:
+            levels = build_pyramid(path)
+            _save(levels, cache_file)
+        _pyramids[path] = (mtime, levels)
+        return levels
+
+
+def _fit(size, mins, maxs, points):
+    """Merge runs of adjacent buckets so that at most `points` remain."""
+    factor = -(-len(mins) // points)
+    if factor <= 1:
+        return size, mins, maxs
+    return size * factor, _reduce(mins, factor, np.min), _reduce(maxs, factor, np.max)
+
+
+def overview(path, start, end, points):
+    """
+    Min/max envelope of samples [start, end) in at most `points` buckets: the
+    coarsest level that still has at least `points` buckets in the range, with
+    neighbouring buckets merged down to `points`. Deep zooms with fewer than
+    2 * points samples are built from the raw samples (min == max when they fit).
+    """
+    if end - start <= 2 * points:
+        table = read_signal_range(path, start, end, columns=[ppg_column(path)])
+        values = table.column(0).to_numpy(zero_copy_only=False).astype(np.float32)
+        size, mins, maxs = _fit(1, values, values, points)
+        return {"level": None, "bucket_size": size, "start": start, "min": mins, "max": maxs}
+
+    levels = get_pyramid(path)
+    level = 0
+    for candidate in range(len(levels) - 1, -1, -1):
+        if (end - start) // bucket_size(candidate) >= points:
+            level = candidate
+            break
+    size = bucket_size(level)
+    first, last = start // size, -(-end // size)
+    mins, maxs = levels[level]
+    size, mins, maxs = _fit(size, mins[first:last], maxs[first:last], points)
+    return {"level": level, "bucket_size": size, "start": first * bucket_size(level), "min": mins, "max": maxs}
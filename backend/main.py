@@ -1,72 +1,235 @@
 # backend/main.py
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
 import pandas as pd
 import os
 import json
-from utils import merge_annotations, load_registry, is_valid_annotator
-from collections import defaultdict
+from utils import load_registry_bytes, is_valid_annotator, is_admin
+from storage import open_store
+from signal_io import (read_signal_range, signal_length, segment_bounds, content_hash, encode_raw, encode_arrow,
+                       encode_compact, RAW_DTYPE, COMPACT_FORMATS)
+from lod import overview
+from quality import load_features, FEATURE_COLUMNS
+from scheduler import next_segments
+from aggregation import Aggregator, CONSENSUS_METHODS
+from ingest import ingest_file, update_registry, signal_exists, signal_id_for, SUPPORTED_SUFFIXES
+from buffer import AnnotationBuffer
+from spool import SpoolBuffer, SaverLease
+from saver import FlushPool
+from concurrency import EndpointPool, offload
+from compression import CompressionMiddleware
+from metrics import (MetricsMiddleware, Gauge, render_metrics, SAVE_CYCLE_SECONDS, SAVE_LAG_SECONDS)
+from live import LiveUpdates, snapshot_event
+import asyncio
 import time
 import threading
+import uuid
 from contextlib import asynccontextmanager
-from threading import Lock
-
-buffer_lock = Lock()
-
 
 
 SIGNAL_DIR = "signals"
 ANNOTATION_DIR = "annotations"
 COMPILED_DIR = "compiled"
+LOG_DIR = "annotation_log"
+WAL_DIR = "buffer_wal"
+SPOOL_DIR = "buffer_spool"
+DEAD_LETTER_FILE = "rejected_annotations.jsonl"  # buffered rows the store could never accept
+# "memory" (one process) or "spool" (shared by every process of uvicorn --workers N)
+ANNOTATION_BUFFER = os.environ.get("ANNOTATION_BUFFER", "memory")
+# "csv" (append-only log + compiled CSVs) or "sqlite"
+ANNOTATION_STORE = os.environ.get("ANNOTATION_STORE", "csv")
+ANNOTATION_DB = os.environ.get("ANNOTATION_DB", "annotations.db")
 REGISTRY_FILE = "signal_registry.json"
+INCOMING_DIR = os.path.join(SIGNAL_DIR, ".incoming")  # request bodies spooled here during /ingest
 
 os.makedirs(SIGNAL_DIR, exist_ok=True)
 os.makedirs(ANNOTATION_DIR, exist_ok=True)
 os.makedirs(COMPILED_DIR, exist_ok=True)
 
-annotation_buffer = defaultdict(list)  # Keyed by (annotator_id, signal_id)
+if ANNOTATION_BUFFER == "spool":
+    annotation_buffer = SpoolBuffer(SPOOL_DIR)
+    saver_lease = SaverLease(os.path.join(SPOOL_DIR, "saver.lock"))
+elif ANNOTATION_BUFFER == "memory":
+    annotation_buffer = AnnotationBuffer(WAL_DIR)  # Sharded by (annotator_id, signal_id)
+    saver_lease = SaverLease(os.path.join(WAL_DIR, "saver.lock"))
+else:
+    raise ValueError(f"Unknown ANNOTATION_BUFFER '{ANNOTATION_BUFFER}' (expected 'memory' or 'spool')")
 SAVE_INTERVAL = 30  # write every 30 Seconds
+FLUSH_WORKERS = int(os.environ.get("FLUSH_WORKERS", "4"))  # signals written concurrently per save cycle
+COMPACT_INTERVAL = 300  # fold the append-only log into the CSVs every 5 minutes
+
+annotation_store = open_store(ANNOTATION_STORE, LOG_DIR, ANNOTATION_DIR, COMPILED_DIR, ANNOTATION_DB)
+flush_pool = FlushPool(annotation_store, FLUSH_WORKERS, DEAD_LETTER_FILE)
+aggregator = Aggregator(annotation_store)  # consensus/agreement, updated from each flush
+live_updates = LiveUpdates()  # /live subscribers; flushed rows come from the aggregator's deltas
+aggregator.listeners.append(live_updates.publish_flushed)
+LIVE_POLL_INTERVAL = 2  # spool mode: how often watched signals are checked for other workers' flushes
+
+# Blocking endpoint work runs on one bounded pool per endpoint class so slow
+# signal reads cannot starve uploads; cheap endpoints stay on the event loop
+signal_pool = EndpointPool("signal", int(os.environ.get("SIGNAL_WORKERS", "4")), max_queue=64)  # segment-sized reads
+bulk_pool = EndpointPool("bulk", int(os.environ.get("BULK_WORKERS", "2")), max_queue=32)  # whole-signal work
+annotation_pool = EndpointPool("annotation", int(os.environ.get("ANNOTATION_WORKERS", "4")), max_queue=64)
+upload_pool = EndpointPool("upload", 2, max_queue=256)  # WAL appends are serialized anyway
+endpoint_pools = (signal_pool, bulk_pool, annotation_pool, upload_pool)
+shutdown_event = threading.Event()
+
+
+def _buffered_by_signal():
+    per_signal = {}
+    for (_, signal_id), size in annotation_buffer.sizes().items():
+        per_signal[(signal_id,)] = per_signal.get((signal_id,), 0) + size
+    return per_signal
+
+# Read at scrape time only, so the upload path pays nothing for them
+Gauge("ppg_buffered_annotations", "Annotations waiting for the next save cycle", ("signal_id",),
+      collect=_buffered_by_signal)
+Gauge("ppg_buffer_oldest_age_seconds", "Age of the oldest annotation waiting for a save cycle",
+      collect=lambda: {(): annotation_buffer.oldest_age()})
+Gauge("ppg_seconds_since_save_cycle", "Seconds since the last completed save cycle",
+      collect=lambda: {(): flush_pool.metrics.snapshot()["seconds_since_last_cycle"]})
+Gauge("ppg_live_subscribers", "Open /live streams", collect=lambda: {(): live_updates.subscriber_count()})
+Gauge("ppg_endpoint_pool_active", "Requests running on each endpoint pool", ("pool",),
+      collect=lambda: {(pool.name,): pool.active for pool in endpoint_pools})
+Gauge("ppg_endpoint_pool_waiting", "Requests waiting for each endpoint pool", ("pool",),
+      collect=lambda: {(pool.name,): pool.waiting for pool in endpoint_pools})
+
+def save_cycle():
+    # Uploads keep flowing while we write; each key is only locked while its own rows are stored.
+    # Rows whose write failed were put back durably by restore(), so the sealed WAL can always go.
+    oldest_age = annotation_buffer.oldest_age()
+    seal = annotation_buffer.seal()
+    keys = list(annotation_buffer.sizes())
+    if not keys:
+        annotation_buffer.release(seal)
+        return
+    written, failed = flush_pool.run(annotation_buffer, keys)
+    print(f"[Saver] Saved {written} annotations for {len(keys)} keys")
+    for signal_id in {signal_id for _, signal_id in keys}:
+        aggregator.refresh(signal_id)
+    annotation_buffer.release(seal)
+    elapsed = flush_pool.metrics.last_cycle_seconds
+    SAVE_CYCLE_SECONDS.observe(elapsed)
+    if oldest_age is not None and not failed:
+        SAVE_LAG_SECONDS.observe(oldest_age + elapsed)
+    if elapsed > SAVE_INTERVAL:
+        print(f"⚠️ [Saver] Cycle took {elapsed:.1f}s, longer than SAVE_INTERVAL ({SAVE_INTERVAL}s)")
+
+def replay_write(key, rows):
+    try:
+        flush_pool.write(key, rows)
+    except Exception as e:
+        # keep serving: the rows go back to the buffer and the save cycle retries them
+        print(f"⚠️ Could not replay {len(rows)} annotations for {key}, keeping them buffered: {e}")
+        annotation_buffer.restore(key, rows)
+
+def replay_wal():
+    replayed = annotation_buffer.replay(replay_write)
+    annotation_buffer.discard_wal()
+    if replayed:
+        print(f"♻️ Replayed {replayed} buffered annotations from WAL")
+
+def is_saver():
+    """
+    Exactly one process runs save cycles and compaction. In spool mode the
+    other workers only buffer, and one of them takes over if the saver exits.
+    """
+    if saver_lease.held:
+        return True
+    if not saver_lease.acquire():
+        return False
+    replay_wal()
+    return True
 
 def background_saver():
+    while not shutdown_event.wait(SAVE_INTERVAL):
+        if is_saver():
+            save_cycle()
+
+def refresh_watched_signals():
+    for signal_id in live_updates.signals():
+        aggregator.refresh(signal_id)
+
+async def poll_other_workers():
+    # In spool mode flushes also happen in other processes; the cheap version
+    # check in aggregator.refresh picks them up for this worker's subscribers
     while True:
-        time.sleep(SAVE_INTERVAL)
-        with buffer_lock:
-            for key, buffer in list(annotation_buffer.items()):
-                if buffer:
-                    print(f"[Saver] Saving {len(buffer)} for {key}")
-                    annotator_id, signal_id = key
-                    annot_file = os.path.join(ANNOTATION_DIR, f"{annotator_id}_{signal_id}.csv")
-                    compiled_file = os.path.join(COMPILED_DIR, f"{signal_id}_merged.csv")
-                    new_df = pd.DataFrame(buffer)
-                    merge_annotations(new_df, annot_file, compiled_file)
-                    annotation_buffer[key].clear()
-                    print(f"Saved {len(new_df)} annotations for {key}")
+        await asyncio.sleep(LIVE_POLL_INTERVAL)
+        if live_updates.signals():
+            try:
+                await annotation_pool.run(refresh_watched_signals)
+            except Exception as e:
+                print(f"[Live] Could not refresh watched signals: {e}")
+
+def background_compactor():
+    while not shutdown_event.wait(COMPACT_INTERVAL):
+        if not saver_lease.held:
+            continue
+        try:
+            for signal_id, count in annotation_store.compact_all().items():
+                print(f"[Compactor] Folded {count} logged annotations into {signal_id}_merged.csv")
+        except Exception as e:
+            print(f"[Compactor] Compaction failed: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    threading.Thread(target=background_saver, daemon=True).start()
-    print("🟢 Background saver started.")
+    if not is_saver() and ANNOTATION_BUFFER == "memory":
+        # a second process on the same in-memory buffer would lose uploads on flush
+        raise RuntimeError("Another server process is using this directory; "
+                           "set ANNOTATION_BUFFER=spool to run several workers")
+    saver = threading.Thread(target=background_saver, daemon=True)
+    saver.start()
+    threading.Thread(target=background_compactor, daemon=True).start()
+    live_updates.bind(asyncio.get_running_loop())
+    poller = asyncio.create_task(poll_other_workers()) if ANNOTATION_BUFFER == "spool" else None
+    print(f"🟢 Background saver started ({'saving' if saver_lease.held else 'standby'}, pid {os.getpid()}).")
     yield
-    # Optional: Add final cleanup here
+    if poller is not None:
+        poller.cancel()
+    shutdown_event.set()
+    saver.join()
+    if saver_lease.held:
+        save_cycle()  # final flush of whatever is still buffered; other workers' rows stay spooled
+    flush_pool.shutdown()
+    for pool in endpoint_pools:
+        pool.shutdown()
+    annotation_buffer.close()
+    if saver_lease.held:
+        annotation_store.compact_all()
+        saver_lease.release()
     print("🔴 Server shutdown: lifespan ended.")
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)  # outermost, so it sees compressed byte counts
+
+class AnnotationRow(BaseModel):
+    model_config = ConfigDict(extra="allow")  # extra fields are stored as sent
+
+    segment_index: int
+    annotator_id: str
+    snorkel_label: float
+    snorkel_confidence: Optional[float] = None
+    start: Optional[int] = None
+    end: Optional[int] = None
 
 class AnnotationUpload(BaseModel):
     annotator_id: str
     signal_id: str
-    annotations: list  # List of dicts
+    annotations: List[AnnotationRow]
 
 @app.get("/signals")
-def list_signals():
+async def list_signals():
     try:
-        return load_registry(REGISTRY_FILE)
+        return Response(content=load_registry_bytes(REGISTRY_FILE), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/load_signal/{signal_id}/{annotator_id}")
+@offload(bulk_pool)
 def load_signal(signal_id: str, annotator_id: str):
     if not is_valid_annotator(annotator_id):
         raise HTTPException(status_code=403, detail="Invalid annotator ID")
@@ -77,48 +240,353 @@ def load_signal(signal_id: str, annotator_id: str):
     df = pd.read_parquet(file_path)
     return JSONResponse(content=df.to_dict(orient="records"))
 
+@app.get("/signal_range/{signal_id}/{annotator_id}")
+@offload(signal_pool)
+def signal_range(signal_id: str, annotator_id: str, start: int = None, count: int = None,
+                 segment: int = None, segments: int = 1, format: str = "raw", quantum: float = 1.0):
+    """
+    Columnar read of a slice of a signal, addressed either by sample offset
+    (`start`, `count`) or by segment index (`segment`, `segments`).
+
+    format=raw   -> every column as little-endian float64, back to back in the
+                    order given by the X-Columns header
+    format=arrow -> Arrow IPC stream
+    format=f32, delta16 -> PPG column only, as float32 or as int16 deltas of
+                    the samples rounded to multiples of `quantum`; see
+                    signal_io.encode_compact for the X-Encoding/X-Base/X-Scale
+                    and X-Timestamp-Start/-Step headers
+    Responses are zstd/gzip compressed when the client's Accept-Encoding allows.
+    """
+    if not is_valid_annotator(annotator_id):
+        raise HTTPException(status_code=403, detail="Invalid annotator ID")
+
+    file_path = os.path.join(SIGNAL_DIR, f"{signal_id}.parquet")
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Signal not found")
+    if format not in ("raw", "arrow") + COMPACT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {['raw', 'arrow', *COMPACT_FORMATS]}")
+    if not quantum > 0:
+        raise HTTPException(status_code=400, detail="quantum must be positive")
+
+    if segment is not None:
+        if segment < 0 or segments < 1:
+            raise HTTPException(status_code=400, detail="Invalid segment range")
+        start, end = segment_bounds(segment, segments)
+    elif start is not None and count is not None:
+        if start < 0 or count < 1:
+            raise HTTPException(status_code=400, detail="Invalid sample range")
+        end = start + count
+    else:
+        raise HTTPException(status_code=400, detail="Pass either start and count, or segment")
+
+    total = signal_length(file_path)
+    if start >= total:
+        raise HTTPException(status_code=416, detail=f"Range starts past end of signal ({total} samples)")
+
+    table = read_signal_range(file_path, start, end)
+    headers = {
+        "X-Start": str(start),
+        "X-Count": str(table.num_rows),
+        "X-Total-Samples": str(total),
+        "X-Columns": ",".join(table.column_names),
+    }
+    if format == "arrow":
+        return Response(content=encode_arrow(table), media_type="application/vnd.apache.arrow.stream", headers=headers)
+    if format in COMPACT_FORMATS:
+        body, compact_headers = encode_compact(table, format, quantum)
+        headers.update(compact_headers)
+        return Response(content=body, media_type="application/octet-stream", headers=headers)
+    headers["X-Dtype"] = RAW_DTYPE
+    return Response(content=encode_raw(table), media_type="application/octet-stream", headers=headers)
+
+@app.post("/ingest/{annotator_id}")
+async def ingest_signal(annotator_id: str, request: Request, filename: str, signal_id: str = None,
+                        overwrite: bool = False):
+    """
+    Ingest a raw recording sent as the request body (CSV or parquet, chosen by
+    `filename`'s extension): it is converted to segment-aligned parquet and
+    added to the registry. An existing id is refused with 409 unless an admin
+    passes `overwrite=true`; its annotations are kept as they are.
+
+        curl --data-binary @rec.csv "$URL/ingest/$ANNOTATOR?filename=rec.csv&signal_id=rec"
+    """
+    if not is_valid_annotator(annotator_id):
+        raise HTTPException(status_code=403, detail="Invalid annotator ID")
+    suffix = os.path.splitext(filename)[1].lower()
+    if suffix not in SUPPORTED_SUFFIXES:
+        raise HTTPException(status_code=400, detail=f"filename must end in one of {list(SUPPORTED_SUFFIXES)}")
+    signal_id = signal_id or signal_id_for(filename)
+    if signal_id_for(signal_id) != signal_id:
+        raise HTTPException(status_code=400, detail="signal_id may only contain letters, digits, '.', '_' and '-'")
+    if overwrite and not is_admin(annotator_id):
+        raise HTTPException(status_code=403, detail="Only admins may overwrite a signal")
+    if not overwrite and signal_exists(SIGNAL_DIR, REGISTRY_FILE, signal_id):
+        raise HTTPException(status_code=409, detail=f"Signal '{signal_id}' already exists")
+
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    spool_path = os.path.join(INCOMING_DIR, f"{uuid.uuid4().hex}{suffix}")
+    try:
+        # Stream the body to disk; the recording is never held in memory
+        with open(spool_path, "wb") as f:
+            async for chunk in request.stream():
+                f.write(chunk)
+
+        def convert():
+            if not overwrite and signal_exists(SIGNAL_DIR, REGISTRY_FILE, signal_id):
+                raise FileExistsError(signal_id)  # another upload registered it meanwhile
+            entry = ingest_file(spool_path, SIGNAL_DIR, signal_id)
+            update_registry(REGISTRY_FILE, [entry])
+            return entry
+
+        try:
+            entry = await bulk_pool.run(convert)
+        except FileExistsError:
+            raise HTTPException(status_code=409, detail=f"Signal '{signal_id}' already exists")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+    return {"status": "ingested", **entry}
+
+@app.get("/signal_hash/{signal_id}/{annotator_id}")
+@offload(bulk_pool)
+def signal_hash(signal_id: str, annotator_id: str):
+    """
+    Content hash of a signal file, so clients can tell whether a locally cached
+    copy is still current before reusing it.
+    """
+    if not is_valid_annotator(annotator_id):
+        raise HTTPException(status_code=403, detail="Invalid annotator ID")
+
+    file_path = os.path.join(SIGNAL_DIR, f"{signal_id}.parquet")
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Signal not found")
+    return {"hash": content_hash(file_path), "total_samples": signal_length(file_path)}
+
+@app.get("/overview/{signal_id}/{annotator_id}")
+@offload(signal_pool)
+def signal_overview(signal_id: str, annotator_id: str, start: int = 0, end: int = None, points: int = 1000):
+    """
+    Min/max envelope of samples [start, end) in at most `points` buckets, from
+    the signal's cached decimation pyramid. Bucket i covers samples
+    start + i * bucket_size onwards.
+    """
+    if not is_valid_annotator(annotator_id):
+        raise HTTPException(status_code=403, detail="Invalid annotator ID")
+
+    file_path = os.path.join(SIGNAL_DIR, f"{signal_id}.parquet")
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Signal not found")
+
+    total = signal_length(file_path)
+    end = total if end is None else min(end, total)
+    if start < 0 or start >= end or not 1 <= points <= 20000:
+        raise HTTPException(status_code=400, detail="Invalid overview range")
+
+    result = overview(file_path, start, end, points)
+    return {
+        "level": result["level"],
+        "bucket_size": result["bucket_size"],
+        "start": result["start"],
+        "total_samples": total,
+        "min": result["min"].tolist(),
+        "max": result["max"].tolist(),
+    }
+
+@app.get("/features/{signal_id}/{annotator_id}")
+@offload(bulk_pool)
+def signal_features(signal_id: str, annotator_id: str, sort_by: str = None, ascending: bool = True, limit: int = None):
+    """
+    Per-segment quality features as columns ({"segment_index": [...], "apen": [...], ...}),
+    optionally sorted by one feature and truncated to `limit` segments. Computed
+    and cached on first request if `python quality.py` has not been run.
+    """
+    if not is_valid_annotator(annotator_id):
+        raise HTTPException(status_code=403, detail="Invalid annotator ID")
+
+    file_path = os.path.join(SIGNAL_DIR, f"{signal_id}.parquet")
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Signal not found")
+    if sort_by is not None and sort_by not in FEATURE_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {FEATURE_COLUMNS}")
+
+    df = load_features(file_path)
+    if sort_by is not None:
+        df = df.sort_values(by=sort_by, ascending=ascending, kind="stable")
+    if limit is not None:
+        df = df.head(limit)
+    return {column: df[column].tolist() for column in df.columns}
+
+@app.get("/next_segments/{annotator_id}/{signal_id}")
+@offload(bulk_pool)
+def get_next_segments(annotator_id: str, signal_id: str, count: int = 20):
+    """
+    The `count` most uncertain segments this annotator has not labeled yet, best
+    first. Labels still sitting in the upload buffer are not seen here, so the
+    client also skips segments it has labeled locally.
+    """
+    if not is_valid_annotator(annotator_id):
+        raise HTTPException(status_code=403, detail="Invalid annotator ID")
+
+    file_path = os.path.join(SIGNAL_DIR, f"{signal_id}.parquet")
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Signal not found")
+    if not 1 <= count <= 1000:
+        raise HTTPException(status_code=400, detail="count must be between 1 and 1000")
+
+    top = next_segments(signal_id, annotator_id, file_path, annotation_store, count)
+    return {
+        "segments": top["segment_index"].astype(int).tolist(),
+        "scores": top["score"].round(4).tolist(),
+        "disagreement": top["disagreement"].round(4).tolist(),
+        "label_count": top["label_count"].astype(int).tolist(),
+    }
+
 @app.post("/upload_annotations")
+@offload(upload_pool)
 def upload_annotations(payload: AnnotationUpload):
     try:
         key = (payload.annotator_id, payload.signal_id)
-        with buffer_lock:
-            annotation_buffer[key].extend(payload.annotations)
-        return {"status": "buffered", "buffer_length": len(annotation_buffer[key])}
+        rows = [row.model_dump(exclude_unset=True) for row in payload.annotations]
+        buffer_length = annotation_buffer.add(key, rows)
+        live_updates.publish_buffered(payload.signal_id, rows)
+        return {"status": "buffered", "buffer_length": buffer_length}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     
 @app.post("/flush_annotations")
+@offload(annotation_pool)
 def flush_annotations(payload: AnnotationUpload):
     try:
         key = (payload.annotator_id, payload.signal_id)
-        buffer_data = annotation_buffer.pop(key, [])
+        # Held until the rows are stored, so a save cycle writing older rows of
+        # this key cannot land after them
+        with annotation_buffer.key_lock(key):
+            buffer_data = annotation_buffer.detach(key)
 
-        if not buffer_data:
-            return {"status": "nothing to flush"}
+            if not buffer_data:
+                return {"status": "nothing to flush"}
 
-        annot_file = os.path.join(ANNOTATION_DIR, f"{payload.annotator_id}_{payload.signal_id}.csv")
-        compiled_file = os.path.join(COMPILED_DIR, f"{payload.signal_id}_merged.csv")
-        new_df = pd.DataFrame(buffer_data)
-        merge_annotations(new_df, annot_file, compiled_file)
+            try:
+                count = flush_pool.write(key, buffer_data)
+            except Exception:
+                annotation_buffer.restore(key, buffer_data)
+                raise
+        aggregator.refresh(payload.signal_id)
 
-        return {"status": "flushed", "count": len(buffer_data)}
+        return {"status": "flushed", "count": count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/consensus/{signal_id}/{annotator_id}")
+@offload(bulk_pool)
+def get_consensus(signal_id: str, annotator_id: str, method: str = "mean", summary_only: bool = False):
+    """
+    Inter-annotator agreement for a signal plus, unless `summary_only`, the
+    consensus label of every labeled segment as columns, thresholded to
+    TRUE (1) / FALSE (0) / ABSTAIN (-1).
+    """
+    if not is_valid_annotator(annotator_id):
+        raise HTTPException(status_code=403, detail="Invalid annotator ID")
+    if method not in CONSENSUS_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {list(CONSENSUS_METHODS)}")
+
+    aggregate = aggregator.get(signal_id)
+    result = aggregate.summary()
+    if not summary_only:
+        df = aggregate.consensus(method)
+        result.update({column: df[column].tolist() for column in df.columns})
+    return result
+
+@app.get("/live/{signal_id}/{annotator_id}")
+async def live_annotations(signal_id: str, annotator_id: str, snapshot: bool = True,
+                           last_event_id: str = Header(default=None)):
+    """
+    Server-Sent Events stream of every annotator's label changes on a signal:
+    a snapshot of the current labels (unless `snapshot=false`), then rows as
+    they are uploaded (`buffered`) and written (`flushed`). Reconnecting with
+    Last-Event-ID resends only the rows written after that version. See live.py.
+
+        curl -N "$URL/live/$SIGNAL/$ANNOTATOR"
+    """
+    if not is_valid_annotator(annotator_id):
+        raise HTTPException(status_code=403, detail="Invalid annotator ID")
+    since = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    # Subscribe before taking the snapshot, so nothing flushed in between is missed
+    subscriber = live_updates.subscribe(signal_id)
+    try:
+        if snapshot or since is not None:
+            version, rows = await bulk_pool.run(aggregator.rows, signal_id, since)
+            first = snapshot_event(signal_id, version, rows, since)
+        else:
+            version, first = (await bulk_pool.run(aggregator.get, signal_id)).version, b""
+    except BaseException:
+        live_updates.unsubscribe(signal_id, subscriber)
+        raise
+    return StreamingResponse(live_updates.events(signal_id, subscriber, first, version),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/get_annotations/{annotator_id}/{signal_id}")
-def get_annotations(annotator_id: str, signal_id: str):
+@offload(annotation_pool)
+def get_annotations(annotator_id: str, signal_id: str, since: int = None,
+                    if_none_match: str = Header(default=None)):
+    """
+    All of the annotator's rows for the signal, or with `since` only those
+    written after that version. The X-Annotation-Version header (also the
+    ETag) is the version to pass as `since` next time.
+    """
     if not is_valid_annotator(annotator_id):
         raise HTTPException(status_code=403, detail="Invalid annotator ID")
-        
-    file_path = os.path.join("annotations", f"{annotator_id}_{signal_id}.csv")
-    if not os.path.exists(file_path):
+
+    # Read the version before the rows: a write landing in between is then
+    # re-sent on the next delta instead of being skipped
+    version = annotation_store.version(signal_id, annotator_id)
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "X-Annotation-Version": str(version)}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+
+    df = annotation_store.read(signal_id, annotator_id, since=since)
+    if df.empty and since is None:
         raise HTTPException(status_code=404, detail="Annotation file not found")
-    df = pd.read_csv(file_path)
-    return JSONResponse(content=df.to_dict(orient="records"))
+    # optional fields a row was uploaded without read back as NaN, which JSON cannot carry
+    return JSONResponse(content=df.astype(object).where(df.notna(), None).to_dict(orient="records"), headers=headers)
+
+@app.get("/progress/{annotator_id}/{signal_id}")
+@offload(annotation_pool)
+def progress(annotator_id: str, signal_id: str):
+    if not is_valid_annotator(annotator_id):
+        raise HTTPException(status_code=403, detail="Invalid annotator ID")
+    return {
+        "last_segment_index": annotation_store.progress(signal_id, annotator_id),
+        "version": annotation_store.version(signal_id, annotator_id),
+    }
+
+@app.get("/saver_metrics")
+async def saver_metrics():
+    metrics = flush_pool.metrics.snapshot()
+    metrics["flush_workers"] = FLUSH_WORKERS
+    metrics["save_interval"] = SAVE_INTERVAL
+    metrics["buffered_annotations"] = len(annotation_buffer)
+    metrics["buffered_keys"] = len(annotation_buffer.sizes())
+    metrics["buffer"] = ANNOTATION_BUFFER
+    metrics["pid"] = os.getpid()
+    metrics["is_saver"] = saver_lease.held
+    metrics["live_subscribers"] = live_updates.subscriber_count()
+    metrics["endpoint_pools"] = {pool.name: pool.snapshot() for pool in endpoint_pools}
+    return metrics
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the counters, gauges and histograms in metrics.py."""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/validate_annotator/{annotator_id}")
-def validate_annotator(annotator_id: str):
+async def validate_annotator(annotator_id: str):
     if not is_valid_annotator(annotator_id):
         raise HTTPException(status_code=403, detail="Invalid annotator ID")
     return {"status": "ok"}
@@ -0,0 +1,275 @@
+import bisect
+import contextvars
+import cProfile
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from utils import FileCache
+
+"""
+Low-overhead metrics in the Prometheus text format, plus an opt-in
+per-request profiler.
+
+Counters, gauges and histograms are plain dicts keyed by label values behind
+one lock each; recording is a dict lookup and an add, so the hot paths can
+afford it. Gauges may also be computed at scrape time from a callback, which
+is how buffer sizes and save lag are read without touching the upload path.
+
+Profiling is controlled by PROFILING_FILE (JSON, re-read when it changes, so
+no restart is needed):
+
+    {"token": "secret", "sample_rate": 0.0}
+
+A request carrying `X-Profile: secret`, or a random `sample_rate` fraction of
+requests, is run under cProfile (including the part that runs on an endpoint
+pool thread) and the stats are written to PROFILE_DIR; the file name comes
+back in the X-Profile-File header.
+"""
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PROFILING_FILE = "profiling.json"
+PROFILE_DIR = "profiles"
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                                 for labels, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        """`collect`, if given, returns {labels: value} at scrape time instead of set() values."""
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        if self.collect is not None:
+            try:
+                items = list(self.collect().items())
+            except Exception:
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                                 for labels, value in items if value is not None]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, labels=()):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, labels)
+
+    def render(self):
+        with self._lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items()]
+        lines = self._header()
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram("ppg_request_seconds", "Request latency by route", ("method", "route", "status"))
+RESPONSE_BYTES = Counter("ppg_response_bytes_total", "Response body bytes sent (after compression) by route",
+                         ("route",))
+STORE_APPEND_SECONDS = Histogram("ppg_store_append_seconds", "Annotation store append latency", ("engine",))
+COMPACTION_PHASE_SECONDS = Histogram("ppg_compaction_phase_seconds",
+                                     "Annotation log compaction time by phase (read, resolve, write)", ("phase",))
+SAVE_CYCLE_SECONDS = Histogram("ppg_save_cycle_seconds", "Background save cycle duration",
+                               buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+SAVE_LAG_SECONDS = Histogram("ppg_save_lag_seconds", "Age of the oldest buffered annotation when it was saved",
+                             buckets=(0.5, 1, 5, 10, 30, 45, 60, 120, 300))
+
+
+# --- profiling -------------------------------------------------------------
+
+_profiling_config = FileCache(PROFILING_FILE, lambda data: data, default={})
+_request_profiles = contextvars.ContextVar("request_profiles", default=None)
+_loop_profiler_lock = threading.Lock()  # one cProfile per thread at a time
+
+
+def should_profile(headers):
+    config = _profiling_config.get() or {}
+    token = config.get("token")
+    if token and headers.get(b"x-profile", b"").decode("latin-1") == token:
+        return True
+    return random.random() < float(config.get("sample_rate", 0.0))
+
+
+def call_profiled(fn, *args, **kwargs):
+    """Call fn, under cProfile if the current request is being profiled (for pool threads)."""
+    profiles = _request_profiles.get()
+    if profiles is None:
+        return fn(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        profiles.append(profiler)
+
+
+def _profile_path(route):
+    name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    return os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns() % 10**6:06d}-{name}.prof")
+
+
+def _write_profiles(profiles, route):
+    """Dump the request's merged stats; the file path, or None (logged) if no profile was written."""
+    if not profiles:
+        print(f"⚠️ No profile collected for {route}")
+        return None
+    path = _profile_path(route)
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stats = pstats.Stats(profiles[0])
+        for profiler in profiles[1:]:
+            stats.add(profiler)
+        stats.dump_stats(path)
+        if os.path.getsize(path) > 0:
+            return path
+        print(f"⚠️ Profile for {route} came out empty: {path}")
+    except (OSError, TypeError) as e:
+        # pstats raises TypeError for a profiler that recorded nothing
+        print(f"⚠️ Could not write profile for {route}: {e}")
+    return None
+
+
+# --- ASGI middleware -------------------------------------------------------
+
+class MetricsMiddleware:
+    """Records latency and response bytes per route template, and runs the profiler hook."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        status = 500
+        sent = 0
+        profiles = None
+        # While profiling, the response is held back until the stats are on
+        # disk, so x-profile-file only ever names a profile that exists
+        held = None
+
+        if should_profile(dict(scope["headers"])):
+            profiles = []
+            held = []
+            _request_profiles.set(profiles)
+
+        async def counting_send(message):
+            nonlocal status, sent, held
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if held is not None and any(name == b"content-type" and value.startswith(b"text/event-stream")
+                                            for name, value in message.get("headers", [])):
+                    print(f"⚠️ Not holding back streaming response of {scope['path']}; it gets no x-profile-file")
+                    held = None
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            if held is None:
+                await send(message)
+            else:
+                held.append(message)
+
+        loop_profiler = None
+        if profiles is not None and _loop_profiler_lock.acquire(blocking=False):
+            loop_profiler = cProfile.Profile()
+            loop_profiler.enable()
+        try:
+            await self.app(scope, receive, counting_send)
+        finally:
+            if loop_profiler is not None:
+                loop_profiler.disable()
+                _loop_profiler_lock.release()
+                profiles.append(loop_profiler)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, (scope["method"], route, str(status)))
+            RESPONSE_BYTES.inc(sent, (route,))
+            if profiles is not None:
+                profile_file = _write_profiles(profiles, getattr(scope.get("route"), "path", scope["path"]))
+                for message in held or ():
+                    if message["type"] == "http.response.start" and profile_file:
+                        message = {**message, "headers": list(message.get("headers", []))
+                                   + [(b"x-profile-file", profile_file.encode())]}
+                    await send(message)
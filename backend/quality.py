@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from constants import SAMPLE_RATE, SEGMENT_LENGTH, SEGMENT_STRIDE, TOLERANCE_R, EMBEDDING_DIMENSION
+from lod import ppg_column
+from signal_io import read_signal_range, signal_length
+
+"""
+Per-segment signal quality features.
+
+For every overlapping segment of a signal (SEGMENT_LENGTH samples every
+SEGMENT_STRIDE) this computes approximate entropy, amplitude, flatline and
+clipping ratios and a spectral SNR. Segments are processed as 2-D
+sliding-window views in chunks, never in a per-segment Python loop, and the
+result is cached as `{signal_id}.features.parquet` next to the signal.
+
+    python quality.py                      # every signal in the registry
+    python quality.py signal_a signal_b --workers 4
+"""
+
+FEATURE_COLUMNS = ["apen", "amplitude", "std", "flatline_ratio", "clipping_ratio", "snr_db"]
+CARDIAC_BAND_HZ = (0.5, 4.0)
+CHUNK_SEGMENTS = 2048  # segments read and featurized per pass
+APEN_BATCH = 8  # segments per approximate-entropy batch; memory is about 5 * APEN_BATCH * SEGMENT_LENGTH**2 bytes
+
+
+def features_path(path):
+    return path[:-len(".parquet")] + ".features.parquet"
+
+
+def segment_windows(values):
+    """(num_segments, SEGMENT_LENGTH) view of every complete overlapping segment."""
+    if len(values) < SEGMENT_LENGTH:
+        return np.empty((0, SEGMENT_LENGTH), dtype=values.dtype)
+    return sliding_window_view(values, SEGMENT_LENGTH)[::SEGMENT_STRIDE]
+
+
+def _log_match_fraction(match):
+    return np.log(np.count_nonzero(match, axis=2) / match.shape[2]).mean(axis=1)
+
+
+def approximate_entropy(windows, m=EMBEDDING_DIMENSION, r_factor=TOLERANCE_R):
+    windows = windows.astype(np.float32)
+    length = windows.shape[1]
+    result = np.empty(len(windows))
+    for i in range(0, len(windows), APEN_BATCH):
+        batch = windows[i:i + APEN_BATCH]
+        r = r_factor * batch.std(axis=1)
+        # close[b, i, j]: samples i and j within r. Two embedding vectors match
+        # (Chebyshev distance <= r) when every aligned sample pair is close, so
+        # matches for m and m + 1 are ANDs of shifted diagonals of one matrix
+        close = np.abs(batch[:, :, None] - batch[:, None, :]) <= r[:, None, None]
+        n = length - m + 1
+        match = close[:, :n, :n].copy()
+        for k in range(1, m):
+            match &= close[:, k:k + n, k:k + n]
+        phi_m = _log_match_fraction(match)
+        match = match[:, :n - 1, :n - 1] & close[:, m:m + n - 1, m:m + n - 1]
+        result[i:i + APEN_BATCH] = phi_m - _log_match_fraction(match)
+    return result
+
+
+def spectral_snr_db(windows):
+    detrended = windows - windows.mean(axis=1, keepdims=True)
+    power = np.abs(np.fft.rfft(detrended * np.hanning(windows.shape[1]), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(windows.shape[1], d=1 / SAMPLE_RATE)
+    in_band = (freqs >= CARDIAC_BAND_HZ[0]) & (freqs <= CARDIAC_BAND_HZ[1])
+    signal_power = power[:, in_band].sum(axis=1)
+    noise_power = power[:, ~in_band & (freqs > 0)].sum(axis=1)
+    return 10 * np.log10((signal_power + 1e-12) / (noise_power + 1e-12))
+
+
+def segment_features(windows):
+    low, high = windows.min(axis=1), windows.max(axis=1)
+    return {
+        "apen": approximate_entropy(windows),
+        "amplitude": high - low,
+        "std": windows.std(axis=1),
+        "flatline_ratio": (np.diff(windows, axis=1) == 0).mean(axis=1),
+        # samples pinned at the segment's extremes; a clean segment touches each about once
+        "clipping_ratio": ((windows == low[:, None]).sum(axis=1) + (windows == high[:, None]).sum(axis=1) - 2)
+                          / windows.shape[1],
+        "snr_db": spectral_snr_db(windows),
+    }
+
+
+def compute_features(path) -> pd.DataFrame:
+    total = signal_length(path)
+    num_segments = max((total - SEGMENT_LENGTH) // SEGMENT_STRIDE + 1, 0)
+    column = ppg_column(path)
+    frames = []
+    for first in range(0, num_segments, CHUNK_SEGMENTS):
+        count = min(CHUNK_SEGMENTS, num_segments - first)
+        start = first * SEGMENT_STRIDE
+        end = start + (count - 1) * SEGMENT_STRIDE + SEGMENT_LENGTH
+        values = read_signal_range(path, start, end, columns=[column]).column(0).to_numpy(zero_copy_only=False)
+        windows = segment_windows(values.astype(np.float64))
+        index = np.arange(first, first + len(windows))
+        frames.append(pd.DataFrame({
+            "segment_index": index,
+            "start": index * SEGMENT_STRIDE,
+            "end": index * SEGMENT_STRIDE + SEGMENT_LENGTH,
+            **segment_features(windows),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["segment_index", "start", "end"] + FEATURE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_features(path, rebuild=False) -> pd.DataFrame:
+    """Feature table for a signal, recomputed if missing or older than the parquet."""
+    cache_file = features_path(path)
+    if not rebuild and os.path.exists(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(path):
+        return pd.read_parquet(cache_file)
+    df = compute_features(path)
+    tmp_path = f"{cache_file}.{os.getpid()}.tmp"  # workers may rebuild the same signal at once
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_file)
+    return df
+
+
+def _build(path):
+    load_features(path, rebuild=True)
+    return path, signal_length(path)
+
+
+def build_all(paths, workers=None):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, total in executor.map(_build, paths):
+            print(f"✅ {os.path.basename(path)}: {max((total - SEGMENT_LENGTH) // SEGMENT_STRIDE + 1, 0)} segments")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute per-segment quality features")
+    parser.add_argument("signal_ids", nargs="*", help="defaults to every signal in the registry")
+    parser.add_argument("--signal-dir", default="signals")
+    parser.add_argument("--registry", default="signal_registry.json")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    signal_ids = args.signal_ids
+    if not signal_ids:
+        with open(args.registry) as f:
+            signal_ids = [signal["id"] for signal in json.load(f)["signals"]]
+    build_all([os.path.join(args.signal_dir, f"{signal_id}.parquet") for signal_id in signal_ids], args.workers)
@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from annotation_log import row_error
+from metrics import STORE_APPEND_SECONDS
+from utils import file_lock
+
+"""
+Parallel flush workers for the background saver. One save cycle's keys are
+grouped by signal: different signals are written concurrently, while all
+keys of one signal go through a single job so writes to the same compiled
+`{signal_id}_merged.csv` never overlap. Each worker detaches a key's rows
+itself, under the buffer's write lock for that key, and keeps holding it
+until the rows are stored, so a manual flush of the same key waits its turn.
+
+Rows no store could ever accept (no integer segment_index, no annotator_id,
+no numeric label) are moved to a dead-letter file instead of being retried,
+so they cannot wedge their key, the WAL or startup replay.
+"""
+
+
+class SaverMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cycles = 0
+        self.failed_writes = 0
+        self.dead_lettered = 0
+        self.last_cycle_seconds = 0.0
+        self.max_cycle_seconds = 0.0
+        self.last_cycle_finished = None
+        self.queue_depth = 0
+        self.key_write_seconds = {}
+
+    def start_cycle(self, jobs):
+        with self._lock:
+            self.queue_depth = jobs
+
+    def record_write(self, key, seconds, ok):
+        with self._lock:
+            self.queue_depth -= 1
+            if ok:
+                self.key_write_seconds[key] = seconds
+            else:
+                self.failed_writes += 1
+
+    def record_dead_letter(self, count):
+        with self._lock:
+            self.dead_lettered += count
+
+    def finish_cycle(self, seconds):
+        with self._lock:
+            self.cycles += 1
+            self.last_cycle_seconds = seconds
+            self.max_cycle_seconds = max(self.max_cycle_seconds, seconds)
+            self.last_cycle_finished = time.time()
+            self.queue_depth = 0
+
+    def snapshot(self):
+        with self._lock:
+            writes = sorted(self.key_write_seconds.items(), key=lambda item: item[1], reverse=True)
+            return {
+                "cycles": self.cycles,
+                "failed_writes": self.failed_writes,
+                "dead_lettered": self.dead_lettered,
+                "last_cycle_seconds": round(self.last_cycle_seconds, 4),
+                "max_cycle_seconds": round(self.max_cycle_seconds, 4),
+                "seconds_since_last_cycle": None if self.last_cycle_finished is None
+                else round(time.time() - self.last_cycle_finished, 1),
+                "queue_depth": self.queue_depth,
+                "slowest_key_writes": [{"annotator_id": key[0], "signal_id": key[1], "seconds": round(seconds, 4)}
+                                       for key, seconds in writes[:20]],
+            }
+
+
+class FlushPool:
+    def __init__(self, store, workers=4, dead_letter_path="rejected_annotations.jsonl"):
+        self.store = store
+        self.workers = workers
+        self.dead_letter_path = dead_letter_path
+        self.metrics = SaverMetrics()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="flush")
+
+    def _dead_letter(self, key, rejected):
+        annotator_id, signal_id = key
+        payload = "".join(json.dumps({"annotator_id": annotator_id, "signal_id": signal_id, "reason": reason,
+                                      "row": row, "rejected_at": time.time()}, default=str) + "\n"
+                          for row, reason in rejected)
+        with file_lock(self.dead_letter_path + ".lock"), open(self.dead_letter_path, "a") as f:
+            f.write(payload)
+        self.metrics.record_dead_letter(len(rejected))
+        print(f"⚠️ [Saver] Moved {len(rejected)} invalid annotations for {key} to {self.dead_letter_path}: "
+              f"{rejected[0][1]}")
+
+    def write(self, key, rows):
+        """Append one key's rows to the store, dead-lettering rows it could never accept. Returns rows stored."""
+        checked = [(row, row_error(row)) for row in rows]
+        rejected = [(row, error) for row, error in checked if error is not None]
+        if rejected:
+            self._dead_letter(key, rejected)
+            rows = [row for row, error in checked if error is None]
+        if rows:
+            self.store.append(key[1], rows)
+        return len(rows)
+
+    def _write_signal(self, buffer, signal_id, keys):
+        written, failed = 0, []
+        for key in keys:
+            with buffer.key_lock(key):
+                rows = buffer.detach(key)
+                if not rows:
+                    self.metrics.record_write(key, 0.0, True)  # a manual flush got there first
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    written += self.write(key, rows)
+                    ok = True
+                except Exception as e:
+                    print(f"[Saver] Failed to save {key}, will retry next cycle: {e}")
+                    buffer.restore(key, rows)
+                    failed.append((key, rows))
+                    ok = False
+            elapsed = time.perf_counter() - t0
+            self.metrics.record_write(key, elapsed, ok)
+            STORE_APPEND_SECONDS.observe(elapsed, (getattr(self.store, "engine", "other"),))
+        return written, failed
+
+    def run(self, buffer, keys):
+        """
+        Detach and write each (annotator_id, signal_id) key's rows from `buffer`.
+        Failed rows are put back; returns (rows written, [(key, rows) that failed]).
+        """
+        t0 = time.perf_counter()
+        by_signal = defaultdict(list)
+        for key in keys:
+            by_signal[key[1]].append(key)
+
+        self.metrics.start_cycle(len(keys))
+        futures = [self._executor.submit(self._write_signal, buffer, signal_id, signal_keys)
+                   for signal_id, signal_keys in by_signal.items()]
+        written, failed = 0, []
+        for future in futures:
+            signal_written, signal_failed = future.result()
+            written += signal_written
+            failed.extend(signal_failed)
+        self.metrics.finish_cycle(time.perf_counter() - t0)
+        return written, failed
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,87 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from quality import load_features
+
+"""
+Active-learning segment scheduler: ranks a signal's segments by how much a
+new label is likely to be worth.
+
+Two sources of uncertainty are blended per segment:
+  - a prior from the cached quality features: segments whose statistics put
+    them near the clean/noisy boundary score higher than obviously clean or
+    obviously broken ones;
+  - disagreement between the annotators who already labeled the segment.
+The prior fades as a segment collects labels, so well-agreed segments sink.
+Scores are cached per signal and recomputed when the features or the
+annotations change.
+"""
+
+DISAGREEMENT_WEIGHT = 2.0
+
+# signal_id -> (signal file mtime, annotation version, DataFrame of scores)
+_scores = {}
+_lock = threading.Lock()
+
+
+def _robust_z(values):
+    median = np.nanmedian(values)
+    mad = np.nanmedian(np.abs(values - median)) * 1.4826
+    return (values - median) / (mad if mad > 0 else 1.0)
+
+
+def quality_prior(features: pd.DataFrame) -> np.ndarray:
+    """Heuristic probability that each segment is clean, from its quality features."""
+    p_clean = 1 / (1 + np.exp(-_robust_z(features["snr_db"].to_numpy())))
+    p_clean *= 1 - np.clip(features["flatline_ratio"].to_numpy() * 4, 0, 1)
+    p_clean *= 1 - np.clip(features["clipping_ratio"].to_numpy() * 4, 0, 1)
+    return p_clean
+
+
+def score_segments(features: pd.DataFrame, annotations: pd.DataFrame) -> pd.DataFrame:
+    p_clean = quality_prior(features)
+    prior_uncertainty = 1 - np.abs(2 * p_clean - 1)
+
+    scores = pd.DataFrame({"segment_index": features["segment_index"].to_numpy(),
+                           "prior_uncertainty": prior_uncertainty})
+    if annotations.empty:
+        scores["label_count"] = 0
+        scores["disagreement"] = 0.0
+    else:
+        per_segment = annotations.groupby("segment_index")["snorkel_label"].agg(["count", "std"])
+        scores = scores.join(per_segment, on="segment_index")
+        scores["label_count"] = scores["count"].fillna(0).astype(int)
+        # std of labels in [0, 1] is at most 0.5
+        scores["disagreement"] = (scores["std"].fillna(0) * 2).clip(0, 1)
+        scores = scores.drop(columns=["count", "std"])
+
+    scores["score"] = DISAGREEMENT_WEIGHT * scores["disagreement"] + \
+        scores["prior_uncertainty"] / (1 + scores["label_count"])
+    return scores
+
+
+def ranked_segments(signal_id, file_path, store):
+    annotation_version = store.version(signal_id)
+    key = os.path.getmtime(file_path)
+    with _lock:
+        cached = _scores.get(signal_id)
+        if cached and cached[0] == key and cached[1] == annotation_version:
+            return cached[2]
+
+    scores = score_segments(load_features(file_path), store.read(signal_id))
+    with _lock:
+        _scores[signal_id] = (key, annotation_version, scores)
+    return scores
+
+
+def next_segments(signal_id, annotator_id, file_path, store, count=20, exclude=()):
+    """Top `count` segments by score that the annotator has not labeled yet."""
+    scores = ranked_segments(signal_id, file_path, store)
+    own = store.read(signal_id, annotator_id)
+    skip = set(own["segment_index"].astype(int)) if not own.empty else set()
+    skip.update(exclude)
+    candidates = scores[~scores["segment_index"].isin(skip)]
+    return candidates.nlargest(count, "score", keep="first")
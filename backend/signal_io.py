@@ -0,0 +1,139 @@
+import hashlib
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from constants import (SEGMENT_LENGTH, SEGMENT_STRIDE, PPG_SIGNAL_COLUMN_NAME_1, PPG_SIGNAL_COLUMN_NAME_2,
+                       TIMESTAMP_COLUMN_NAME)
+
+"""
+Range reads over the signal parquet files. Only the row groups overlapping the
+requested samples are decoded, so loading one segment of a multi-hour recording
+does not touch the rest of the file.
+"""
+
+RAW_DTYPE = "<f8"
+# Opt-in compact encodings of the PPG column: float32, or int16 deltas of the
+# samples quantized to multiples of `quantum`
+COMPACT_FORMATS = ("f32", "delta16")
+
+# path -> (mtime, row group start offsets, data column names)
+_row_group_index = {}
+# path -> ((mtime_ns, size), sha256 hex digest)
+_content_hashes = {}
+
+
+def segment_bounds(segment_index: int, num_segments: int = 1):
+    """Sample range [start, end) covered by `num_segments` overlapping segments."""
+    start = segment_index * SEGMENT_STRIDE
+    end = start + (num_segments - 1) * SEGMENT_STRIDE + SEGMENT_LENGTH
+    return start, end
+
+
+def _row_group_offsets(path: str):
+    mtime = os.path.getmtime(path)
+    cached = _row_group_index.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1], cached[2]
+
+    metadata = pq.ParquetFile(path).metadata
+    counts = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+    # pandas writes its index as "__index_level_0__"; it is not signal data
+    columns = [name for name in metadata.schema.names if not name.startswith("__index_level_")]
+    _row_group_index[path] = (mtime, offsets, columns)
+    return offsets, columns
+
+
+def signal_length(path: str) -> int:
+    offsets, _ = _row_group_offsets(path)
+    return int(offsets[-1])
+
+
+def content_hash(path: str) -> str:
+    """sha256 of the parquet file, recomputed only when its mtime or size changes."""
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _content_hashes.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    _content_hashes[path] = (key, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def read_signal_range(path: str, start: int, end: int, columns=None) -> pa.Table:
+    offsets, all_columns = _row_group_offsets(path)
+    total = int(offsets[-1])
+    start = max(0, start)
+    end = min(end, total)
+    columns = columns or all_columns
+    if start >= end:
+        return pa.table({name: pa.array([], type=pa.float64()) for name in columns})
+
+    first = int(np.searchsorted(offsets, start, side="right")) - 1
+    last = int(np.searchsorted(offsets, end, side="left")) - 1
+    table = pq.ParquetFile(path).read_row_groups(list(range(first, last + 1)), columns=columns)
+    return table.slice(start - int(offsets[first]), end - start)
+
+
+def encode_raw(table: pa.Table) -> bytes:
+    """Columns back to back, each as little-endian float64."""
+    chunks = []
+    for name in table.column_names:
+        values = table.column(name).to_numpy(zero_copy_only=False)
+        chunks.append(np.ascontiguousarray(values, dtype=RAW_DTYPE).tobytes())
+    return b"".join(chunks)
+
+
+def encode_arrow(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_compact(table: pa.Table, format: str, quantum: float = 1.0):
+    """
+    The PPG column as float32 ("f32") or as int16 deltas ("delta16", decoded as
+    (X-Base + cumsum(deltas)) * X-Scale), plus headers describing the body.
+    Evenly spaced timestamps are sent as X-Timestamp-Start/-Step instead of a
+    column. delta16 falls back to f32 when a jump does not fit in int16.
+    """
+    names = table.column_names
+    ppg_column = PPG_SIGNAL_COLUMN_NAME_1 if PPG_SIGNAL_COLUMN_NAME_1 in names else PPG_SIGNAL_COLUMN_NAME_2
+    values = table.column(ppg_column).to_numpy(zero_copy_only=False).astype(np.float64)
+    columns, dtypes, chunks, headers = [ppg_column], [], [], {}
+
+    if format == "delta16":
+        quantized = np.rint(values / quantum)
+        deltas = np.diff(quantized, prepend=quantized[:1])
+        if np.isfinite(quantized).all() and (np.abs(deltas) <= np.iinfo(np.int16).max).all():
+            chunks.append(deltas.astype("<i2").tobytes())
+            dtypes.append("<i2")
+            headers["X-Base"] = str(int(quantized[0])) if len(quantized) else "0"
+            headers["X-Scale"] = repr(float(quantum))
+        else:
+            format = "f32"
+    if format == "f32":
+        chunks.append(values.astype("<f4").tobytes())
+        dtypes.append("<f4")
+
+    if TIMESTAMP_COLUMN_NAME in names:
+        timestamps = table.column(TIMESTAMP_COLUMN_NAME).to_numpy(zero_copy_only=False)
+        steps = np.diff(timestamps)
+        if len(timestamps) and (steps == (steps[0] if len(steps) else 0)).all():
+            headers["X-Timestamp-Start"] = repr(timestamps[0].item())
+            headers["X-Timestamp-Step"] = repr(steps[0].item() if len(steps) else 0)
+        else:
+            columns.append(TIMESTAMP_COLUMN_NAME)
+            dtypes.append(RAW_DTYPE)
+            chunks.append(np.ascontiguousarray(timestamps, dtype=RAW_DTYPE).tobytes())
+
+    headers.update({"X-Encoding": format, "X-Columns": ",".join(columns), "X-Dtype": ",".join(dtypes)})
+    return b"".join(chunks), headers
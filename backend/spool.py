@@ -0,0 +1,260 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from utils import file_lock
+
+"""
+Annotation buffer shared by several server processes (uvicorn --workers N),
+with the same interface as buffer.AnnotationBuffer.
+
+Uploads from any worker are appended, fsync'd, to one spool file per
+(annotator_id, signal_id) under that file's flock. A save cycle claims each
+key's spool file by renaming it into a new numbered directory under sealed/,
+so the rows it writes are exactly the rows claimed, and later uploads start a
+fresh file. Rows whose write failed go to retry/ and are claimed ahead of newer
+uploads by the next cycle. Sealed directories are deleted once a cycle has
+persisted them; any left behind by a worker that died are replayed by the
+next process to become the saver.
+
+As in buffer.AnnotationBuffer, a key's rows are claimed and written under
+that key's write lock (a flock here, since the writer may be any worker), so
+they reach the store in upload order.
+
+    buffer_spool/
+        live/{key}.jsonl         rows waiting for the next save cycle
+        retry/{key}.jsonl        rows whose write failed
+        sealed/{sequence}/       rows being written, kept until persisted
+        locks/{key}.lock         the key's write lock
+        saver.lock               held by the one worker that runs save cycles
+
+Each spool file starts with a header line holding its key and creation time.
+"""
+
+
+def _key_name(key):
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()[:24] + ".jsonl"
+
+
+def _read_spool_file(path):
+    """((annotator_id, signal_id), created, rows) of one spool file; a torn final line is dropped."""
+    with open(path, "r") as f:
+        lines = f.read().split("\n")
+    header = json.loads(lines[0])
+    rows = []
+    for line in lines[1:]:
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError:
+            break  # empty trailing line, or a torn write from a crash
+    return tuple(header["key"]), header["created"], rows
+
+
+class SaverLease:
+    """
+    Non-blocking exclusive flock that picks the one process allowed to run
+    save cycles and compaction. Held until release() or process exit, so when
+    the saver dies another worker takes over on its next try.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        if self._file is None:
+            f = open(self.path, "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                return False
+            self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()  # closing drops the flock
+            self._file = None
+
+
+class SpoolBuffer:
+    def __init__(self, spool_dir):
+        self.spool_dir = spool_dir
+        self.live_dir = os.path.join(spool_dir, "live")
+        self.retry_dir = os.path.join(spool_dir, "retry")
+        self.sealed_dir = os.path.join(spool_dir, "sealed")
+        self.locks_dir = os.path.join(spool_dir, "locks")
+        for directory in (self.live_dir, self.retry_dir, self.sealed_dir, self.locks_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._replayed = []
+
+    def _append(self, directory, key, rows):
+        """Append rows to key's spool file in directory; returns the rows now in that file."""
+        path = os.path.join(directory, _key_name(key))
+        payload = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+        while True:
+            with open(path, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    # a save cycle may have claimed the file between open and flock
+                    if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue
+                if os.fstat(f.fileno()).st_size == 0:
+                    f.write(json.dumps({"key": list(key), "created": time.time()}) + "\n")
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+                f.seek(0)
+                return f.read().count("\n") - 1
+
+    def add(self, key, rows):
+        return self._append(self.live_dir, key, rows)
+
+    def restore(self, key, rows):
+        """Keep rows whose write failed for the next cycle, ahead of anything uploaded since."""
+        self._append(self.retry_dir, key, rows)
+
+    def _name_lock(self, name):
+        return file_lock(os.path.join(self.locks_dir, name[:-len(".jsonl")] + ".lock"))
+
+    def key_lock(self, key):
+        """Hold around detach() and the store write, so one key's writes never overtake each other."""
+        return self._name_lock(_key_name(key))
+
+    def _current_sequence(self):
+        try:
+            with open(os.path.join(self.spool_dir, "sequence")) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _next_sequence(self):
+        with file_lock(os.path.join(self.spool_dir, "sequence.lock")):
+            path = os.path.join(self.spool_dir, "sequence")
+            try:
+                with open(path) as f:
+                    sequence = int(f.read() or 0) + 1
+            except FileNotFoundError:
+                sequence = 1
+            with open(path + ".tmp", "w") as f:
+                f.write(str(sequence))
+            os.replace(path + ".tmp", path)
+        return sequence
+
+    def _sealed_dirs(self):
+        return sorted((int(name), os.path.join(self.sealed_dir, name)) for name in os.listdir(self.sealed_dir)
+                      if name.isdigit())
+
+    def _claim(self, names):
+        """Move the named retry and live files into a new sealed directory; returns (sequence, batches)."""
+        sequence = self._next_sequence()
+        target = os.path.join(self.sealed_dir, str(sequence))
+        os.makedirs(target)
+        claimed = []
+        for source_dir, prefix in ((self.retry_dir, "0-"), (self.live_dir, "1-")):
+            for name in names:
+                path = os.path.join(source_dir, name)
+                try:
+                    with open(path, "r") as f:
+                        fcntl.flock(f, fcntl.LOCK_EX)  # waits out an append in progress
+                        os.replace(path, os.path.join(target, prefix + name))
+                except FileNotFoundError:
+                    continue
+                claimed.append(prefix + name)
+        if not claimed:
+            os.rmdir(target)
+        batches = {}
+        for name in sorted(claimed):  # retry files first
+            key, _, rows = _read_spool_file(os.path.join(target, name))
+            if rows:
+                batches.setdefault(key, []).extend(rows)
+        return sequence, batches
+
+    def detach(self, key):
+        """Claim one key's rows. They stay on disk until the next completed cycle."""
+        _, batches = self._claim([_key_name(key)])
+        return batches.get(tuple(key), [])
+
+    def seal(self):
+        """Every claim made so far has a sequence up to this; pass it to `release` after the cycle."""
+        with file_lock(os.path.join(self.spool_dir, "sequence.lock")):
+            return self._current_sequence()
+
+    def release(self, seal):
+        for sequence, path in self._sealed_dirs():
+            if sequence <= seal:
+                # a manual flush on any worker may still be writing these rows
+                for name in os.listdir(path):
+                    with self._name_lock(name.split("-", 1)[1]):
+                        pass
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _live_files(self):
+        for directory in (self.retry_dir, self.live_dir):
+            for name in os.listdir(directory):
+                if name.endswith(".jsonl"):
+                    try:
+                        yield _read_spool_file(os.path.join(directory, name))
+                    except (OSError, ValueError, IndexError):
+                        continue  # claimed or being created right now
+
+    def sizes(self):
+        sizes = {}
+        for key, _, rows in self._live_files():
+            sizes[key] = sizes.get(key, 0) + len(rows)
+        return sizes
+
+    def __len__(self):
+        return sum(self.sizes().values())
+
+    def oldest_age(self):
+        created = [created for _, created, _ in self._live_files()]
+        return time.time() - min(created) if created else None
+
+    def replay(self, write):
+        """
+        Call write((annotator_id, signal_id), rows) for rows claimed by a save
+        cycle that never completed. Only the saver calls this.
+
+        Each key is replayed under its write lock with every claim of that key
+        still on disk, oldest first, including claims a manual flush made after
+        the takeover began; so old rows never land after newer ones.
+        """
+        replayed = 0
+        self._replayed = [sequence for sequence, _ in self._sealed_dirs()]
+        names = set()
+        for _, path in self._sealed_dirs():
+            names.update(name.split("-", 1)[1] for name in os.listdir(path))
+        for name in sorted(names):
+            with self._name_lock(name):
+                key, batch = None, []
+                for _, path in self._sealed_dirs():
+                    for prefix in ("0-", "1-"):  # retry rows are older than live ones
+                        try:
+                            key, _, rows = _read_spool_file(os.path.join(path, prefix + name))
+                        except (OSError, ValueError, IndexError):
+                            continue
+                        batch.extend(rows)
+                if batch:
+                    write(key, batch)
+                    replayed += len(batch)
+        return replayed
+
+    def discard_wal(self):
+        """Delete what the last replay() returned."""
+        if self._replayed:
+            self.release(max(self._replayed))
+        self._replayed = []
+
+    def close(self):
+        pass
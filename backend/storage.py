@@ -0,0 +1,223 @@
+import argparse
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from annotation_log import AnnotationLog, resolve_last_write
+
+"""
+Annotation storage engines. main.py talks to whichever engine ANNOTATION_STORE
+selects through the AnnotationStore interface:
+
+    csv     append-only JSONL log compacted into annotations/ and compiled/ CSVs (default)
+    sqlite  single SQLite database in WAL mode; uploads are UPSERTs on a unique
+            (signal_id, annotator_id, segment_index) index
+
+Existing CSV data can be imported into a database with
+
+    python storage.py migrate --db annotations.db
+"""
+
+ANNOTATION_COLUMNS = ["segment_index", "start", "end", "snorkel_label", "snorkel_confidence", "annotator_id", "version"]
+
+
+class AnnotationStore:
+    def append(self, signal_id, rows):
+        """Persist rows for one signal, replacing earlier rows with the same (segment_index, annotator_id)."""
+        raise NotImplementedError
+
+    def read(self, signal_id, annotator_id=None, since=None) -> pd.DataFrame:
+        """
+        Current annotations for a signal, optionally restricted to one annotator
+        and to rows written after version `since`, sorted by segment_index.
+        """
+        raise NotImplementedError
+
+    def version(self, signal_id, annotator_id=None):
+        """Latest write version for the signal (or one annotator's rows on it); 0 if none."""
+        raise NotImplementedError
+
+    def progress(self, signal_id, annotator_id):
+        """Highest segment_index the annotator has labeled on the signal, or None."""
+        raise NotImplementedError
+
+    def compact_all(self):
+        """Background maintenance; returns {signal_id: rows processed}."""
+        return {}
+
+
+class CsvAnnotationStore(AnnotationLog, AnnotationStore):
+    engine = "csv"
+
+
+class SqliteAnnotationStore(AnnotationStore):
+    engine = "sqlite"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS annotations (
+            signal_id TEXT NOT NULL,
+            annotator_id TEXT NOT NULL,
+            segment_index INTEGER NOT NULL,
+            start INTEGER,
+            "end" INTEGER,
+            snorkel_label REAL,
+            snorkel_confidence REAL,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS annotations_key
+            ON annotations (signal_id, annotator_id, segment_index);
+        CREATE INDEX IF NOT EXISTS annotations_signal_segment
+            ON annotations (signal_id, segment_index);
+    """
+
+    # indexes on columns added after the first release; created once the columns exist
+    VERSION_INDEX = """
+        CREATE INDEX IF NOT EXISTS annotations_signal_version
+            ON annotations (signal_id, version);
+    """
+
+    UPSERT = """
+        INSERT INTO annotations (signal_id, annotator_id, segment_index, start, "end", snorkel_label, snorkel_confidence, version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (signal_id, annotator_id, segment_index) DO UPDATE SET
+            start = excluded.start,
+            "end" = excluded."end",
+            snorkel_label = excluded.snorkel_label,
+            snorkel_confidence = excluded.snorkel_confidence,
+            version = excluded.version
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # sqlite3 connections are not shared across threads; FastAPI runs sync
+        # handlers and the saver on different threads, so each gets its own
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(annotations)")}
+            if "version" not in columns:
+                conn.execute("ALTER TABLE annotations ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.executescript(self.VERSION_INDEX)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, signal_id, rows):
+        if not rows:
+            return 0
+        conn = self._connection()
+        # The write lock is taken before reading the current version, so
+        # concurrent appends can never hand out the same version twice
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM annotations WHERE signal_id = ?",
+                                   (signal_id,)).fetchone()[0] + 1
+            params = [(signal_id, str(row["annotator_id"]), int(row["segment_index"]), row.get("start"),
+                       row.get("end"), row.get("snorkel_label"), row.get("snorkel_confidence"), version)
+                      for row in rows]
+            conn.executemany(self.UPSERT, params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def read(self, signal_id, annotator_id=None, since=None) -> pd.DataFrame:
+        query = ('SELECT segment_index, start, "end", snorkel_label, snorkel_confidence, annotator_id, version '
+                 'FROM annotations WHERE signal_id = ?')
+        params = [signal_id]
+        if annotator_id is not None:
+            query += " AND annotator_id = ?"
+            params.append(annotator_id)
+        if since is not None:
+            query += " AND version > ?"
+            params.append(since)
+        query += " ORDER BY segment_index"
+        cursor = self._connection().execute(query, params)
+        return pd.DataFrame(cursor.fetchall(), columns=ANNOTATION_COLUMNS)
+
+    def version(self, signal_id, annotator_id=None):
+        query = "SELECT COALESCE(MAX(version), 0) FROM annotations WHERE signal_id = ?"
+        params = [signal_id]
+        if annotator_id is not None:
+            query += " AND annotator_id = ?"
+            params.append(annotator_id)
+        return self._connection().execute(query, params).fetchone()[0]
+
+    def progress(self, signal_id, annotator_id):
+        return self._connection().execute(
+            "SELECT MAX(segment_index) FROM annotations WHERE signal_id = ? AND annotator_id = ?",
+            (signal_id, annotator_id)).fetchone()[0]
+
+    def compact_all(self):
+        self._connection().execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return {}
+
+
+def open_store(engine, log_dir, annotation_dir, compiled_dir, db_path):
+    if engine == "csv":
+        return CsvAnnotationStore(log_dir, annotation_dir, compiled_dir)
+    if engine == "sqlite":
+        return SqliteAnnotationStore(db_path)
+    raise ValueError(f"Unknown annotation store '{engine}' (expected 'csv' or 'sqlite')")
+
+
+def migrate_csv_to_sqlite(csv_store: CsvAnnotationStore, sqlite_store: SqliteAnnotationStore):
+    """Import every per-annotator CSV, compiled CSV and pending log row into the database."""
+    per_signal = {}
+    for name in sorted(os.listdir(csv_store.annotation_dir)):
+        if not name.endswith(".csv"):
+            continue
+        df = pd.read_csv(os.path.join(csv_store.annotation_dir, name), dtype={"annotator_id": str})
+        if df.empty:
+            continue
+        # File names are {annotator_id}_{signal_id}.csv and both may contain
+        # underscores, so the annotator ID column decides where to split
+        annotator_id = df["annotator_id"].iloc[0]
+        stem = name[:-len(".csv")]
+        if not stem.startswith(f"{annotator_id}_"):
+            print(f"Skipping {name}: does not match annotator {annotator_id}")
+            continue
+        per_signal.setdefault(stem[len(annotator_id) + 1:], []).append(df)
+
+    for name in os.listdir(csv_store.compiled_dir):
+        if name.endswith("_merged.csv"):
+            per_signal.setdefault(name[:-len("_merged.csv")], [])
+    for signal_id in csv_store.pending_signals():
+        per_signal.setdefault(signal_id, [])
+
+    counts = {}
+    for signal_id, frames in per_signal.items():
+        # compiled view and log are newer than the per-annotator files
+        df = resolve_last_write(frames + [csv_store.read(signal_id)])
+        if df.empty:
+            continue
+        rows = df.astype(object).where(df.notna(), None).to_dict(orient="records")
+        counts[signal_id] = sqlite_store.append(signal_id, rows)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Annotation storage maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate = subcommands.add_parser("migrate", help="Import CSV annotations into a SQLite database")
+    migrate.add_argument("--db", default="annotations.db")
+    migrate.add_argument("--annotation-dir", default="annotations")
+    migrate.add_argument("--compiled-dir", default="compiled")
+    migrate.add_argument("--log-dir", default="annotation_log")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        csv_store = CsvAnnotationStore(args.log_dir, args.annotation_dir, args.compiled_dir)
+        counts = migrate_csv_to_sqlite(csv_store, SqliteAnnotationStore(args.db))
+        for signal_id, count in counts.items():
+            print(f"Imported {count} annotations for {signal_id}")
+        print(f"✅ Migrated {sum(counts.values())} annotations into {args.db}")
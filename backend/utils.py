@@ -1,35 +1,115 @@
 # backend/utils.py
-import pandas as pd
 import os
 import json
+import fcntl
+import threading
+import time
+from contextlib import contextmanager
+
+ANNOTATORS_FILE = "annotators.json"
+
+
+class FileCache:
+    """
+    Parsed contents of a JSON file, reloaded when the file changes on disk.
+    The file is stat'ed at most once per `check_interval` seconds, so admins can
+    edit it without restarting the server and lookups stay O(1) in between.
+    """
+
+    def __init__(self, path, parse, default=None, check_interval=1.0):
+        self.path = path
+        self.parse = parse
+        self.default = default
+        self.check_interval = check_interval
+        self._value = default
+        self._signature = None
+        self._bad_signature = None
+        self._last_check = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return self._value
+        with self._lock:
+            if now - self._last_check >= self.check_interval:
+                self._refresh()
+                self._last_check = now
+        return self._value
+
+    def invalidate(self):
+        self._last_check = float("-inf")
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._signature = None
+            self._value = self.default
+            return
+        # inode catches atomic replace-by-rename even within one mtime tick
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if signature != self._signature:
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except ValueError as e:
+                # Mid-edit or broken: keep serving the last good value and leave
+                # the signature alone, so the next check reads the file again
+                if signature != self._bad_signature:
+                    print(f"⚠️ Could not parse {self.path} ({e}); keeping the previous contents")
+                    self._bad_signature = signature
+                return
+            self._value = self.parse(data)
+            self._signature = signature
+
+
+def _parse_registry(data):
+    # Keep the serialized form next to the dict so /signals can return it as-is
+    return data, json.dumps(data).encode("utf-8")
+
+
+_EMPTY_REGISTRY = _parse_registry({"signals": []})
+_registry_caches = {}
+_annotator_cache = FileCache(ANNOTATORS_FILE, lambda data: frozenset(data["annotators"]), default=frozenset())
+_admin_cache = FileCache(ANNOTATORS_FILE, lambda data: frozenset(data.get("admins", [])), default=frozenset())
+
+
+def _registry_cache(registry_path: str) -> FileCache:
+    cache = _registry_caches.get(registry_path)
+    if cache is None:
+        cache = _registry_caches.setdefault(registry_path, FileCache(registry_path, _parse_registry, default=_EMPTY_REGISTRY))
+    return cache
 
-def merge_annotations(new_df: pd.DataFrame, annot_file: str, compiled_file: str):
-    # Save or append to per-user file
-    if os.path.exists(annot_file):
-        old_df = pd.read_csv(annot_file)
-        combined = pd.concat([old_df, new_df]).drop_duplicates(subset=["segment_index", "annotator_id"], keep="last")
-    else:
-        combined = new_df
-    combined = combined.sort_values(by="segment_index").reset_index(drop=True)
-    combined.to_csv(annot_file, index=False)
-
-    # Merge into compiled file (keeping all annotators)
-    if os.path.exists(compiled_file):
-        master_df = pd.read_csv(compiled_file)
-        master_combined = pd.concat([master_df, new_df]).drop_duplicates(subset=["segment_index", "annotator_id"], keep="last")
-    else:
-        master_combined = new_df
-    master_combined = master_combined.sort_values(by="segment_index").reset_index(drop=True)
-    master_combined.to_csv(compiled_file, index=False)
 
 def load_registry(registry_path: str):
-    if not os.path.exists(registry_path):
-        return {"signals": []}
-    with open(registry_path, "r") as f:
-        return json.load(f)
+    """Registry as a dict. The dict is shared between callers; do not mutate it."""
+    return _registry_cache(registry_path).get()[0]
+
+
+def load_registry_bytes(registry_path: str) -> bytes:
+    """Registry pre-serialized as JSON, for serving without re-encoding."""
+    return _registry_cache(registry_path).get()[1]
 
 
 def is_valid_annotator(annotator_id: str) -> bool:
-    with open("annotators.json") as f:
-        allowed = json.load(f)["annotators"]
-    return annotator_id in allowed
+    return annotator_id in _annotator_cache.get()
+
+
+def is_admin(annotator_id: str) -> bool:
+    """Annotators also listed under "admins" in annotators.json."""
+    return annotator_id in _admin_cache.get() and is_valid_annotator(annotator_id)
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Advisory lock on `path` (created if missing) shared by every process on
+    this host; uvicorn --workers N runs one process per worker. Not reentrant.
+    """
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
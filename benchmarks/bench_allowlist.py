@@ -0,0 +1,82 @@
+"""
+Request rate of the allowlist/registry checks with a large annotators.json,
+with the mtime-validated cache vs re-parsing the files on every call.
+
+    python benchmarks/bench_allowlist.py --annotators 5000 --requests 2000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def uncached_is_valid_annotator(annotator_id):
+    # Pre-cache behaviour: open and parse the allowlist on every request
+    with open("annotators.json") as f:
+        allowed = json.load(f)["annotators"]
+    return annotator_id in allowed
+
+
+def uncached_registry_bytes(registry_path):
+    with open(registry_path) as f:
+        return json.dumps(json.load(f)).encode("utf-8")
+
+
+def rate(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return round(n / (time.perf_counter() - t0), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--annotators", type=int, default=5000)
+    parser.add_argument("--signals", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ppg_allowlist_")
+    try:
+        os.chdir(workdir)
+        annotators = [f"annotator_{i:06d}" for i in range(args.annotators)]
+        with open("annotators.json", "w") as f:
+            json.dump({"annotators": annotators}, f)
+        with open("signal_registry.json", "w") as f:
+            json.dump({"signals": [{"id": f"signal_{i}", "filename": f"signal_{i}.parquet", "length": 36000}
+                                   for i in range(args.signals)]}, f)
+
+        sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+        from fastapi.testclient import TestClient
+        import main
+        import utils
+
+        last = annotators[-1]  # worst case for the old list scan
+        client = TestClient(main.app)
+        results = {
+            "annotators": args.annotators,
+            "signals": args.signals,
+            "is_valid_annotator_per_s": rate(lambda: utils.is_valid_annotator(last), args.requests * 10),
+            "uncached_is_valid_annotator_per_s": rate(lambda: uncached_is_valid_annotator(last), args.requests),
+            "validate_annotator_req_per_s": rate(lambda: client.get(f"/validate_annotator/{last}"), args.requests),
+            "signals_req_per_s": rate(lambda: client.get("/signals"), args.requests),
+        }
+
+        main.is_valid_annotator = uncached_is_valid_annotator
+        main.load_registry_bytes = uncached_registry_bytes
+        results["uncached_validate_annotator_req_per_s"] = rate(lambda: client.get(f"/validate_annotator/{last}"), args.requests)
+        results["uncached_signals_req_per_s"] = rate(lambda: client.get("/signals"), args.requests)
+        print(json.dumps(results, indent=2))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Flush latency as a labeling campaign grows: the append-only annotation log vs
+the old read-concat-rewrite CSV merge.
+
+    python benchmarks/bench_annotation_flush.py --total 300000 --batch 500
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from annotation_log import AnnotationLog
+
+SIGNAL_ID = "bench_signal"
+ANNOTATORS = [f"annotator_{i}" for i in range(20)]
+
+
+def make_batch(offset, size):
+    return [{
+        "segment_index": offset + i,
+        "start": (offset + i) * 312,
+        "end": (offset + i) * 312 + 625,
+        "snorkel_label": round(float(np.random.random()), 2),
+        "snorkel_confidence": 1.0,
+        "annotator_id": ANNOTATORS[(offset + i) % len(ANNOTATORS)],
+    } for i in range(size)]
+
+
+def legacy_merge(new_df, annot_file, compiled_file):
+    # Pre-log behaviour: re-read, concat, de-duplicate and rewrite both files on every flush
+    for path in (annot_file, compiled_file):
+        if os.path.exists(path):
+            combined = pd.concat([pd.read_csv(path), new_df]).drop_duplicates(
+                subset=["segment_index", "annotator_id"], keep="last")
+        else:
+            combined = new_df
+        combined.sort_values(by="segment_index").reset_index(drop=True).to_csv(path, index=False)
+
+
+def run(mode, total, batch, checkpoints, keep=False):
+    workdir = tempfile.mkdtemp(prefix="ppg_flush_")
+    try:
+        log = AnnotationLog(os.path.join(workdir, "log"), workdir, workdir)
+        results = []
+        written = 0
+        while written < total:
+            rows = make_batch(written, batch)
+            t0 = time.perf_counter()
+            if mode == "log":
+                log.append(SIGNAL_ID, rows)
+            else:
+                legacy_merge(pd.DataFrame(rows), os.path.join(workdir, f"x_{SIGNAL_ID}.csv"),
+                             os.path.join(workdir, f"{SIGNAL_ID}_merged.csv"))
+            elapsed = time.perf_counter() - t0
+            written += batch
+            if written in checkpoints:
+                results.append({"mode": mode, "annotations": written, "flush_ms": round(elapsed * 1000, 3)})
+
+        if mode == "log":
+            t0 = time.perf_counter()
+            log.compact(SIGNAL_ID)
+            results.append({"mode": "log_compaction", "annotations": written,
+                            "flush_ms": round((time.perf_counter() - t0) * 1000, 3)})
+        return results
+    finally:
+        if keep:
+            print(f"Kept {mode} working directory: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--total", type=int, default=300_000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--legacy-total", type=int, default=50_000,
+                        help="legacy merge is quadratic; stop it early")
+    parser.add_argument("--keep", action="store_true", help="keep the working directories")
+    args = parser.parse_args()
+
+    checkpoints = set(np.unique(np.geomspace(args.batch, args.total, 8).astype(int) // args.batch * args.batch))
+    for row in run("log", args.total, args.batch, checkpoints, args.keep):
+        print(json.dumps(row))
+    legacy_checkpoints = {c for c in checkpoints if c <= args.legacy_total} | {args.legacy_total}
+    for row in run("legacy", args.legacy_total, args.batch, legacy_checkpoints, args.keep):
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Load test against a real uvicorn server: heavy clients repeatedly pull whole
+signals through /load_signal while light clients hit /validate_annotator,
+/upload_annotations and /signal_range. Reports throughput and p50/p99 latency
+per endpoint, which shows whether the cheap calls are starved by the heavy ones.
+
+Point --backend-dir at another checkout (e.g. a `git worktree` of an older
+commit) to compare before and after:
+
+    python benchmarks/bench_endpoint_load.py --duration 15
+    python benchmarks/bench_endpoint_load.py --backend-dir /tmp/before/backend --duration 15
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+from bench_signal_range import make_workdir, SIGNAL_ID, ANNOTATOR_ID
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    values = np.array(samples) * 1000
+    return {"n": len(values), "p50_ms": round(float(np.percentile(values, 50)), 3),
+            "p99_ms": round(float(np.percentile(values, 99)), 3), "max_ms": round(float(values.max()), 3)}
+
+
+def start_server(backend_dir, workdir, port):
+    env = {**os.environ, "PYTHONPATH": os.path.abspath(backend_dir)}
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=workdir, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if requests.get(f"{base_url}/validate_annotator/{ANNOTATOR_ID}", timeout=1).status_code == 200:
+                return server, base_url
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend-dir", default=BACKEND_DIR)
+    parser.add_argument("--samples", type=int, default=500_000, help="length of the synthetic signal")
+    parser.add_argument("--heavy-clients", type=int, default=8)
+    parser.add_argument("--light-clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    args = parser.parse_args()
+
+    workdir = make_workdir(args.samples)
+    try:
+        server, base_url = start_server(args.backend_dir, workdir, args.port)
+        latencies = {}
+        errors = {}
+        lock = threading.Lock()
+        deadline = time.monotonic() + args.duration
+
+        def record(name, elapsed, ok):
+            with lock:
+                if ok:
+                    latencies.setdefault(name, []).append(elapsed)
+                else:
+                    errors[name] = errors.get(name, 0) + 1
+
+        def timed(session, name, method, url, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                ok = session.request(method, url, timeout=120, **kwargs).status_code < 400
+            except requests.RequestException:
+                ok = False
+            record(name, time.perf_counter() - t0, ok)
+
+        def heavy_client():
+            session = requests.Session()
+            while time.monotonic() < deadline:
+                timed(session, "load_signal", "GET", f"{base_url}/load_signal/{SIGNAL_ID}/{ANNOTATOR_ID}")
+
+        def light_client(client_index):
+            session = requests.Session()
+            segment_index = 0
+            while time.monotonic() < deadline:
+                timed(session, "validate_annotator", "GET", f"{base_url}/validate_annotator/{ANNOTATOR_ID}")
+                row = {"segment_index": segment_index, "start": segment_index * 312, "end": segment_index * 312 + 625,
+                       "snorkel_label": 0.5, "snorkel_confidence": 1.0, "annotator_id": ANNOTATOR_ID}
+                timed(session, "upload_annotations", "POST", f"{base_url}/upload_annotations",
+                      json={"annotator_id": ANNOTATOR_ID, "signal_id": SIGNAL_ID, "annotations": [row]})
+                timed(session, "signal_range", "GET", f"{base_url}/signal_range/{SIGNAL_ID}/{ANNOTATOR_ID}",
+                      params={"segment": (client_index * 100 + segment_index) % 1000})
+                segment_index += 1
+
+        threads = [threading.Thread(target=heavy_client) for _ in range(args.heavy_clients)]
+        threads += [threading.Thread(target=light_client, args=(i,)) for i in range(args.light_clients)]
+        t0 = time.monotonic()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+        elapsed = time.monotonic() - t0
+
+        print(json.dumps({
+            "backend_dir": os.path.abspath(args.backend_dir),
+            "samples": args.samples,
+            "heavy_clients": args.heavy_clients,
+            "light_clients": args.light_clients,
+            "duration_s": round(elapsed, 2),
+            "endpoints": {name: {"throughput_rps": round(len(samples) / elapsed, 2), **percentiles(samples)}
+                          for name, samples in sorted(latencies.items())},
+            "errors": errors,
+        }, indent=2))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
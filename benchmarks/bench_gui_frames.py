@@ -0,0 +1,95 @@
+"""
+Frame time of Annotator navigation: 1,000 consecutive next_segment calls,
+each followed by processing Qt events so the frame is actually painted.
+Runs headless (offscreen Qt platform) against a synthetic in-memory signal;
+the backend calls made while constructing the window are stubbed out.
+
+    python benchmarks/bench_gui_frames.py --frames 1000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "annotator"))
+
+import numpy as np
+import requests
+from PyQt5.QtWidgets import QApplication
+
+SAMPLE_RATE = 125
+
+
+class _StubResponse:
+    status_code = 200
+
+    def json(self):
+        return {"signals": []}
+
+
+def make_window(plot_mode, show_overview):
+    from annotatorkit import config, gui
+    config.CONFIG_PATH = os.path.join(os.environ["HOME"], ".annotator_config.json")
+    config.save_config({**config.DEFAULTS, "annotator_id": "bench", "plot_mode": plot_mode,
+                        "show_overview": show_overview})
+    gui.get_config_from_user = lambda defaults: {"annotator_id": "bench", "base_url": "http://127.0.0.1:9"}
+    requests.get = lambda *args, **kwargs: _StubResponse()
+
+    window = gui.Annotator()
+    window.show()
+    window.ensure_plot()
+    samples = SAMPLE_RATE * 60 * 60 * 4  # four hours
+    t = np.arange(samples)
+    window.signals = 2000 * np.sin(2 * np.pi * 1.2 * t / SAMPLE_RATE) + np.random.default_rng(0).normal(0, 50, samples)
+    window.timestamps = t
+    window.num_samples = samples
+    window.labels = window.new_label_store()
+    if window.overview_ax is not None:
+        window.overview_source = window.local_overview
+        window.load_overview()
+    return window
+
+
+def run(app, plot_mode, show_overview, frames):
+    window = make_window(plot_mode, show_overview)
+    window.update_plot()
+    app.processEvents()
+
+    frame_times = []
+    for _ in range(frames):
+        t0 = time.perf_counter()
+        window.next_segment()
+        app.processEvents()
+        frame_times.append(time.perf_counter() - t0)
+
+    window.uploader.stop()
+    window.close()
+    ms = np.array(frame_times) * 1000
+    return {"plot_mode": plot_mode, "overview": show_overview, "frames": frames,
+            "mean_ms": round(float(ms.mean()), 3), "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3), "fps": round(1000 / float(ms.mean()), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--keep", action="store_true", help="keep the temporary home directory")
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="ppg_gui_home_")
+    os.environ["HOME"] = home  # keep the real config and spool untouched
+    try:
+        app = QApplication(sys.argv)
+        for plot_mode, show_overview in (("classic", False), ("fast", False), ("fast", True)):
+            print(json.dumps(run(app, plot_mode, show_overview, args.frames)))
+    finally:
+        if not args.keep:
+            shutil.rmtree(home, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
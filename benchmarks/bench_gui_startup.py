@@ -0,0 +1,139 @@
+"""
+Cold start of the annotator: `python -X importtime` for `annotatorkit.gui`,
+and wall time from process spawn to the window being painted, the plot being
+ready and (with --base-url pointing at a running backend) the annotator being
+validated and the signal list shown. Runs headless (offscreen Qt).
+
+Exits with status 1 when time to window exceeds --target-ms, or when pandas,
+matplotlib or requests are imported eagerly again, so it can gate CI.
+
+    python benchmarks/bench_gui_startup.py --repeat 5 --target-ms 500
+    python benchmarks/bench_gui_startup.py --base-url http://127.0.0.1:8000 --annotator-id max
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ANNOTATOR_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "annotator"))
+HEAVY_MODULES = ("pandas", "matplotlib", "requests")
+
+
+def child_env(home):
+    return {**os.environ, "PYTHONPATH": ANNOTATOR_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""),
+            "QT_QPA_PLATFORM": "offscreen", "HOME": home}
+
+
+def import_times(home):
+    """{module: (self_us, cumulative_us)} for one cold `import annotatorkit.gui`."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import annotatorkit.gui"],
+                               env=child_env(home), capture_output=True, text=True, check=True)
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def run_child(args):
+    t_spawn = float(args.spawned_at)
+    marks = {}
+
+    def mark(name):
+        marks[name] = round((time.time() - t_spawn) * 1000, 1)
+
+    import threading
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication([])
+    from annotatorkit import config, gui
+    mark("imported_ms")
+
+    config.CONFIG_PATH = os.path.join(os.environ["HOME"], ".annotator_config.json")
+    gui.get_config_from_user = lambda defaults: {"annotator_id": args.annotator_id, "base_url": args.base_url}
+    errors = []
+    gui.QMessageBox.critical = lambda parent, title, text: errors.append(f"{title}: {text}")
+
+    # the same steps as gui.run_app, without the blocking app.exec_()
+    threading.Thread(target=gui.preload_modules, daemon=True).start()
+    window = gui.Annotator()
+    window.show()
+    app.processEvents()
+    mark("window_shown_ms")
+    window.ensure_plot()
+    app.processEvents()
+    mark("plot_ready_ms")
+
+    deadline = time.monotonic() + args.connect_timeout
+    while not window.connected and not errors and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.005)
+    if window.connected:
+        mark("connected_ms")
+        marks["signals_listed"] = window.signal_dropdown.count()
+    marks["backend_errors"] = errors
+    window.uploader.stop()
+    print("STARTUP " + json.dumps(marks))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=500, help="budget for spawn to window shown")
+    parser.add_argument("--base-url", default="http://127.0.0.1:9", help="backend to validate against")
+    parser.add_argument("--annotator-id", default="bench")
+    parser.add_argument("--connect-timeout", type=float, default=10)
+    parser.add_argument("--keep", action="store_true", help="keep the temporary home directory")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--spawned-at", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    home = tempfile.mkdtemp(prefix="ppg_startup_home_")  # one per run, shared by every child
+    try:
+        runs = [import_times(home) for _ in range(args.repeat)]
+        startups = []
+        for _ in range(args.repeat):
+            spawned_at = time.time()
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child",
+                                        "--spawned-at", str(spawned_at), "--base-url", args.base_url,
+                                        "--annotator-id", args.annotator_id, "--connect-timeout", str(args.connect_timeout)],
+                                       env=child_env(home), capture_output=True, text=True)
+            lines = [line for line in completed.stdout.splitlines() if line.startswith("STARTUP ")]
+            if not lines:
+                sys.exit(f"startup run failed:\n{completed.stderr}")
+            startups.append(json.loads(lines[-1][len("STARTUP "):]))
+    finally:
+        if not args.keep:
+            shutil.rmtree(home, ignore_errors=True)
+    best = min(runs, key=lambda times: times["annotatorkit.gui"][1])
+    eager = sorted(name for name in HEAVY_MODULES if name in best)
+
+    def median(key):
+        values = sorted(run[key] for run in startups if key in run)
+        return values[len(values) // 2] if values else None
+
+    window_ms = median("window_shown_ms")
+    report = {
+        "import_ms": round(min(times["annotatorkit.gui"][1] for times in runs) / 1000, 1),
+        "slowest_imports": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+                            for name, (_, cumulative) in sorted(best.items(), key=lambda item: -item[1][1])[1:11]],
+        "eager_heavy_modules": eager,
+        "startup_median": {key: median(key) for key in ("imported_ms", "window_shown_ms", "plot_ready_ms", "connected_ms")},
+        "runs": startups,
+        "target_ms": args.target_ms,
+        "passed": window_ms is not None and window_ms <= args.target_ms and not eager,
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
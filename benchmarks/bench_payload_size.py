@@ -0,0 +1,58 @@
+"""
+Bytes on the wire for one window of signal: /load_signal JSON vs /signal_range
+in each encoding (raw float64, f32, delta16) under each Accept-Encoding.
+
+    python benchmarks/bench_payload_size.py --samples 1000000 --window 75000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+from bench_signal_range import make_workdir, SIGNAL_ID, ANNOTATOR_ID
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    parser.add_argument("--window", type=int, default=75_000, help="samples per /signal_range request (10 min)")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    args = parser.parse_args()
+
+    workdir = make_workdir(args.samples)
+    os.chdir(workdir)
+    try:
+        sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+        from fastapi.testclient import TestClient
+        import main as backend
+
+        client = TestClient(backend.app)
+        results = {}
+        for accept in ("identity", "gzip", "zstd"):
+            t0 = time.perf_counter()
+            response = client.get(f"/load_signal/{SIGNAL_ID}/{ANNOTATOR_ID}", headers={"Accept-Encoding": accept})
+            results[f"load_signal/json/{accept}"] = {"bytes": response.num_bytes_downloaded,
+                                                     "seconds": round(time.perf_counter() - t0, 4),
+                                                     "bytes_per_sample": round(response.num_bytes_downloaded / args.samples, 3)}
+            for format in ("raw", "f32", "delta16"):
+                t0 = time.perf_counter()
+                response = client.get(f"/signal_range/{SIGNAL_ID}/{ANNOTATOR_ID}",
+                                      params={"start": 0, "count": args.window, "format": format},
+                                      headers={"Accept-Encoding": accept})
+                results[f"signal_range/{format}/{accept}"] = {
+                    "bytes": response.num_bytes_downloaded,
+                    "seconds": round(time.perf_counter() - t0, 4),
+                    "bytes_per_sample": round(response.num_bytes_downloaded / args.window, 3),
+                }
+        print(json.dumps({"samples": args.samples, "window": args.window, "results": results}, indent=2))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Time-to-first-segment and server RSS: /load_signal (whole file as JSON records)
+vs /signal_range (one segment, columnar binary).
+
+Each mode runs in its own subprocess so peak RSS is not shared between them.
+Needs the backend requirements plus httpx (for FastAPI's TestClient).
+
+    python benchmarks/bench_signal_range.py --samples 10000000
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+SAMPLE_RATE = 125
+SIGNAL_ID = "bench_signal"
+ANNOTATOR_ID = "bench"
+
+
+def make_workdir(samples: int) -> str:
+    workdir = tempfile.mkdtemp(prefix="ppg_bench_")
+    os.makedirs(os.path.join(workdir, "signals"))
+    with open(os.path.join(workdir, "annotators.json"), "w") as f:
+        json.dump({"annotators": [ANNOTATOR_ID]}, f)
+
+    t = np.arange(samples, dtype=np.int64)
+    ppg = 2000 * np.sin(2 * np.pi * 1.2 * t / SAMPLE_RATE) + np.random.default_rng(0).normal(0, 50, samples)
+    df = pd.DataFrame({"TIMESTAMP": 1_700_000_000_000 + t * 8, "8032_PPG_00": ppg})
+    df.to_parquet(os.path.join(workdir, "signals", f"{SIGNAL_ID}.parquet"), index=False)
+    return workdir
+
+
+def run_worker(mode: str, workdir: str):
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+    from fastapi.testclient import TestClient
+    import main
+    from constants import SEGMENT_LENGTH
+
+    client = TestClient(main.app)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    t0 = time.perf_counter()
+    if mode == "records":
+        response = client.get(f"/load_signal/{SIGNAL_ID}/{ANNOTATOR_ID}")
+        df = pd.DataFrame(response.json())
+        segment = df["8032_PPG_00"].values[:SEGMENT_LENGTH]
+    else:
+        response = client.get(f"/signal_range/{SIGNAL_ID}/{ANNOTATOR_ID}", params={"segment": 0})
+        count = int(response.headers["X-Count"])
+        columns = response.headers["X-Columns"].split(",")
+        data = np.frombuffer(response.content, dtype=response.headers["X-Dtype"]).reshape(len(columns), count)
+        segment = data[columns.index("8032_PPG_00")]
+    elapsed = time.perf_counter() - t0
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "mode": mode,
+        "time_to_first_segment_s": round(elapsed, 4),
+        "bytes_on_wire": len(response.content),
+        "segment_samples": len(segment),
+        "peak_rss_mb": round(rss_after / 1024, 1),
+        "rss_growth_mb": round((rss_after - rss_before) / 1024, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=10_000_000)
+    parser.add_argument("--worker", choices=["records", "range"])
+    parser.add_argument("--workdir")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.workdir)
+        return
+
+    workdir = make_workdir(args.samples)
+    print(f"Synthetic signal: {args.samples} samples in {workdir}")
+    try:
+        for mode in ("range", "records"):
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", mode, "--workdir", workdir],
+                           check=True)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
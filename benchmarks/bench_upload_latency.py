@@ -0,0 +1,103 @@
+"""
+Load test: concurrent uploaders hitting /upload_annotations while the
+background saver runs, reporting upload latency percentiles inside and
+outside save cycles.
+
+    python benchmarks/bench_upload_latency.py --uploaders 16 --duration 20 --save-interval 2
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    values = np.array(samples) * 1000
+    return {"n": len(values), "p50_ms": round(float(np.percentile(values, 50)), 3),
+            "p99_ms": round(float(np.percentile(values, 99)), 3), "max_ms": round(float(values.max()), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploaders", type=int, default=16)
+    parser.add_argument("--signals", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--save-interval", type=float, default=2)
+    parser.add_argument("--store", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ppg_upload_")
+    try:
+        os.chdir(workdir)
+        annotators = [f"annotator_{i}" for i in range(args.uploaders)]
+        with open("annotators.json", "w") as f:
+            json.dump({"annotators": annotators}, f)
+        os.environ["ANNOTATION_STORE"] = args.store
+
+        sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+        from fastapi.testclient import TestClient
+        import main
+
+        main.SAVE_INTERVAL = args.save_interval
+        saving = threading.Event()
+        save_cycle = main.save_cycle
+
+        def timed_save_cycle():
+            saving.set()
+            try:
+                save_cycle()
+            finally:
+                saving.clear()
+        main.save_cycle = timed_save_cycle
+
+        during_save, outside_save = [], []
+        results_lock = threading.Lock()
+        deadline = time.monotonic() + args.duration
+
+        def uploader(client, annotator_id, signal_id):
+            segment_index = 0
+            while time.monotonic() < deadline:
+                row = {"segment_index": segment_index, "start": segment_index * 312, "end": segment_index * 312 + 625,
+                       "snorkel_label": 0.5, "snorkel_confidence": 1.0, "annotator_id": annotator_id}
+                in_save = saving.is_set()
+                t0 = time.perf_counter()
+                client.post("/upload_annotations", json={"annotator_id": annotator_id, "signal_id": signal_id,
+                                                         "annotations": [row]})
+                elapsed = time.perf_counter() - t0
+                with results_lock:
+                    (during_save if in_save or saving.is_set() else outside_save).append(elapsed)
+                segment_index += 1
+
+        with TestClient(main.app) as client:
+            threads = [threading.Thread(target=uploader, args=(client, annotator_id, f"signal_{i % args.signals}"))
+                       for i, annotator_id in enumerate(annotators)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        print(json.dumps({
+            "store": args.store,
+            "uploaders": args.uploaders,
+            "uploads_per_s": round((len(during_save) + len(outside_save)) / args.duration, 1),
+            "during_save": percentiles(during_save),
+            "outside_save": percentiles(outside_save),
+        }, indent=2))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+End-to-end benchmark suite: synthetic recordings, the FastAPI app run
+in-process, and one JSON document of results for regression tracking.
+
+Scenarios (each runs in its own subprocess on a fresh copy of the working
+directory, so peak RSS and annotation state are not shared):
+
+    load         first segment, a sequential walk through /signal_range, overview,
+                 features, and /load_signal for recordings small enough to send as JSON
+    annotate     N annotators labeling segments through /upload_annotations while
+                 the background saver runs
+    flush_storm  all annotators hitting /flush_annotations at the same moment
+    resume       /get_annotations in full, with If-None-Match, and with since=
+    gui          headless (offscreen Qt) Annotator against the app served by an
+                 in-process uvicorn: signal selection, navigation and labeling
+
+    python benchmarks/run_suite.py --minutes 240 --annotators 16 --out results.json
+    python benchmarks/run_suite.py --scenarios load,gui --minutes 2880   # two days
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import synthetic
+from constants import SEGMENT_LENGTH, SEGMENT_STRIDE  # synthetic put backend/ on sys.path
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+ANNOTATOR_DIR = os.path.join(BENCH_DIR, "..", "annotator")
+SCENARIOS = ("load", "annotate", "flush_storm", "resume", "gui")
+LOAD_SIGNAL_MAX_SAMPLES = 2_000_000  # /load_signal sends JSON records; skip it beyond this
+
+
+def summarize(latencies, duration=None):
+    if not latencies:
+        return {"n": 0}
+    ms = np.array(latencies) * 1000
+    summary = {"n": len(ms), "p50_ms": round(float(np.percentile(ms, 50)), 3),
+               "p90_ms": round(float(np.percentile(ms, 90)), 3), "p99_ms": round(float(np.percentile(ms, 99)), 3),
+               "max_ms": round(float(ms.max()), 3)}
+    if duration:
+        summary["per_s"] = round(len(ms) / duration, 1)
+    return summary
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def label_row(annotator_id, segment_index, label):
+    start = segment_index * SEGMENT_STRIDE
+    return {"segment_index": segment_index, "start": start, "end": start + SEGMENT_LENGTH,
+            "snorkel_label": label, "snorkel_confidence": 1.0, "annotator_id": annotator_id}
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+# --- scenarios (run inside the worker subprocess, cwd = working directory) --
+
+def scenario_load(client, main, args, signals, annotators):
+    signal = signals[0]
+    base = f"{signal['id']}/{annotators[0]}"
+    result = {}
+    response, elapsed = timed(client.get, f"/signal_range/{base}", params={"segment": 0})
+    response.raise_for_status()
+    result["first_segment_s"] = round(elapsed, 4)
+
+    segments = min(args.segments, (signal["length"] - SEGMENT_LENGTH) // SEGMENT_STRIDE)
+    latencies = []
+    t0 = time.perf_counter()
+    for segment in range(segments):
+        _, elapsed = timed(client.get, f"/signal_range/{base}", params={"segment": segment, "format": "f32"})
+        latencies.append(elapsed)
+    result["segment_walk"] = summarize(latencies, time.perf_counter() - t0)
+
+    for name in ("overview", "features"):  # first request: computed and cached on the server
+        response, elapsed = timed(client.get, f"/{name}/{base}")
+        response.raise_for_status()
+        result[f"{name}_s"] = round(elapsed, 4)
+    if signal["length"] <= LOAD_SIGNAL_MAX_SAMPLES:
+        response, elapsed = timed(client.get, f"/load_signal/{base}")
+        result["load_signal_s"] = round(elapsed, 4)
+        result["load_signal_bytes"] = response.num_bytes_downloaded
+    else:
+        result["load_signal_s"] = None
+    return result
+
+
+def scenario_annotate(client, main, args, signals, annotators):
+    main.SAVE_INTERVAL = args.save_interval
+    latencies = [[] for _ in annotators]
+    deadline = time.monotonic() + args.duration
+
+    def annotator(i):
+        annotator_id, signal_id = annotators[i], signals[i % len(signals)]["id"]
+        segment = 0
+        while time.monotonic() < deadline:
+            rows = [label_row(annotator_id, segment + k, (segment + k) % 5 / 4) for k in range(args.batch)]
+            segment += args.batch
+            response, elapsed = timed(client.post, "/upload_annotations", json={
+                "annotator_id": annotator_id, "signal_id": signal_id, "annotations": rows})
+            latencies[i].append(elapsed)
+            if response.status_code != 200:
+                raise RuntimeError(f"upload failed: {response.status_code} {response.text}")
+
+    run_threads(annotator, len(annotators))
+    _, final_save = timed(main.save_cycle)
+    uploads = [elapsed for per_annotator in latencies for elapsed in per_annotator]
+    return {"annotators": len(annotators), "batch": args.batch,
+            "uploads": summarize(uploads, args.duration),
+            "labels_per_s": round(len(uploads) * args.batch / args.duration, 1),
+            "final_save_cycle_s": round(final_save, 4),
+            "save_cycles": {key: value for key, value in main.flush_pool.metrics.snapshot().items()
+                            if key in ("cycles", "failed_writes", "max_cycle_seconds")}}
+
+
+def upload_and_flush(client, annotator_id, signal_id, rows, barrier=None):
+    """Buffer rows through /upload_annotations, then time the /flush_annotations that writes them."""
+    payload = {"annotator_id": annotator_id, "signal_id": signal_id}
+    client.post("/upload_annotations", json={**payload, "annotations": rows}).raise_for_status()
+    if barrier is not None:
+        barrier.wait()
+    response, elapsed = timed(client.post, "/flush_annotations", json={**payload, "annotations": []})
+    response.raise_for_status()
+    if response.json().get("count") != len(rows):
+        raise RuntimeError(f"flush wrote {response.json()} instead of {len(rows)} rows")
+    return elapsed
+
+
+def scenario_flush_storm(client, main, args, signals, annotators):
+    main.SAVE_INTERVAL = 3600  # only the flushes write
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(annotators))
+    for round_index in range(args.rounds):
+        def annotator(i):
+            annotator_id = annotators[i]
+            offset = round_index * args.storm_rows
+            rows = [label_row(annotator_id, offset + k, 0.5) for k in range(args.storm_rows)]
+            elapsed = upload_and_flush(client, annotator_id, signals[i % len(signals)]["id"], rows, barrier)
+            with lock:
+                latencies.append(elapsed)
+        run_threads(annotator, len(annotators))
+    return {"annotators": len(annotators), "rows_per_flush": args.storm_rows, "rounds": args.rounds,
+            "flushes": summarize(latencies)}
+
+
+def scenario_resume(client, main, args, signals, annotators):
+    for i, annotator_id in enumerate(annotators):
+        rows = [label_row(annotator_id, k, k % 5 / 4) for k in range(args.resume_rows)]
+        upload_and_flush(client, annotator_id, signals[i % len(signals)]["id"], rows)
+    full, revalidate, since, progress = [], [], [], []
+    for _ in range(args.repeat):
+        for i, annotator_id in enumerate(annotators):
+            path = f"{annotator_id}/{signals[i % len(signals)]['id']}"
+            response, elapsed = timed(client.get, f"/get_annotations/{path}")
+            full.append(elapsed)
+            rows = response.json()
+            etag = response.headers.get("etag")
+            response, elapsed = timed(client.get, f"/get_annotations/{path}", headers={"If-None-Match": etag or ""})
+            revalidate.append(elapsed)
+            version = max(row["version"] for row in rows)
+            _, elapsed = timed(client.get, f"/get_annotations/{path}", params={"since": max(0, version - 10)})
+            since.append(elapsed)
+            _, elapsed = timed(client.get, f"/progress/{path}")
+            progress.append(elapsed)
+    return {"annotators": len(annotators), "rows_per_annotator": args.resume_rows,
+            "full": summarize(full), "if_none_match": summarize(revalidate),
+            "since": summarize(since), "progress": summarize(progress)}
+
+
+def scenario_gui(client, main, args, signals, annotators):
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # keep the real config, spool and cache; the working directory goes away with the suite's
+    os.environ["HOME"] = os.path.join(os.getcwd(), "home")
+    os.makedirs(os.environ["HOME"], exist_ok=True)
+    sys.path.insert(0, os.path.abspath(ANNOTATOR_DIR))
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication([])
+    from annotatorkit import config, gui
+
+    base_url = f"http://127.0.0.1:{port}"
+    config.CONFIG_PATH = os.path.join(os.environ["HOME"], ".annotator_config.json")
+    gui.BASE_URL = base_url
+    gui.get_config_from_user = lambda defaults: {"annotator_id": annotators[0], "base_url": base_url}
+
+    window, startup = timed(gui.Annotator)
+    window.show()
+    app.processEvents()
+
+    def frame(action):
+        t0 = time.perf_counter()
+        action()
+        app.processEvents()
+        return time.perf_counter() - t0
+
+    select = frame(lambda: window.handle_signal_selection(signals[0]["id"]))
+    forward = [frame(window.next_segment) for _ in range(args.frames)]
+    labeling = []
+    for _ in range(args.frames // 10):
+        labeling.append(frame(window.label_segment))
+        frame(window.prev_segment)
+    backward = [frame(window.prev_segment) for _ in range(args.frames // 2)]
+    uploaded = window.uploader.flush(timeout=10)
+
+    window.download_cancel.set()
+    window.stop_prefetcher()
+    window.uploader.stop()
+    window.close()
+    server.should_exit = True
+    return {"window_startup_s": round(startup, 4), "signal_selection_s": round(select, 4),
+            "next_segment": summarize(forward), "prev_segment": summarize(backward),
+            "label_segment": summarize(labeling), "labels_uploaded": bool(uploaded)}
+
+
+def run_scenario(name):
+    with open("suite.json") as f:
+        setup = json.load(f)
+    args = argparse.Namespace(**setup["args"])
+    sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        t0 = time.perf_counter()
+        result = globals()[f"scenario_{name}"](client, main, args, setup["signals"], setup["annotators"])
+        result["wall_s"] = round(time.perf_counter() - t0, 3)
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+# --- driver -----------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--minutes", type=float, default=60, help="length of each synthetic recording")
+    parser.add_argument("--signals", type=int, default=4)
+    parser.add_argument("--annotators", type=int, default=16)
+    parser.add_argument("--segments", type=int, default=500, help="segments walked by the load scenario")
+    parser.add_argument("--duration", type=float, default=15, help="seconds of labeling in the annotate scenario")
+    parser.add_argument("--batch", type=int, default=5, help="labels per /upload_annotations call")
+    parser.add_argument("--save-interval", type=float, default=2)
+    parser.add_argument("--storm-rows", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--resume-rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--frames", type=int, default=300, help="navigation steps in the gui scenario")
+    parser.add_argument("--out", help="write the results here as well as to stdout")
+    parser.add_argument("--keep", action="store_true", help="keep the working directories")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:  # worker subprocess: cwd is a prepared working directory
+        print("SUITE_RESULT " + json.dumps(run_scenario(args.scenario)))
+        return
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    base = tempfile.mkdtemp(prefix="ppg_suite_")
+    template = os.path.join(base, "template")
+    annotators = [f"annotator_{i:03d}" for i in range(args.annotators)]
+    _, generate_s = timed(synthetic.make_workdir, template, args.minutes, args.signals, annotators)
+    with open(os.path.join(template, "signal_registry.json")) as f:
+        signals = json.load(f)["signals"]
+    settings = {key: value for key, value in vars(args).items() if key not in ("scenario", "out", "keep")}
+    with open(os.path.join(template, "suite.json"), "w") as f:
+        json.dump({"signals": signals, "annotators": annotators, "args": settings}, f)
+
+    report = {
+        "meta": {"revision": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "args": settings,
+                 "samples_per_signal": signals[0]["length"], "generate_s": round(generate_s, 3)},
+        "scenarios": {},
+    }
+    for name in names:
+        workdir = os.path.join(base, name)
+        shutil.copytree(template, workdir, copy_function=os.link)  # signals are read-only: hard links suffice
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--scenario", name],
+                                   cwd=workdir, capture_output=True, text=True)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith("SUITE_RESULT ")]
+        if completed.returncode != 0 or not lines:
+            report["scenarios"][name] = {"error": (completed.stderr or completed.stdout).strip().splitlines()[-20:]}
+        else:
+            report["scenarios"][name] = json.loads(lines[-1][len("SUITE_RESULT "):])
+        print(f"{name}: {'failed' if 'error' in report['scenarios'][name] else 'done'}", file=sys.stderr)
+
+    if not args.keep:
+        shutil.rmtree(base, ignore_errors=True)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
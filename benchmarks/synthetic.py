@@ -0,0 +1,107 @@
+"""
+Synthetic 125 Hz PPG recordings for benchmarks, from minutes to days long.
+
+Each beat is two Gaussian waves (systolic peak and dicrotic wave) on a
+heart rate that drifts between roughly 55 and 95 bpm, with respiratory
+amplitude modulation, baseline wander and sensor noise. A few artifact
+episodes per hour (motion bursts, flatlines, clipping) give the quality
+features and the uncertainty queue something to rank. Samples are generated
+and written one row group at a time, so a multi-day file never has to fit in
+memory, and the layout matches what ingest.py produces.
+
+    python benchmarks/synthetic.py out.parquet --minutes 1440
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from constants import SAMPLE_RATE, TIMESTAMP_COLUMN_NAME, PPG_SIGNAL_COLUMN_NAME_1
+from ingest import ROW_GROUP_ROWS, COMPRESSION
+
+START_MS = 1_700_000_000_000
+ARTIFACTS_PER_HOUR = 6
+
+
+def _beat_shape(phase):
+    return (np.exp(-0.5 * ((phase - 0.22) / 0.07) ** 2)
+            + 0.45 * np.exp(-0.5 * ((phase - 0.55) / 0.10) ** 2))
+
+
+def _add_artifacts(ppg, rng):
+    """Sprinkle motion, flatline and clipping episodes over one chunk, in place."""
+    hours = len(ppg) / (SAMPLE_RATE * 3600)
+    for _ in range(rng.poisson(ARTIFACTS_PER_HOUR * hours)):
+        length = int(rng.uniform(5, 60) * SAMPLE_RATE)
+        offset = int(rng.integers(0, max(1, len(ppg) - length)))
+        window = ppg[offset:offset + length]
+        kind = rng.integers(3)
+        if kind == 0:
+            window += np.cumsum(rng.normal(0, 150, len(window)))
+        elif kind == 1:
+            window[:] = window[0]
+        else:
+            np.clip(window, None, np.percentile(window, 60), out=window)
+
+
+def synthetic_chunks(samples, seed=0, chunk=ROW_GROUP_ROWS):
+    """Yield (timestamps, ppg) chunks; phase carries over, so chunks join seamlessly."""
+    rng = np.random.default_rng(seed)
+    phase = 0.0
+    for start in range(0, samples, chunk):
+        t = np.arange(start, min(start + chunk, samples)) / SAMPLE_RATE
+        heart_rate = 75 + 12 * np.sin(2 * np.pi * t / 900 + seed) + 6 * np.sin(2 * np.pi * t / 97)
+        beat_phase = phase + np.cumsum(heart_rate / 60 / SAMPLE_RATE)
+        phase = beat_phase[-1]
+        respiration = 1 + 0.15 * np.sin(2 * np.pi * 0.25 * t)
+        ppg = (2000 * respiration * _beat_shape(beat_phase % 1.0)
+               + 300 * np.sin(2 * np.pi * 0.05 * t)
+               + rng.normal(0, 40, len(t)))
+        _add_artifacts(ppg, rng)
+        timestamps = START_MS + np.arange(start, start + len(t), dtype=np.int64) * (1000 // SAMPLE_RATE)
+        yield timestamps, ppg
+
+
+def write_signal(path, samples, seed=0):
+    """Write one recording and return its signal registry entry."""
+    schema = pa.schema([(TIMESTAMP_COLUMN_NAME, pa.int64()), (PPG_SIGNAL_COLUMN_NAME_1, pa.float64())])
+    with pq.ParquetWriter(path, schema, compression=COMPRESSION) as writer:
+        for timestamps, ppg in synthetic_chunks(samples, seed):
+            writer.write_table(pa.table([timestamps, ppg], schema=schema), row_group_size=ROW_GROUP_ROWS)
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    signal_id = os.path.splitext(os.path.basename(path))[0]
+    return {"id": signal_id, "filename": os.path.basename(path), "length": samples,
+            "sha256": digest.hexdigest(), "ppg_column": PPG_SIGNAL_COLUMN_NAME_1}
+
+
+def make_workdir(workdir, minutes, signals=1, annotators=("bench",)):
+    """A backend working directory with signals/, signal_registry.json and annotators.json."""
+    os.makedirs(os.path.join(workdir, "signals"), exist_ok=True)
+    samples = int(minutes * 60 * SAMPLE_RATE)
+    entries = [write_signal(os.path.join(workdir, "signals", f"synthetic_{i}.parquet"), samples, seed=i)
+               for i in range(signals)]
+    with open(os.path.join(workdir, "signal_registry.json"), "w") as f:
+        json.dump({"signals": entries}, f, indent=2)
+    with open(os.path.join(workdir, "annotators.json"), "w") as f:
+        json.dump({"annotators": list(annotators)}, f)
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic PPG recording")
+    parser.add_argument("out", help="output .parquet path")
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    entry = write_signal(args.out, int(args.minutes * 60 * SAMPLE_RATE), args.seed)
+    print(json.dumps(entry, indent=2))